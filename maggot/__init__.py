@@ -17,4 +17,5 @@ def get_current_separator():
 
 
 from maggot.experiment import Experiment
-from maggot.config import Config
+from maggot.config import Config, FrozenConfig
+from maggot.sweeps import sweep
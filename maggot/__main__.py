@@ -1,16 +1,26 @@
 import sys
 import argparse
-
-from maggot.scripts import summarize, show_config, show_command, config_diff
+import importlib
 
 
+# command modules are imported only when invoked
+# to keep the startup time of the CLI low
 COMMANDS = {
-    "summarize": summarize,
-    "show-config": show_config,
-    "show-command": show_command,
-    "config-diff": config_diff
+    "summarize": "maggot.scripts.summarize",
+    "show-config": "maggot.scripts.show_config",
+    "show-command": "maggot.scripts.show_command",
+    "show-log": "maggot.scripts.show_log",
+    "config-diff": "maggot.scripts.config_diff",
+    "index": "maggot.scripts.index",
+    "queue": "maggot.scripts.job_queue",
+    "worker": "maggot.scripts.worker"
 }
 
+
+def load_command(command):
+    return importlib.import_module(COMMANDS[command])
+
+
 def collect_args():
 
     parser = argparse.ArgumentParser(
@@ -23,7 +33,11 @@ def collect_args():
             "  summarize\tSummarize metrics from all experiments in a given directory.\n"
             "  show-config\tShow experiment config.\n"
             "  show-command\tShow command used to run an experiment.\n"
-            "  config-diff\tShow diff between configs in two experiments.\n"
+            "  show-log\tShow experiment log.\n"
+            "  config-diff\tShow diff between configs in two experiments, or what varies across many.\n"
+            "  index\t\tRebuild the catalog of experiments in a given directory.\n"
+            "  queue\t\tAdd experiments to the queue or list queued experiments.\n"
+            "  worker\tRun experiments from the queue.\n"
         ),
         add_help=False
     )
@@ -34,12 +48,17 @@ def collect_args():
         parser.print_usage()
         sys.exit()
 
+    if args.command not in COMMANDS:
+        print("Unknown command: {command}\n".format(command=args.command))
+        parser.print_usage()
+        sys.exit(1)
+
     return args, uargs
 
 
 def main():
 
     args, uargs = collect_args()
-    COMMANDS[args.command].main(uargs)
+    load_command(args.command).main(uargs)
 
 
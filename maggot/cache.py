@@ -0,0 +1,95 @@
+import os
+import json
+
+from maggot.locking import atomic_write
+from maggot.results import RESULTS_FILE, RESULTS_JOURNAL_FILE, load_results
+
+
+CACHE_FILE = ".maggot_summarize_cache.json"
+CACHE_VERSION = 1
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def results_signature(maggot_meta_dir):
+    """
+    Returns `(mtime, size)` pairs of the results file and the results
+    journal, which change whenever results of an experiment change.
+    """
+
+    return [
+        _file_signature(os.path.join(maggot_meta_dir, RESULTS_FILE)),
+        _file_signature(os.path.join(maggot_meta_dir, RESULTS_JOURNAL_FILE))
+    ]
+
+
+class ResultsCache:
+    """
+    A cache of parsed, flattened results of experiments in a directory,
+    keyed by experiment name and validated by `results_signature`, so that
+    only experiments that changed since the previous run are parsed again.
+
+    The cache is saved with write-to-temp-then-rename, so concurrent runs
+    never see a partially written file; when two runs race, the last one
+    wins, which at worst costs some re-parsing on the next run. Entries of
+    experiments that were not seen during a complete run are evicted on
+    `save`. A cache that cannot be written (e.g. in a read-only directory)
+    is simply not saved.
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, CACHE_FILE)
+        self._entries = self._load()
+        self._seen = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as fp:
+                cache = json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return dict()
+
+        if cache.get("version") != CACHE_VERSION:
+            return dict()
+        return cache["entries"]
+
+    def load_results(self, name, maggot_meta_dir):
+        """Same as `maggot.results.load_results`, but goes through the cache"""
+
+        signature = results_signature(maggot_meta_dir)
+        if signature == [None, None]:
+            return None
+
+        entry = self._entries.get(name)
+        if entry is not None and entry["signature"] == signature:
+            self.hits += 1
+            results = entry["results"]
+        else:
+            self.misses += 1
+            results = load_results(maggot_meta_dir)
+            if results is None:
+                return None
+
+        self._seen[name] = dict(signature=signature, results=results)
+        return results
+
+    def save(self, complete=True):
+        """
+        Saves entries seen so far. If not all experiments were visited
+        (`complete=False`), entries of the others are kept as they were.
+        """
+
+        entries = self._seen if complete else dict(self._entries, **self._seen)
+        try:
+            atomic_write(self.path, json.dumps(dict(version=CACHE_VERSION, entries=entries)))
+        except OSError:
+            # the cache only saves time, results are still correct without it
+            pass
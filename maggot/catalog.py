@@ -0,0 +1,373 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+from maggot.cache import results_signature
+from maggot.config import Config
+from maggot.results import load_results
+
+
+CATALOG_FILE = ".maggot_catalog.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    name TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    commit_hash TEXT,
+    command TEXT,
+    created REAL,
+    updated REAL,
+    results_signature TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    experiment TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (experiment, name)
+);
+"""
+
+
+def _read_text(path):
+    try:
+        with open(path, "r") as fp:
+            return fp.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+class Catalog:
+    """
+    An SQLite index of all experiments in an `experiments_dir`, stored at
+    its root. It holds flattened configs, results, commit hashes, commands
+    and timestamps, so that scripts can answer queries without walking and
+    parsing thousands of JSON files.
+
+    The `.maggot` directories remain the source of truth, the catalog
+    can always be reconstructed from them with `rebuild`. Results are
+    stored along with the signature of results files (see
+    `maggot.cache.results_signature`) they were taken from, so readers
+    can tell whether they are still up to date, see `is_current`.
+
+    A catalog can be written from several threads, e.g. from the
+    background writer of an Experiment. Readers like `maggot summarize`
+    open an existing catalog with `read_only`, so they never modify it.
+    """
+
+    def __init__(self, experiments_dir, read_only=False):
+        self.experiments_dir = experiments_dir or "."
+        self.path = os.path.join(self.experiments_dir, CATALOG_FILE)
+        self._lock = threading.RLock()
+
+        # imported lazily to keep `import maggot` cheap
+        import sqlite3
+
+        if read_only:
+            self._connection = sqlite3.connect(
+                "file:{path}?mode=ro".format(path=quote(os.path.abspath(self.path))),
+                uri=True, timeout=60, check_same_thread=False
+            )
+            return
+
+        os.makedirs(self.experiments_dir, exist_ok=True)
+        # writes are serialized with `_lock`
+        self._connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        try:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError:
+            # e.g. file systems without shared memory support
+            pass
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        columns = {
+            row[1] for row in self._connection.execute("PRAGMA table_info(experiments)")
+        }
+        if "results_signature" not in columns:
+            # results indexed by older versions are never considered current
+            with self._connection:
+                self._connection.execute(
+                    "ALTER TABLE experiments ADD COLUMN results_signature TEXT"
+                )
+
+    @staticmethod
+    def exists(experiments_dir):
+        return os.path.isfile(os.path.join(experiments_dir, CATALOG_FILE))
+
+    def close(self):
+        self._connection.close()
+
+    def add_experiment(self, name, config, commit_hash=None, command=None, created=None):
+        """
+        Inserts or replaces an experiment, `config` is a Config instance.
+        Results of a replaced experiment (e.g. one that was deleted and
+        created again) are removed.
+        """
+
+        created = time.time() if created is None else created
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO experiments "
+                "(name, config, commit_hash, command, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (name, json.dumps(config.as_flat_dict()), commit_hash,
+                 command, created, created)
+            )
+            self._connection.execute(
+                "DELETE FROM results WHERE experiment = ?", (name,)
+            )
+
+    def update_results(self, experiment, results, signature):
+        """
+        Inserts or replaces `(name, value)` pairs of results of an experiment
+        in a single transaction and records `signature` of its results files.
+        """
+
+        with self._lock, self._connection:
+            # REPLACE re-inserts rows, so rowids follow the order
+            # in which results were registered, same as the journal
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO results (experiment, name, value) "
+                "VALUES (?, ?, ?)",
+                ((experiment, name, json.dumps(value)) for name, value in results)
+            )
+            self._connection.execute(
+                "UPDATE experiments SET updated = ?, results_signature = ? WHERE name = ?",
+                (time.time(), json.dumps(signature), experiment)
+            )
+
+    def set_results(self, experiment, results, signature=None):
+        """Replaces all results of an experiment with a flat dict"""
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM results WHERE experiment = ?", (experiment,)
+            )
+            self._connection.executemany(
+                "INSERT INTO results (experiment, name, value) VALUES (?, ?, ?)",
+                ((experiment, name, json.dumps(value))
+                 for name, value in results.items())
+            )
+            self._connection.execute(
+                "UPDATE experiments SET results_signature = ? WHERE name = ?",
+                (json.dumps(signature), experiment)
+            )
+
+    def names(self):
+        rows = self._connection.execute("SELECT name FROM experiments ORDER BY name")
+        return [name for name, in rows]
+
+    def __contains__(self, name):
+        row = self._connection.execute(
+            "SELECT 1 FROM experiments WHERE name = ?", (name,)
+        ).fetchone()
+        return row is not None
+
+    def _get(self, column, name):
+        row = self._connection.execute(
+            "SELECT {column} FROM experiments WHERE name = ?".format(column=column),
+            (name,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row[0]
+
+    def config(self, name):
+        flat = json.loads(self._get("config", name), object_pairs_hook=OrderedDict)
+        return Config.from_flat_dict(flat)
+
+    def command(self, name):
+        return self._get("command", name)
+
+    def commit_hash(self, name):
+        return self._get("commit_hash", name)
+
+    def signatures(self):
+        """Returns a dict mapping experiment names to signatures of their results"""
+
+        columns = {
+            row[1] for row in self._connection.execute("PRAGMA table_info(experiments)")
+        }
+        if "results_signature" not in columns:
+            # a catalog of an older version opened with `read_only`
+            return {name: None for name in self.names()}
+
+        rows = self._connection.execute("SELECT name, results_signature FROM experiments")
+        return {
+            name: None if signature is None else json.loads(signature)
+            for name, signature in rows
+        }
+
+    @staticmethod
+    def is_settled(signature):
+        """
+        Whether a signature is of compacted results without a journal, i.e.
+        of an experiment that is not running. Experiments update their rows
+        in the catalog themselves, so such results can be trusted without
+        looking at their files, unless the experiment is opened again with
+        `use_catalog=False` (`maggot index rebuild` picks up such changes).
+
+        Example:
+
+        >>> Catalog.is_settled([[1, 10], None]), Catalog.is_settled([[1, 10], [2, 20]])
+        (True, False)
+
+        """
+        return signature is not None and signature[0] is not None and signature[1] is None
+
+    def is_current(self, name, signature=None):
+        """
+        Whether results of an experiment in the catalog match its results
+        files on disk. Results that were indexed while the experiment was
+        still running, or by an older version, are not current.
+        """
+
+        if signature is None:
+            try:
+                signature = json.loads(self._get("results_signature", name) or "null")
+            except KeyError:
+                return False
+        maggot_meta_dir = os.path.join(self.experiments_dir, name, ".maggot")
+        return signature is not None and signature == results_signature(maggot_meta_dir)
+
+    def iter_results(self):
+        """
+        Yields (experiment, flat results) pairs ordered by experiment name
+        for every experiment that has at least one result. Only results of
+        a single experiment are held in memory at a time.
+        """
+
+        rows = self._connection.execute(
+            "SELECT experiment, name, value FROM results ORDER BY experiment, rowid"
+        )
+
+        def _fold(results):
+            # resolve names that shadow each other, see `maggot.results`
+            return Config.from_flat_dict(results).as_flat_dict()
+
+        current, results = None, OrderedDict()
+        for experiment, name, value in rows:
+            if experiment != current:
+                if current is not None:
+                    yield current, _fold(results)
+                current, results = experiment, OrderedDict()
+            results.pop(name, None)
+            results[name] = json.loads(value)
+
+        if current is not None:
+            yield current, _fold(results)
+
+    def all_results(self):
+        """
+        Returns an OrderedDict mapping experiment names to flat results
+        for every experiment that has at least one result.
+        """
+        return OrderedDict(self.iter_results())
+
+    def add_from_directory(self, name):
+        """Indexes an existing experiment from its `.maggot` directory"""
+
+        maggot_meta_dir = os.path.join(self.experiments_dir, name, ".maggot")
+        config_file = os.path.join(maggot_meta_dir, "config.json")
+
+        config = Config.from_json(config_file)
+        # taken before results are read, so a concurrent change makes it stale
+        signature = results_signature(maggot_meta_dir)
+
+        self.add_experiment(
+            name,
+            config,
+            commit_hash=_read_text(os.path.join(maggot_meta_dir, "commit_hash")),
+            command=_read_text(os.path.join(maggot_meta_dir, "command")),
+            created=os.path.getmtime(config_file)
+        )
+
+        results = load_results(maggot_meta_dir)
+        self.set_results(name, results or dict(), signature)
+
+    def rebuild(self):
+        """Reconstructs the catalog from `.maggot` directories"""
+
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM experiments")
+            self._connection.execute("DELETE FROM results")
+
+        with os.scandir(self.experiments_dir) as entries:
+            names = sorted(
+                entry.name for entry in entries
+                if entry.is_dir() and
+                os.path.isfile(os.path.join(entry.path, ".maggot", "config.json"))
+            )
+
+        for name in names:
+            self.add_from_directory(name)
+
+        return names
+
+
+class PendingResults:
+    """
+    Collects results registered for an experiment and writes them into
+    the catalog in a single transaction when `write` is called, e.g. from
+    the thread of a background writer, so that registering a result never
+    waits for SQLite.
+    """
+
+    def __init__(self, catalog, name, maggot_meta_dir):
+        self.catalog = catalog
+        self.name = name
+        self.maggot_meta_dir = maggot_meta_dir
+        self._pending = []
+        self._lock = threading.Lock()
+        # experiments that are only read never write to the catalog,
+        # so resumed ones that are missing from it are added on first write
+        self._indexed = False
+
+    def add(self, name, value):
+        """Queues a result, returns True if nothing was queued before it"""
+
+        with self._lock:
+            self._pending.append((name, value))
+            return len(self._pending) == 1
+
+    def write(self, refresh=False):
+        """
+        Writes queued results along with the current signature of results
+        files, or only the signature if `refresh` is given.
+        """
+
+        with self._lock:
+            results, self._pending = self._pending, []
+        if not results and not refresh:
+            return
+
+        if not self._indexed:
+            if self.name not in self.catalog:
+                self.catalog.add_from_directory(self.name)
+            self._indexed = True
+        self.catalog.update_results(
+            self.name, results, results_signature(self.maggot_meta_dir)
+        )
+
+
+def find_in_catalog(experiment_dir):
+    """
+    Returns a (catalog, name) pair if the experiment is indexed in a catalog
+    of its parent directory and None otherwise.
+    """
+
+    experiments_dir, name = os.path.split(os.path.abspath(experiment_dir))
+    if not Catalog.exists(experiments_dir):
+        return None
+
+    catalog = Catalog(experiments_dir, read_only=True)
+    if name not in catalog:
+        catalog.close()
+        return None
+
+    return catalog, name
@@ -0,0 +1,164 @@
+import bisect
+
+import numpy as np
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+
+# reductions that are computed chunk by chunk, without copying the column
+_REDUCTIONS = {
+    "sum": np.sum,
+    "min": np.min,
+    "max": np.max,
+}
+
+
+class ChunkedColumn(NDArrayOperatorsMixin):
+    """
+    A read-only one-dimensional array backed by a list of arrays (e.g.
+    memory-mapped chunk files of a metric series), which are never copied
+    into a single array unless needed.
+
+    Indexing, slicing, iteration, `len` and reductions like `sum`, `min`,
+    `max` and `mean` touch only the chunks they need. Arithmetic,
+    comparisons, ufuncs and other numpy functions work as for an ndarray
+    and return ndarrays, and so do ndarray methods and attributes that are
+    not implemented here, at the cost of a copy. `np.asarray(column)`
+    returns a single array, without copying a column of a single chunk.
+
+    Example:
+
+    >>> column = ChunkedColumn([np.arange(3.0), np.arange(3.0, 5.0)])
+    >>> len(column), float(column[3]), column[1:4].tolist()
+    (5, 3.0, [1.0, 2.0, 3.0])
+    >>> (column * 2 < 5).tolist()
+    [True, True, True, False, False]
+    >>> float(column.mean()), float(np.max(column)), float(column.std())
+    (2.0, 4.0, 1.4142135623730951)
+
+    """
+
+    def __init__(self, chunks, dtype=None):
+        if dtype is None:
+            dtype = chunks[0].dtype
+        # there is always a chunk, so that an empty column still has a dtype
+        self.chunks = [chunk for chunk in chunks if len(chunk)] or [np.empty(0, dtype=dtype)]
+        self._offsets = [0]
+        for chunk in self.chunks:
+            self._offsets.append(self._offsets[-1] + len(chunk))
+
+    @property
+    def dtype(self):
+        return self.chunks[0].dtype
+
+    @property
+    def shape(self):
+        return (len(self),)
+
+    @property
+    def size(self):
+        return len(self)
+
+    @property
+    def ndim(self):
+        return 1
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from chunk
+
+    def _locate(self, index):
+        chunk = bisect.bisect_right(self._offsets, index) - 1
+        return chunk, index - self._offsets[chunk]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return np.asarray(self)[key]
+            if start >= stop:
+                return self.chunks[0][:0]
+
+            first, first_start = self._locate(start)
+            last, last_stop = self._locate(stop - 1)
+            if first == last:
+                return self.chunks[first][first_start:last_stop + 1]
+            parts = [self.chunks[first][first_start:]]
+            parts.extend(self.chunks[first + 1:last])
+            parts.append(self.chunks[last][:last_stop + 1])
+            return np.concatenate(parts)
+
+        if not isinstance(key, (int, np.integer)):
+            # e.g. boolean masks and index arrays
+            return np.asarray(self)[key]
+
+        index = int(key)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("index {key} is out of bounds".format(key=key))
+        chunk, offset = self._locate(index)
+        return self.chunks[chunk][offset]
+
+    def __array__(self, dtype=None, copy=None):
+        if len(self.chunks) == 1 and not copy:
+            column = self.chunks[0]
+        elif copy is False:
+            raise ValueError("A column of several chunks cannot be viewed without a copy")
+        else:
+            column = np.concatenate(self.chunks)
+        return column if dtype is None else column.astype(dtype, copy=False)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        inputs = tuple(
+            np.asarray(item) if isinstance(item, ChunkedColumn) else item
+            for item in inputs
+        )
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    def _reduce(self, name, axis=None, out=None, keepdims=False, **kwargs):
+        if axis not in (None, 0) or out is not None or keepdims or kwargs:
+            return getattr(np.asarray(self), name)(axis=axis, out=out, keepdims=keepdims, **kwargs)
+        if len(self) == 0:
+            return getattr(self.chunks[0], name)()
+        function = _REDUCTIONS[name]
+        return function([function(chunk) for chunk in self.chunks])
+
+    def sum(self, axis=None, dtype=None, out=None, keepdims=False, **kwargs):
+        if dtype is not None:
+            kwargs["dtype"] = dtype
+        return self._reduce("sum", axis, out, keepdims, **kwargs)
+
+    def min(self, axis=None, out=None, keepdims=False, **kwargs):
+        return self._reduce("min", axis, out, keepdims, **kwargs)
+
+    def max(self, axis=None, out=None, keepdims=False, **kwargs):
+        return self._reduce("max", axis, out, keepdims, **kwargs)
+
+    def mean(self, axis=None, dtype=None, out=None, keepdims=False, **kwargs):
+        if axis not in (None, 0) or dtype is not None or out is not None or keepdims or kwargs:
+            return np.asarray(self).mean(
+                axis=axis, dtype=dtype, out=out, keepdims=keepdims, **kwargs
+            )
+        if len(self) == 0:
+            return self.chunks[0].mean()
+        return np.sum([chunk.sum(dtype=np.float64) for chunk in self.chunks]) / len(self)
+
+    def tolist(self):
+        return [item for chunk in self.chunks for item in chunk.tolist()]
+
+    def astype(self, dtype):
+        return np.asarray(self, dtype=dtype)
+
+    def __getattr__(self, name):
+        # other ndarray methods and attributes, e.g. `std` or `argmin`
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(np.asarray(self), name)
+
+    def __repr__(self):
+        return "ChunkedColumn(length={length}, chunks={chunks}, dtype={dtype})".format(
+            length=len(self), chunks=len(self.chunks), dtype=self.dtype
+        )
@@ -1,7 +1,9 @@
+import json
+import hashlib
 from collections import OrderedDict
 
 from maggot import get_current_separator
-from maggot.containers import NestedContainer
+from maggot.containers import NestedContainer, flatten_dict
 
 
 class Config(NestedContainer):
@@ -11,7 +13,8 @@ class Config(NestedContainer):
         """
         Maps config parameters into a single string that shortly
         summarrizes the content of config`s fields. Fields a sorted
-        to provide deterministic output.
+        to provide deterministic output. The identifier is cached
+        until the config is modified.
 
         Example:
 
@@ -22,7 +25,14 @@ class Config(NestedContainer):
 
         """
 
-        parameters = self.as_flat_dict()
+        separator = get_current_separator()
+        return self._cached(
+            ("identifier", separator), lambda: self._make_identifier(separator)
+        )
+
+    def _make_identifier(self, separator):
+
+        parameters = self._cached("flat_dict", self._flatten)
 
         def sort_key(item):
             name, attr = item
@@ -42,7 +52,190 @@ class Config(NestedContainer):
         parameters = OrderedDict((k, v) for k, v in parameters.items()
                                  if is_descriptive(k))
 
-        return get_current_separator().join(parameters.values())
+        return separator.join(parameters.values())
+
+    def content_hash(self, include_private=False):
+        """
+        Returns a SHA-256 hex digest of canonical JSON of the config, which
+        depends only on parameter names and values and not on the order in
+        which fields were set. Same as in `identifier`, parameters that
+        start with underscore are ignored unless `include_private` is given.
+
+        Example:
+
+        >>> config = Config.from_dict(dict(b=dict(c=20), a=10, _d=1))
+        >>> config.content_hash()[:12]
+        '1415e4a40d20'
+
+        """
+
+        return self._cached(
+            ("content_hash", include_private),
+            lambda: self._make_content_hash(include_private)
+        )
+
+    def _make_content_hash(self, include_private):
+
+        def is_descriptive(key):
+            *prefix, base = key.split(".")
+            return not base.startswith("_")
+
+        # tuples of frozen configs are turned back into lists
+        parameters = flatten_dict(self.to_dict())
+        if not include_private:
+            parameters = {k: v for k, v in parameters.items() if is_descriptive(k)}
+
+        canonical = json.dumps(parameters, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def freeze(self):
+        """Returns an immutable copy of the config, see `FrozenConfig`"""
+
+        return FrozenConfig.from_dict(self.to_dict())
+
+
+class FrozenConfig(Config):
+    """
+    An immutable, hashable Config. Lists are stored as tuples and nested
+    dicts as FrozenConfig instances.
+
+    New variants are derived with `with_updates`, which rebuilds only
+    the containers on paths to updated parameters and shares every
+    unchanged subtree with the original, so memory of a sweep grows
+    with the number of changed parameters rather than with the size of
+    the config. Hashes are computed once and cached, and equality checks
+    skip shared subtrees, so frozen configs work well as dict keys,
+    e.g. to deduplicate sweep variants.
+
+    Example:
+
+    >>> config = FrozenConfig.from_dict(dict(model=dict(C=1.0), data=dict(size=10)))
+    >>> variant = config.with_updates({"model.C": 0.1})
+    >>> variant.identifier
+    '10-0.1'
+    >>> variant.data is config.data
+    True
+    >>> variant == config.with_updates({"model.C": 0.1})
+    True
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        # frozen containers never change, so they need no parent links
+        object.__setattr__(self, "_container_parents", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenConfig does not support assignment, use `with_updates`")
+
+    def __delattr__(self, name):
+        raise AttributeError("FrozenConfig does not support deletion, use `with_updates`")
+
+    @classmethod
+    def _make(cls, fields):
+        config = cls()
+        config.__dict__.update(fields)
+        return config
+
+    @classmethod
+    def from_dict(cls, nested_dict):
+        """Create a FrozenConfig instance from a dictionary"""
+
+        return cls._make(
+            (name, _freeze_value(attr)) for name, attr in nested_dict.items()
+        )
+
+    def __setstate__(self, state):
+        FrozenConfig.__init__(self)
+        self.__dict__.update(state)
+
+    def freeze(self):
+        return self
+
+    def to_dict(self):
+        """Turn config into a dict, tuples are turned back into lists."""
+
+        return _thaw_value(self)
+
+    def thaw(self):
+        """Returns a mutable Config with the same content"""
+
+        return Config.from_dict(self.to_dict())
+
+    def with_updates(self, updates):
+        """
+        Returns a new FrozenConfig with parameters from a flat dict
+        (e.g. `{"model.C": 0.1}`) replaced or added. Dict values become
+        subcontainers, and a parameter replaces a whole subcontainer
+        and vice versa, same as in `from_flat_dict`.
+        """
+
+        grouped = OrderedDict()
+        for name, value in updates.items():
+            prefix, _, suffix = name.partition(".")
+            if suffix:
+                nested = grouped.get(prefix)
+                if not isinstance(nested, _NestedUpdates):
+                    nested = grouped[prefix] = _NestedUpdates()
+                nested[suffix] = value
+            else:
+                grouped[prefix] = value
+
+        fields = dict(self.__dict__)
+        for name, value in grouped.items():
+            if isinstance(value, _NestedUpdates):
+                current = fields.get(name)
+                if not isinstance(current, FrozenConfig):
+                    current = FrozenConfig._make(())
+                fields[name] = current.with_updates(value)
+            else:
+                fields[name] = _freeze_value(value)
+
+        return FrozenConfig._make(fields.items())
+
+    def __hash__(self):
+        return self._cached("hash", lambda: hash(
+            tuple((name, self.__dict__[name]) for name in sorted(self.__dict__))
+        ))
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, FrozenConfig):
+            return NotImplemented
+        return hash(self) == hash(other) and self.__dict__ == other.__dict__
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+
+class _NestedUpdates(OrderedDict):
+    """Updates of a subcontainer collected by `FrozenConfig.with_updates`"""
+
+
+def _freeze_value(value):
+    if isinstance(value, FrozenConfig):
+        return value
+    if isinstance(value, NestedContainer):
+        return FrozenConfig.from_dict(value.to_dict())
+    if isinstance(value, dict):
+        return FrozenConfig.from_dict(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_value(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def _thaw_value(value):
+    if isinstance(value, FrozenConfig):
+        return {name: _thaw_value(attr) for name, attr in value.__dict__.items()}
+    if isinstance(value, tuple):
+        return [_thaw_value(item) for item in value]
+    if isinstance(value, frozenset):
+        return set(value)
+    return value
 
 
 def value_to_string(value, name):
@@ -52,7 +245,7 @@ def value_to_string(value, name):
         *prefix, base = name.split(".")
         return base
 
-    if isinstance(value, list):
+    if isinstance(value, (list, tuple)):
         return "x".join(map(str, value))
     if isinstance(value, bool):
         return last(name) if value else "no_" + last(name)
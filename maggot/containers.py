@@ -1,9 +1,39 @@
 import os
 
 import json
+import weakref
 from collections import OrderedDict
 
 from maggot import get_current_separator
+from maggot.locking import atomic_write
+
+
+def flatten_dict(nested_dict, prefix=""):
+    """
+    Same as `NestedContainer.as_flat_dict`, but works directly on a nested
+    dict (e.g. one loaded from JSON) without building a container first.
+
+    Example:
+
+    >>> flatten_dict(dict(b=dict(c=20), a=10))
+    OrderedDict([('a', 10), ('b.c', 20)])
+
+    """
+
+    flat = OrderedDict()
+
+    def _collect(nested, prefix):
+        for name in sorted(nested):
+            attr = nested[name]
+            full_name = ".".join((prefix, name)) if prefix else name
+            if isinstance(attr, dict):
+                _collect(attr, full_name)
+            else:
+                flat[full_name] = attr
+
+    _collect(nested_dict, prefix)
+
+    return flat
 
 
 class NestedContainer:
@@ -11,8 +41,59 @@ class NestedContainer:
     A recursive structure that resembles a JSON object or nested
     dictionary with a only difference that attributes can be accessed directly
     by repeatedly applying getattr() or the '.' operator.
+
+    Derived views (e.g. `as_flat_dict`) are computed once and cached.
+    Every container keeps weak references to containers it is attached to,
+    so setting or deleting an attribute anywhere in the tree invalidates
+    caches of all containers above it. Mutating values in place
+    (e.g. appending to a list) is not tracked.
     """
 
+    # fields live in `__dict__`, so caches and parent links are slots
+    __slots__ = ("__dict__", "__weakref__", "_container_cache", "_container_parents")
+
+    def __init__(self):
+        object.__setattr__(self, "_container_cache", dict())
+        object.__setattr__(self, "_container_parents", weakref.WeakSet())
+
+    def __setattr__(self, name, value):
+        self._detach(self.__dict__.get(name))
+        if isinstance(value, NestedContainer) and value._container_parents is not None:
+            value._container_parents.add(self)
+        object.__setattr__(self, name, value)
+        self._invalidate()
+
+    def __delattr__(self, name):
+        self._detach(self.__dict__.get(name))
+        object.__delattr__(self, name)
+        self._invalidate()
+
+    def _detach(self, attr):
+        if isinstance(attr, NestedContainer) and attr._container_parents is not None:
+            attr._container_parents.discard(self)
+
+    def _invalidate(self):
+        """Drops cached views of this container and all its parents"""
+
+        self._container_cache.clear()
+        for parent in list(self._container_parents):
+            parent._invalidate()
+
+    def _cached(self, key, compute):
+        try:
+            return self._container_cache[key]
+        except KeyError:
+            value = self._container_cache[key] = compute()
+            return value
+
+    def __getstate__(self):
+        return dict(self.__dict__)
+
+    def __setstate__(self, state):
+        NestedContainer.__init__(self)
+        for name, attr in state.items():
+            NestedContainer.__setattr__(self, name, attr)
+
     @classmethod
     def from_json(cls, filepath):
         """Same as `from_dict`, but takes json file as input"""
@@ -23,14 +104,13 @@ class NestedContainer:
         return cls.from_dict(nested_dict)
 
     def to_json(self, filepath):
-        """Dumps container into a JSON file"""
+        """Dumps container into a JSON file, replacing it atomically"""
 
         dirname = os.path.dirname(filepath)
         if dirname:
             os.makedirs(dirname, exist_ok=True)
 
-        with open(filepath, "w") as f:
-            json.dump(self.to_dict(), f, indent=4, sort_keys=True)
+        atomic_write(filepath, json.dumps(self.to_dict(), indent=4, sort_keys=True))
 
     @classmethod
     def from_dict(cls, nested_dict):
@@ -66,6 +146,8 @@ class NestedContainer:
     def as_flat_dict(self):
         """Returns an OrderedDict with mapping (full_parameter_name -> attr)
 
+        The mapping is cached, a fresh copy is returned on every call.
+
         Example:
 
         >>> nested_dict = dict(a=10, b=dict(c=20))
@@ -75,6 +157,10 @@ class NestedContainer:
 
         """
 
+        return OrderedDict(self._cached("flat_dict", self._flatten))
+
+    def _flatten(self):
+
         parameters = OrderedDict()
 
         def _collect(container, prefix):
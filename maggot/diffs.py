@@ -1,26 +1,195 @@
-import difflib
 import json
+from collections import defaultdict, namedtuple, OrderedDict
 
-from maggot.utils import red, green, blue
+from maggot.containers import NestedContainer, flatten_dict
+from maggot.utils import red, green, blue, bold
 
 
-def color_diff(diff):
-    for line in diff:
-        if line.startswith('+'):
-            yield green(line)
-        elif line.startswith('-'):
-            yield red(line)
-        elif line.startswith('^'):
-            yield blue(line)
+class DiffKinds:
+    KIND_ADDED = "added"
+    KIND_REMOVED = "removed"
+    KIND_CHANGED = "changed"
+    POSSIBLE_KINDS = (KIND_ADDED, KIND_REMOVED, KIND_CHANGED)
+
+
+DiffEntry = namedtuple("DiffEntry", ["name", "kind", "first", "second"])
+
+
+def _as_flat_dict(config):
+    if isinstance(config, NestedContainer):
+        return config.as_flat_dict()
+    return flatten_dict(config)
+
+
+def _path(name):
+    # flat dicts are ordered level by level, which is
+    # the same as ordering by tuples of name components
+    return tuple(name.split("."))
+
+
+def same_values(first, second):
+    """
+    Compares parameter values, treating lists and tuples alike but
+    not values of different types, e.g. `1` and `1.0` or `1` and `True`.
+    """
+
+    sequences = (list, tuple)
+    if isinstance(first, sequences) and isinstance(second, sequences):
+        return (
+            len(first) == len(second) and
+            all(same_values(x, y) for x, y in zip(first, second))
+        )
+    return type(first) is type(second) and first == second
+
+
+def config_diff(first, second):
+    """
+    Compares two configs (or nested dicts) parameter by parameter and
+    returns a list of DiffEntry tuples for added, removed and changed
+    parameters with full dotted names. Both flat dicts are already
+    ordered, so they are merged in a single linear pass.
+
+    Example:
+
+    >>> first = dict(model=dict(C=1.0, gamma=0.1), seed=1)
+    >>> second = dict(model=dict(C=10.0, kernel="rbf"), seed=1)
+    >>> for entry in config_diff(first, second):
+    ...     print(entry.kind, entry.name, entry.first, entry.second)
+    changed model.C 1.0 10.0
+    removed model.gamma 0.1 None
+    added model.kernel None rbf
+
+    """
+
+    first, second = _as_flat_dict(first), _as_flat_dict(second)
+    first_names, second_names = list(first), list(second)
+    first_paths = [_path(name) for name in first_names]
+    second_paths = [_path(name) for name in second_names]
+
+    diff = []
+    i = j = 0
+    while i < len(first_names) or j < len(second_names):
+        if j == len(second_names) or (
+            i < len(first_names) and first_paths[i] < second_paths[j]
+        ):
+            name = first_names[i]
+            diff.append(DiffEntry(name, DiffKinds.KIND_REMOVED, first[name], None))
+            i += 1
+        elif i == len(first_names) or second_paths[j] < first_paths[i]:
+            name = second_names[j]
+            diff.append(DiffEntry(name, DiffKinds.KIND_ADDED, None, second[name]))
+            j += 1
         else:
-            yield line
+            name = first_names[i]
+            if not same_values(first[name], second[name]):
+                diff.append(
+                    DiffEntry(name, DiffKinds.KIND_CHANGED, first[name], second[name])
+                )
+            i += 1
+            j += 1
 
+    return diff
 
-def colorful_config_diff(a, b):
 
-    a = json.dumps(a.to_dict(), indent=4)
-    b = json.dumps(b.to_dict(), indent=4)
+def varying_parameters(configs):
+    """
+    Returns names of parameters that take more than one value across
+    `configs` (configs, nested or flat dicts), including parameters that
+    are missing in some of them. Every parameter of every config is
+    visited once, so the cost is linear in the total number of parameters
+    rather than quadratic in the number of configs, as with pairwise diffs.
+
+    Example:
+
+    >>> varying_parameters([
+    ...     dict(model=dict(C=1.0, kernel="rbf"), seed=1),
+    ...     dict(model=dict(C=10.0, kernel="rbf"), seed=1),
+    ...     dict(model=dict(C=10.0, kernel="rbf"), seed=1, gamma=0.1),
+    ... ])
+    ['gamma', 'model.C']
 
-    diff = difflib.unified_diff(a.split("\n"), b.split("\n"))
-    return "\n".join(color_diff(diff))
+    """
+
+    first_values = dict()
+    counts = defaultdict(int)
+    varying = set()
+    n_configs = 0
+
+    for config in configs:
+        n_configs += 1
+        for name, value in _as_flat_dict(config).items():
+            counts[name] += 1
+            if name not in first_values:
+                first_values[name] = value
+            elif name not in varying and not same_values(first_values[name], value):
+                varying.add(name)
+
+    varying.update(name for name, count in counts.items() if count < n_configs)
+
+    return sorted(varying, key=_path)
+
+
+def _format_value(value):
+    return json.dumps(value, default=str)
+
+
+def format_diff(diff, color=True):
+    """
+    Formats a diff from `config_diff` as lines of text:
+    `+ name: value` for added, `- name: value` for removed and
+    `~ name: first -> second` for changed parameters.
+    """
+
+    styles = {
+        DiffKinds.KIND_ADDED: green,
+        DiffKinds.KIND_REMOVED: red,
+        DiffKinds.KIND_CHANGED: blue
+    } if color else dict()
+
+    lines = []
+    for entry in diff:
+        if entry.kind == DiffKinds.KIND_ADDED:
+            line = "+ {name}: {value}".format(
+                name=entry.name, value=_format_value(entry.second)
+            )
+        elif entry.kind == DiffKinds.KIND_REMOVED:
+            line = "- {name}: {value}".format(
+                name=entry.name, value=_format_value(entry.first)
+            )
+        else:
+            line = "~ {name}: {first} -> {second}".format(
+                name=entry.name,
+                first=_format_value(entry.first),
+                second=_format_value(entry.second)
+            )
+        style = styles.get(entry.kind)
+        lines.append(style(line) if style is not None else line)
+
+    return "\n".join(lines)
+
+
+def diff_to_dict(diff):
+    """
+    Turns a diff from `config_diff` into a JSON-serializable dict
+    with `added`, `removed` and `changed` sections.
+    """
+
+    result = OrderedDict((kind, OrderedDict()) for kind in DiffKinds.POSSIBLE_KINDS)
+    for entry in diff:
+        if entry.kind == DiffKinds.KIND_ADDED:
+            value = entry.second
+        elif entry.kind == DiffKinds.KIND_REMOVED:
+            value = entry.first
+        else:
+            value = OrderedDict(first=entry.first, second=entry.second)
+        result[entry.kind][entry.name] = value
+    return result
+
+
+def colorful_config_diff(a, b):
+    """Returns a colored structural diff between two configs"""
 
+    diff = config_diff(a, b)
+    if not diff:
+        return bold("Configs are identical.")
+    return format_diff(diff)
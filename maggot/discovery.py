@@ -0,0 +1,129 @@
+import os
+import glob
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from maggot.containers import flatten_dict
+
+
+MAGGOT_DIR = ".maggot"
+
+
+def _scan(path):
+    """
+    Lists a directory once and returns a pair `(is_experiment, subdirectories)`.
+    `DirEntry` caches file types, so no extra `stat` calls are made.
+    """
+
+    subdirectories = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                if entry.name == MAGGOT_DIR:
+                    return True, []
+                if not entry.name.startswith("."):
+                    subdirectories.append((entry.name, entry.is_symlink()))
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return False, []
+
+    return False, subdirectories
+
+
+def find_experiments(root, workers=None, indexed=None):
+    """
+    Recursively finds experiment directories (those that contain a `.maggot`
+    directory) under `root` and returns a sorted list of their paths
+    relative to `root`. Experiments are not searched for further, and
+    hidden directories are skipped. Symlinked directories are reported if
+    they are experiments, but never descended into, so links cannot cause
+    cycles.
+
+    Each directory is listed exactly once and independent subtrees are
+    listed concurrently, level by level, with `workers` threads.
+
+    `indexed` is called with the path of every directory that is not an
+    experiment and returns names of its subdirectories that are known to be
+    experiments (e.g. from a catalog), which are reported without listing them.
+
+    If `root` itself is an experiment, returns `["."]`.
+    """
+
+    experiments = []
+    # (relative path, whether the directory may be descended into)
+    frontier = [("", True)]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while frontier:
+            paths = [os.path.join(root, relpath) for relpath, _ in frontier]
+            next_frontier = []
+            for (relpath, descend), (is_experiment, subdirectories) in zip(
+                frontier, executor.map(_scan, paths)
+            ):
+                if is_experiment:
+                    experiments.append(relpath or ".")
+                    continue
+                if not descend:
+                    continue
+                known = indexed(os.path.join(root, relpath)) if indexed is not None else ()
+                for name, is_symlink in subdirectories:
+                    if name in known:
+                        experiments.append(os.path.join(relpath, name))
+                    else:
+                        next_frontier.append((os.path.join(relpath, name), not is_symlink))
+            frontier = next_frontier
+
+    return sorted(experiments)
+
+
+def expand_roots(patterns):
+    """
+    Expands glob patterns (e.g. `experiments/*/sweep-?`) in a list of
+    directories, keeping the order of patterns. Patterns without
+    wildcards are kept as is, even if they do not exist.
+    """
+
+    roots = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(path for path in glob.glob(pattern) if os.path.isdir(path))
+        else:
+            matches = [pattern]
+        for path in matches:
+            if path not in roots:
+                roots.append(path)
+    return roots
+
+
+def find_all_experiments(roots, workers=None, indexed=None):
+    """
+    Finds experiments under all `roots` (see `find_experiments`) and returns
+    a list of `(name, root, relpath)` triples sorted by name. With a single
+    root experiments are named by their paths relative to it, otherwise
+    the root is prepended, so that names stay unique in merged output.
+    """
+
+    experiments = []
+    for root in roots:
+        for relpath in find_experiments(root, workers=workers, indexed=indexed):
+            if len(roots) > 1:
+                name = os.path.normpath(os.path.join(root, relpath))
+            elif relpath == ".":
+                name = os.path.basename(os.path.abspath(root))
+            else:
+                name = relpath
+            experiments.append((name, root, relpath))
+
+    experiments.sort()
+    return experiments
+
+
+def load_flat_config(experiment_dir):
+    """Returns flattened config of an experiment read from disk"""
+
+    try:
+        with open(os.path.join(experiment_dir, ".maggot", "config.json"), "r") as fp:
+            return flatten_dict(json.load(fp))
+    except FileNotFoundError:
+        return dict()
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+from collections import namedtuple
+
+from maggot.locking import atomic_write
+
+
+# written by rank 0 once the experiment is set up, other ranks wait for it
+WORLD_FILE = "world.json"
+
+# without a launch id, a world file is considered to belong to the current
+# run if rank 0 started at most this many seconds before the rank that reads it
+MAX_START_SKEW = 60.0
+
+# set by `torchrun`, the same for all ranks of a launch (restarts included)
+RUN_ID_VARIABLE = "TORCHELASTIC_RUN_ID"
+RESTART_COUNT_VARIABLE = "TORCHELASTIC_RESTART_COUNT"
+# a nonce that other launchers can export to all ranks of a launch
+LAUNCH_ID_VARIABLE = "MAGGOT_LAUNCH_ID"
+
+
+RankInfo = namedtuple("RankInfo", ["rank", "local_rank", "world_size"])
+
+
+def _from_environ(value, variable, environ):
+    if value is not None:
+        return int(value)
+    if environ.get(variable, "") != "":
+        return int(environ[variable])
+    return None
+
+
+def detect_rank(rank=None, local_rank=None, world_size=None, environ=None):
+    """
+    Returns a RankInfo of the current process. Values that are not given
+    explicitly are read from `RANK`, `LOCAL_RANK` and `WORLD_SIZE`
+    environment variables, which are set by launchers like `torchrun`.
+
+    Example:
+
+    >>> detect_rank(environ=dict(RANK="3", LOCAL_RANK="1", WORLD_SIZE="4"))
+    RankInfo(rank=3, local_rank=1, world_size=4)
+    >>> detect_rank(environ=dict())
+    RankInfo(rank=0, local_rank=0, world_size=1)
+
+    """
+
+    environ = os.environ if environ is None else environ
+
+    rank = _from_environ(rank, "RANK", environ)
+    local_rank = _from_environ(local_rank, "LOCAL_RANK", environ)
+    world_size = _from_environ(world_size, "WORLD_SIZE", environ)
+
+    rank = 0 if rank is None else rank
+    local_rank = rank if local_rank is None else local_rank
+    world_size = 1 if world_size is None else world_size
+
+    if not 0 <= rank < world_size:
+        raise ValueError(
+            "`rank` should be in [0, {world_size}), got {rank}"
+            .format(world_size=world_size, rank=rank)
+        )
+
+    return RankInfo(rank, local_rank, world_size)
+
+
+def launch_id(environ=None):
+    """
+    Returns an id shared by all ranks of the current launch, taken from
+    `MAGGOT_LAUNCH_ID` or from the run id and restart count of `torchrun`,
+    or None if the launcher provides neither.
+
+    Example:
+
+    >>> launch_id(dict(TORCHELASTIC_RUN_ID="job", TORCHELASTIC_RESTART_COUNT="1"))
+    'job/1'
+    >>> launch_id(dict(MAGGOT_LAUNCH_ID="2b9f", TORCHELASTIC_RUN_ID="job"))
+    '2b9f'
+    >>> launch_id(dict()) is None
+    True
+
+    """
+
+    environ = os.environ if environ is None else environ
+
+    if environ.get(LAUNCH_ID_VARIABLE, "") != "":
+        return environ[LAUNCH_ID_VARIABLE]
+    if environ.get(RUN_ID_VARIABLE, "") != "":
+        return "{run_id}/{restart_count}".format(
+            run_id=environ[RUN_ID_VARIABLE],
+            restart_count=environ.get(RESTART_COUNT_VARIABLE, "0")
+        )
+    return None
+
+
+def clear_world(maggot_meta_dir):
+    """
+    Removes the world file of a previous run, so that other ranks of
+    the current run do not mistake it for the one of their rank 0.
+    """
+
+    try:
+        os.remove(os.path.join(maggot_meta_dir, WORLD_FILE))
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+
+
+def write_world(maggot_meta_dir, world_size, session, started, launch=None):
+    """
+    Announces to other ranks that the experiment is ready, along with
+    the name of the log session they should join.
+    """
+
+    atomic_write(
+        os.path.join(maggot_meta_dir, WORLD_FILE),
+        json.dumps(dict(
+            world_size=world_size, session=session, started=started, launch=launch
+        ))
+    )
+
+
+def read_world(maggot_meta_dir):
+    try:
+        with open(os.path.join(maggot_meta_dir, WORLD_FILE), "r") as fp:
+            return json.load(fp)
+    except (FileNotFoundError, NotADirectoryError, ValueError):
+        return None
+
+
+def _is_current_world(world, started, launch):
+    if world is None:
+        return False
+    if launch is not None:
+        return world.get("launch") == launch
+    return world["started"] >= started - MAX_START_SKEW
+
+
+def wait_for_world(maggot_meta_dir, started, timeout, launch=None):
+    """
+    Polls for a world file written by rank 0 of the current run, so that
+    files left by previous runs are ignored. If the launcher provides
+    a `launch` id (see `launch_id`), it must match; otherwise rank 0 must
+    have started no earlier than `MAX_START_SKEW` seconds before `started`.
+
+    Raises TimeoutError if there is none after `timeout` seconds.
+    """
+
+    delay = 0.01
+    deadline = time.time() + timeout
+    while True:
+        world = read_world(maggot_meta_dir)
+        if _is_current_world(world, started, launch):
+            return world
+        if time.time() >= deadline:
+            raise TimeoutError(
+                "Rank 0 has not set up {maggot_meta_dir} in {timeout} seconds"
+                .format(maggot_meta_dir=maggot_meta_dir, timeout=timeout)
+            )
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
@@ -1,14 +1,44 @@
 import os
 import sys
-import subprocess
-import datetime
 import shutil
 import time
 import json
 
+from maggot.catalog import Catalog, PendingResults
 from maggot.config import Config
 from maggot.containers import NestedContainer
+from maggot.distributed import (
+    clear_world, detect_rank, launch_id, wait_for_world, write_world
+)
+from maggot.git import (
+    COMMIT_HASH_FILE,
+    GIT_STATUS_FILE,
+    find_git_dir,
+    resolve_ref,
+    start_capture,
+    wait_for_capture
+)
+from maggot.hashes import (
+    CONFIG_HASH_FILE,
+    HASH_NAME_LENGTH,
+    add_to_index,
+    lookup,
+    resolve_experiment
+)
+from maggot.locking import atomic_write
+from maggot.logfiles import rank_logfile
+from maggot.metrics import MetricStore
+from maggot.results import (
+    RESULTS_FILE,
+    RESULTS_JOURNAL_FILE,
+    compact_results,
+    fold_results,
+    format_journal_entry,
+    load_results
+)
+from maggot.tee import Tee, TeeModes, BackpressurePolicies, make_tee
 from maggot.utils import red
+from maggot.writer import BackgroundWriter, SyncWriter
 
 
 def is_same_directory(first, second):
@@ -18,7 +48,16 @@ def is_same_directory(first, second):
 class IfExistsModes:
     MODE_PROMPT = "prompt"
     MODE_EXIT = "exit"
-    POSSIBLE_MODES = (MODE_PROMPT, MODE_EXIT)
+    MODE_REUSE = "reuse"
+    MODE_CONTINUE = "continue"
+    MODE_DELETE = "delete"
+    POSSIBLE_MODES = (MODE_PROMPT, MODE_EXIT, MODE_REUSE, MODE_CONTINUE, MODE_DELETE)
+
+
+class NamingModes:
+    NAMING_IDENTIFIER = "identifier"
+    NAMING_HASH = "hash"
+    POSSIBLE_MODES = (NAMING_IDENTIFIER, NAMING_HASH)
 
 
 class IfExistsResponses:
@@ -69,7 +108,22 @@ class Experiment:
         experiments_dir="experiments",
         experiment_name=None,
         if_exists_mode=IfExistsModes.MODE_PROMPT,
-        add_date=False
+        add_date=False,
+        buffered_writes=False,
+        flush_interval=1.0,
+        max_pending_writes=1000,
+        tee_mode=TeeModes.MODE_SYNC,
+        tee_queue_size=1024,
+        tee_backpressure=BackpressurePolicies.POLICY_BLOCK,
+        log_rotation=None,
+        use_catalog=None,
+        naming=NamingModes.NAMING_IDENTIFIER,
+        reuse_include_private=False,
+        rank=None,
+        local_rank=None,
+        world_size=None,
+        rank_timeout=600.0,
+        save_git_diff=False
     ):
         """
         Create a new Experiment instance.
@@ -86,20 +140,138 @@ class Experiment:
             experiment_name: str
                 A custom experiment name that is used instead of one
                 generated from config parameters.
-            if_exists_mode: str, one of "prompt", "exit", "continue"
+            if_exists_mode: str, one of "prompt", "exit", "reuse", "continue", "delete"
                 Defines behavior in case experiment with the same name
                 already exists. The `prompt` option will prompt user with a question,
                 `exit` will simply print an error message and then
-                exit the script.
+                exit the script. The rest never prompt, which suits batch runs:
+                `continue` runs in the existing directory, `delete` removes the
+                existing experiment first, and with `reuse`, if an experiment
+                with the same config (compared by content hash,
+                see `find_completed`) already has results, it is restored and
+                `reused` is set, so that the caller can take its `results`
+                instead of running it again. Otherwise a new experiment is
+                created, or one without results is continued.
             add_date: bool
                 If given, appends current date str to beginning of the experiment name.
+            buffered_writes: bool
+                If given, results, registered directories and metrics are
+                queued in memory and written to disk by a background thread,
+                so that these calls never block on filesystem latency.
+                Everything is written on `flush()`, on exiting the context
+                manager, at interpreter exit and on SIGTERM.
+            flush_interval: float
+                Maximum number of seconds queued writes can wait before
+                being written to disk. Used only if `buffered_writes` is given.
+            max_pending_writes: int
+                Number of queued writes that triggers writing them to disk.
+                Used only if `buffered_writes` is given.
+            tee_mode: str, one of "sync", "queue", "fd"
+                Defines how stdout is duplicated to the log file inside the
+                context manager. The `sync` option writes on every call,
+                `queue` hands data to a bounded queue that is drained by
+                a writer thread in large batches, `fd` redirects file
+                descriptors 1 and 2, which also captures stderr and output
+                of C extensions and child processes, and prefixes every
+                logged line with a timestamp and a stream tag.
+            tee_queue_size: int
+                Maximum number of pending chunks of output in the `queue` mode.
+            tee_backpressure: str, one of "block", "drop"
+                Defines behavior in the `queue` mode when the queue is full.
+                The `block` option waits for the writer thread, `drop`
+                discards the output and counts dropped chunks.
+            log_rotation: maggot.logfiles.LogRotation
+                If given, log files are rotated by size or age, rotated
+                segments are compressed and the total size of logs is capped.
+            use_catalog: bool
+                Whether to keep the catalog (see `maggot.catalog`) at the root
+                of `experiments_dir` up to date with this experiment. If not
+                given, the catalog is updated only if it already exists.
+                Results are written to the catalog in batches, by the
+                background writer if `buffered_writes` is given and on
+                `flush()` otherwise, so `register_result` never waits for SQLite.
+            naming: str, one of "identifier", "hash"
+                Defines how experiment names are generated from configs.
+                The `identifier` option joins values of config parameters
+                (see `Config.identifier`), `hash` uses a prefix of the
+                content hash of the config (see `Config.content_hash`),
+                which stays short and unique for arbitrarily large configs.
+                In both cases the full hash and the identifier are stored
+                in the experiment, and the experiment is added to a hash
+                index at the root of `experiments_dir`, so that commands
+                like `maggot show-config` accept hash prefixes.
+            reuse_include_private: bool
+                If given, parameters that start with underscore must match
+                too for an experiment to be reused. Used only if
+                `if_exists_mode` is `reuse`.
+            rank: int
+                Rank of the current process in distributed training. If not
+                given, it is read from the `RANK` environment variable
+                (see `maggot.distributed.detect_rank`), and so are
+                `local_rank` and `world_size`. Only rank 0 creates the
+                experiment and writes its metadata, other ranks wait for it
+                and attach without prompting. Every rank logs into its own
+                log file, with lines prefixed by timestamps, so that
+                `maggot show-log` can merge them. Ranks of the same launch
+                are matched by `MAGGOT_LAUNCH_ID` or the run id of `torchrun`
+                if set (see `maggot.distributed.launch_id`). The environment
+                is not read when `resume_from` is given.
+            local_rank: int
+                Rank of the current process on its node, `LOCAL_RANK`.
+            world_size: int
+                Number of processes in distributed training, `WORLD_SIZE`.
+            rank_timeout: float
+                Number of seconds other ranks wait for rank 0 to set up
+                the experiment before raising TimeoutError.
+            save_git_diff: bool
+                If given, `git diff HEAD` is saved along with the commit hash,
+                so that runs with uncommitted changes can be reproduced.
+                The commit hash is read from `.git` directly, while the
+                status of the working tree and the diff are captured by git
+                in a background thread (see `maggot.git`), so creating an
+                experiment never waits for a subprocess.
         """
 
+        if if_exists_mode not in IfExistsModes.POSSIBLE_MODES:
+            raise ValueError(
+                "`if_exists_mode` should be one of {modes}"
+                .format(modes=IfExistsModes.POSSIBLE_MODES)
+            )
+        if naming not in NamingModes.POSSIBLE_MODES:
+            raise ValueError(
+                "`naming` should be one of {modes}"
+                .format(modes=NamingModes.POSSIBLE_MODES)
+            )
+
+        # only runs opened with a config are set up by the ranks of a launch,
+        # e.g. CLI tools that resume an experiment run as a single process
+        environ = dict() if resume_from is not None else None
+        self.rank, self.local_rank, self.world_size = detect_rank(
+            rank, local_rank, world_size, environ
+        )
+        launch = launch_id(environ)
+        started = time.time()
+
         self._custom_experiment_name = experiment_name
         self.experiments_dir = experiments_dir
+        self._naming = naming
+        self._save_git_diff = save_git_diff
         self._add_date = add_date
+        self._tee_options = dict(
+            tee_mode=tee_mode,
+            queue_size=tee_queue_size,
+            backpressure=tee_backpressure,
+            rotation=log_rotation
+        )
         self._date_string = self._make_date_string()
 
+        if buffered_writes:
+            self._writer = BackgroundWriter(flush_interval, max_pending_writes)
+        else:
+            self._writer = SyncWriter()
+        # captures `git status` of new experiments in the background
+        self._git_thread = None
+
         config_provided = config is not None
         resume_from_provided = resume_from is not None
 
@@ -109,8 +281,20 @@ class Experiment:
                 "be specified."
             )
 
-        elif config_provided:
+        self.reused = False
+        if config_provided:
             self.config = self._make_config(config)
+            if if_exists_mode == IfExistsModes.MODE_REUSE:
+                resume_from = self.find_completed(
+                    self.config, self.experiments_dir, reuse_include_private
+                )
+                self.reused = resume_from is not None
+
+        if resume_from is None and not self.is_rank_zero:
+            # the experiment is set up by rank 0 only
+            self._catalog = self._open_catalog(use_catalog)
+
+        elif resume_from is None:
 
             exist_ok = False
 
@@ -126,26 +310,121 @@ class Experiment:
             elif self.exists and if_exists_mode == IfExistsModes.MODE_EXIT:
                 self._exit(
                     "Experiment {experiment_dir} already exists, exiting.".
-                    format(experiments_dir=self.experiment_dir)
+                    format(experiment_dir=self.experiment_dir)
                 )
 
+            elif self.exists and if_exists_mode == IfExistsModes.MODE_CONTINUE:
+                exist_ok = True
+
+            elif self.exists and if_exists_mode == IfExistsModes.MODE_DELETE:
+                self._delete_experiment()
+
+            elif self.exists and if_exists_mode == IfExistsModes.MODE_REUSE:
+                if load_results(self._maggot_meta_dir) is not None:
+                    # same name, but a different config
+                    self._exit(
+                        "Experiment {experiment_dir} already exists with "
+                        "a different config, exiting."
+                        .format(experiment_dir=self.experiment_dir)
+                    )
+                # an unfinished run with the same name is continued
+                exist_ok = True
+
+            if exist_ok and self.world_size > 1:
+                clear_world(self._maggot_meta_dir)
             self._makedir(exist_ok)
             self._make_maggot_meta_dir(exist_ok)
             self._save_config()
-            self._save_git_commit_hash()
+            self._save_git_state()
             self._save_command()
             self._save_environ()
+            self._save_config_hash()
+            self._catalog = self._open_catalog(use_catalog)
+            if self._catalog is not None:
+                # replaces rows of a deleted experiment with the same name,
+                # results of a continued one are taken from disk
+                self._catalog.add_from_directory(self._catalog_name)
 
-        elif resume_from_provided:
+        else:
 
+            resume_from = resolve_experiment(resume_from)
             if self.is_experiment(resume_from):
                 experiments_dir, experiment_name = self._split_experiment_dir(resume_from)
                 self.experiments_dir = experiments_dir
                 self._custom_experiment_name = experiment_name
+                # the name of an existing experiment already includes its date
+                self._add_date = False
 
+            if self.is_rank_zero and self.world_size > 1:
+                clear_world(self._maggot_meta_dir)
             self.config = Config.from_json(self._config_file)
+            # a resumed experiment missing from the catalog is added
+            # on its first write, see `maggot.catalog.PendingResults`
+            self._catalog = self._open_catalog(use_catalog)
+
+        session = None
+        if not self.is_rank_zero:
+            session = wait_for_world(
+                self._maggot_meta_dir, started, rank_timeout, launch
+            )["session"]
+
+        self._buffered_writes = buffered_writes
+        self._pending_results = None
+        if self._catalog is not None:
+            self._pending_results = PendingResults(
+                self._catalog, self._catalog_name, self._maggot_meta_dir
+            )
+            self._writer.add_flush_hook(self._pending_results.write)
+
+        self._metric_store = MetricStore(self._metrics_dir, writer=self._writer)
+        self._setup_log_file(session)
+
+        if self.is_rank_zero and self.world_size > 1:
+            write_world(
+                self._maggot_meta_dir,
+                self.world_size,
+                session=os.path.basename(self._session_logfile),
+                started=started,
+                launch=launch
+            )
 
-        self._setup_log_file()
+    @staticmethod
+    def find_completed(config, experiments_dir="experiments", include_private=False):
+        """
+        Returns a path to an experiment in `experiments_dir` that has results
+        and the same config as `config` (compared by `Config.content_hash`),
+        or None if there is no such experiment. Candidates are looked up in
+        the hash index (see `maggot.hashes`) and at the default locations
+        for both naming modes, so no directories are scanned.
+        """
+
+        config = Experiment._make_config(config)
+        config_hash = config.content_hash()
+
+        candidates = lookup(experiments_dir, config_hash)
+        candidates += [config.identifier, config_hash[:HASH_NAME_LENGTH]]
+
+        for name in candidates:
+            experiment_dir = os.path.join(experiments_dir, name)
+            maggot_meta_dir = os.path.join(experiment_dir, ".maggot")
+            try:
+                candidate = Config.from_json(os.path.join(maggot_meta_dir, "config.json"))
+            except (OSError, ValueError):
+                # e.g. identifiers of long configs exceed the file name limit
+                continue
+            same_config = (
+                candidate.content_hash(include_private) ==
+                config.content_hash(include_private)
+            )
+            if same_config and load_results(maggot_meta_dir) is not None:
+                return experiment_dir
+
+        return None
+
+    @property
+    def is_rank_zero(self):
+        """Whether the current process is rank 0, or training is not distributed"""
+        return self.rank == 0
 
     @staticmethod
     def is_experiment(directory):
@@ -164,9 +443,12 @@ class Experiment:
         sys.exit()
 
     def _delete_experiment(self):
+        # a capture started by an earlier instance still writes into it
+        wait_for_capture(self._maggot_meta_dir)
         shutil.rmtree(self.experiment_dir)
 
-    def _make_config(self, config):
+    @staticmethod
+    def _make_config(config):
         if isinstance(config, str) and os.path.isfile(config):
             return Config.from_json(config)
         elif isinstance(config, dict):
@@ -191,19 +473,63 @@ class Experiment:
     def _save_config(self):
         self.config.to_json(self._config_file)
 
-    def _save_git_commit_hash(self):
-        try:
-            label = subprocess.check_output(
-                ["git", "rev-parse", "HEAD"],
-                stderr=subprocess.PIPE
-            )
-        except subprocess.CalledProcessError:
+    def _save_git_state(self):
+        git_dir, work_tree = find_git_dir()
+        if git_dir is None:
             # skip this step if current directory is
             # not a git repository
             return
 
-        with open(self._git_hash_file, "w") as f:
-            f.write(label.strip().decode())
+        commit_hash = resolve_ref(git_dir)
+        if commit_hash is not None:
+            atomic_write(self._git_hash_file, commit_hash)
+
+        thread = start_capture(
+            work_tree, self._maggot_meta_dir, self._save_git_diff, commit_hash
+        )
+        # only closing, including at exit, waits for the capture to finish,
+        # so that flushes never block on git
+        self._writer.add_close_hook(thread.join)
+        self._git_thread = thread
+
+    @property
+    def git_dirty(self):
+        """
+        Whether the working tree had uncommitted changes when the experiment
+        was created, or None if it is unknown, e.g. outside of a git repository.
+        """
+
+        if self._git_thread is not None:
+            self._git_thread.join()
+        try:
+            with open(os.path.join(self._maggot_meta_dir, GIT_STATUS_FILE), "r") as fp:
+                return bool(fp.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def _save_config_hash(self):
+        config_hash = self.config.content_hash()
+
+        atomic_write(self._config_hash_file, config_hash + "\n")
+        atomic_write(self._identifier_file, self.config.identifier + "\n")
+
+        add_to_index(self.experiments_dir, config_hash, self._catalog_name)
+
+    def _read_git_commit_hash(self):
+        try:
+            with open(self._git_hash_file, "r") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _open_catalog(self, use_catalog):
+        if use_catalog is None:
+            use_catalog = Catalog.exists(self.experiments_dir)
+        return Catalog(self.experiments_dir) if use_catalog else None
+
+    @property
+    def _catalog_name(self):
+        return os.path.basename(self.experiment_dir)
 
     def _split_experiment_dir(self, experiment_directory):
         experiment_directory = experiment_directory.rstrip("/")
@@ -217,9 +543,15 @@ class Experiment:
     @property
     def experiment_dir(self):
         prefix = self._date_string if self._add_date else ""
-        experiment_name = self._custom_experiment_name or self.config.identifier
+        experiment_name = self._custom_experiment_name or self._generated_name
         return os.path.join(self.experiments_dir, prefix + experiment_name)
 
+    @property
+    def _generated_name(self):
+        if self._naming == NamingModes.NAMING_HASH:
+            return self.config.content_hash()[:HASH_NAME_LENGTH]
+        return self.config.identifier
+
     @property
     def exists(self):
         return os.path.isdir(self.experiment_dir)
@@ -228,12 +560,16 @@ class Experiment:
     def _config_file(self):
         return os.path.join(self._maggot_meta_dir, "config.json")
 
-    def _setup_log_file(self):
+    def _setup_log_file(self, session=None):
         logdir = os.path.join(self._maggot_meta_dir, "logs")
         os.makedirs(logdir, exist_ok=True)
-        logfile = time.strftime("%Y-%m-%d-%H-%M-%S-%s", time.gmtime())
-        logfile = os.path.join(logdir, logfile)
-        self._logfile = logfile
+        if session is None:
+            session = time.strftime("%Y-%m-%d-%H-%M-%S-%s", time.gmtime())
+        self._session_logfile = os.path.join(logdir, session)
+        if self.world_size > 1:
+            self._logfile = rank_logfile(self._session_logfile, self.rank)
+        else:
+            self._logfile = self._session_logfile
 
     @property
     def logfile(self):
@@ -241,11 +577,27 @@ class Experiment:
 
     @property
     def _git_hash_file(self):
-        return os.path.join(self._maggot_meta_dir, "commit_hash")
+        return os.path.join(self._maggot_meta_dir, COMMIT_HASH_FILE)
 
     @property
     def _results_file(self):
-        return os.path.join(self._maggot_meta_dir, "results.json")
+        return os.path.join(self._maggot_meta_dir, RESULTS_FILE)
+
+    @property
+    def _results_journal_file(self):
+        return os.path.join(self._maggot_meta_dir, RESULTS_JOURNAL_FILE)
+
+    @property
+    def _metrics_dir(self):
+        return os.path.join(self._maggot_meta_dir, "metrics")
+
+    @property
+    def _config_hash_file(self):
+        return os.path.join(self._maggot_meta_dir, CONFIG_HASH_FILE)
+
+    @property
+    def _identifier_file(self):
+        return os.path.join(self._maggot_meta_dir, "identifier")
 
     @property
     def _command_file(self):
@@ -256,12 +608,10 @@ class Experiment:
         return os.path.join(self._maggot_meta_dir, "environ")
 
     def _save_command(self):
-        with open(self._command_file, "w") as fp:
-            fp.write(" ".join(sys.argv) + "\n")
+        atomic_write(self._command_file, " ".join(sys.argv) + "\n")
 
     def _save_environ(self):
-        with open(self._environ_file, "w") as fp:
-            json.dump(dict(os.environ), fp, indent=4)
+        atomic_write(self._environ_file, json.dumps(dict(os.environ), indent=4))
 
     @property
     def _registered_directories_file(self):
@@ -269,6 +619,7 @@ class Experiment:
 
     @property
     def directories(self):
+        self.flush()
         with open(self._registered_directories_file, "r") as fp:
             directories = [d.rstrip("\n") for d in fp.readlines()]
 
@@ -281,53 +632,59 @@ class Experiment:
         directory = os.path.join(self.experiment_dir, dirname)
         os.makedirs(directory, exist_ok=True)
 
-        with open(self._registered_directories_file, "a+") as fp:
-            fp.write(dirname)
-            fp.write("\n")
+        self._writer.append(self._registered_directories_file, dirname + "\n")
 
     def register_result(self, name, value):
-        if os.path.exists(self._results_file):
-            results = Config.from_json(self._results_file).as_flat_dict()
-        else:
-            results = dict()
-        results[name] = value
-        Config.from_flat_dict(results).to_json(self._results_file)
+        self._writer.append(
+            self._results_journal_file, format_journal_entry(name, value)
+        )
+        if self._pending_results is not None:
+            # the catalog is updated in batches, by the background writer
+            # if writes are buffered and on flush otherwise
+            first = self._pending_results.add(name, value)
+            if first and self._buffered_writes:
+                self._writer.submit(self._pending_results.write)
+
+    def flush(self):
+        """Writes all buffered results, directories and metrics to disk"""
+        self._writer.flush()
+
+    def compact_results(self):
+        """Folds the results journal into `results.json`"""
+        self.flush()
+        compact_results(self._results_file, self._results_journal_file)
+        if self._pending_results is not None:
+            # results files changed, but results in the catalog did not
+            self._pending_results.write(refresh=True)
 
     @property
     def results(self):
-        return Config.from_json(self._results_file)
+        self.flush()
+        results = fold_results(self._results_file, self._results_journal_file)
+        return Config.from_flat_dict(results)
+
+    def log_metric(self, name, value, step=None):
+        """
+        Appends a point to a step-indexed metric series, e.g. a loss curve.
+        If `step` is not given, the number of points logged so far is used.
+        """
+        self._metric_store.log(name, value, step)
+
+    @property
+    def metrics(self):
+        """
+        A mapping from metric names to series of steps and values:
+
+            steps, values = experiment.metrics["loss"]
+        """
+        return self._metric_store
 
     def __enter__(self):
-        self.tee = Tee(self.logfile, "a+")
+        tag = "rank{rank}".format(rank=self.rank) if self.world_size > 1 else None
+        self.tee = make_tee(self.logfile, "a+", tag=tag, **self._tee_options)
         return self
 
     def __exit__(self, *args):
         self.tee.close()
-
-
-class Tee:
-    """A helper class to duplicate stdout to a log file"""
-
-    def __init__(self, name, mode):
-        self.file = open(name, mode)
-        self.stdout = sys.stdout
-        sys.stdout = self
-
-        self._log_time()
-
-    def _log_time(self):
-        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.file.write("\n")
-        self.file.write(current_time)
-        self.file.write("\n\n")
-
-    def close(self, *args):
-        sys.stdout = self.stdout
-        self.file.close()
-
-    def write(self, data):
-        self.file.write(data)
-        self.stdout.write(data)
-
-    def flush(self):
-        self.file.flush()
+        self._writer.close()
+        self.compact_results()
@@ -0,0 +1,195 @@
+import os
+import subprocess
+import threading
+
+from maggot.locking import atomic_write
+
+
+COMMIT_HASH_FILE = "commit_hash"
+GIT_STATUS_FILE = "git_status"
+GIT_DIFF_FILE = "git_diff"
+
+# symbolic refs pointing to symbolic refs are rare, cycles are invalid
+MAX_SYMREF_DEPTH = 10
+
+# threads of `start_capture` that are still running, by `.maggot` directory
+_captures = {}
+_captures_lock = threading.Lock()
+
+
+def _read_text(path):
+    try:
+        with open(path, "r") as fp:
+            return fp.read().strip()
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return None
+
+
+def find_git_dir(path="."):
+    """
+    Returns a pair `(git_dir, work_tree)` for the repository that contains
+    `path`, or `(None, None)` if there is none. Besides `.git` directories,
+    `.git` files of worktrees and submodules (`gitdir: <path>`) and the
+    `GIT_DIR` environment variable are supported.
+    """
+
+    if os.environ.get("GIT_DIR"):
+        git_dir = os.path.abspath(os.environ["GIT_DIR"])
+        return git_dir, os.environ.get("GIT_WORK_TREE") or os.path.dirname(git_dir)
+
+    path = os.path.abspath(path)
+    while True:
+        candidate = os.path.join(path, ".git")
+        if os.path.isdir(candidate):
+            return candidate, path
+        if os.path.isfile(candidate):
+            content = _read_text(candidate) or ""
+            if content.startswith("gitdir:"):
+                git_dir = content[len("gitdir:"):].strip()
+                return os.path.normpath(os.path.join(path, git_dir)), path
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None, None
+        path = parent
+
+
+def _common_dir(git_dir):
+    # linked worktrees keep their own HEAD, but share refs with the main repository
+    common_dir = _read_text(os.path.join(git_dir, "commondir"))
+    if common_dir is None:
+        return git_dir
+    return os.path.normpath(os.path.join(git_dir, common_dir))
+
+
+def _read_packed_ref(common_dir, ref):
+    try:
+        with open(os.path.join(common_dir, "packed-refs"), "r") as fp:
+            for line in fp:
+                # skip the header and peeled values of annotated tags
+                if line.startswith(("#", "^")):
+                    continue
+                commit_hash, _, name = line.rstrip("\n").partition(" ")
+                if name == ref:
+                    return commit_hash
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def resolve_ref(git_dir, ref="HEAD"):
+    """
+    Resolves a ref (e.g. `HEAD` or `refs/heads/master`) into a commit hash
+    by reading loose refs and `packed-refs`, or returns None if it cannot
+    be resolved, e.g. in a repository without commits or one that uses
+    the reftable format.
+    """
+
+    common_dir = _common_dir(git_dir)
+
+    for _ in range(MAX_SYMREF_DEPTH):
+        # per-worktree refs like HEAD live in the worktree's own git dir
+        content = _read_text(os.path.join(git_dir, ref))
+        if content is None and common_dir != git_dir:
+            content = _read_text(os.path.join(common_dir, ref))
+        if content is None:
+            content = _read_packed_ref(common_dir, ref)
+        if not content:
+            return None
+
+        if content.startswith("ref:"):
+            ref = content[len("ref:"):].strip()
+            continue
+        return content
+
+    return None
+
+
+def read_head(path="."):
+    """
+    Returns the commit hash of HEAD of the repository that contains `path`
+    without running git, or None if it cannot be found.
+    """
+
+    git_dir, _ = find_git_dir(path)
+    if git_dir is None:
+        return None
+    return resolve_ref(git_dir)
+
+
+def _git(work_tree, *args):
+    return subprocess.run(
+        ["git"] + list(args),
+        cwd=work_tree,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True
+    ).stdout
+
+
+def capture_git_state(work_tree, maggot_meta_dir, save_diff=False, commit_hash=None):
+    """
+    Saves the status of `work_tree` (`git status --porcelain` of tracked
+    files only, since experiments are often kept untracked inside the
+    repository) into `maggot_meta_dir`, and `git diff HEAD` if `save_diff`.
+    If `commit_hash` could not be resolved by reading files, git resolves
+    it too. Meant to be run in a background thread, errors (e.g. git is
+    not installed) are ignored.
+    """
+
+    try:
+        if commit_hash is None:
+            commit_hash = _git(work_tree, "rev-parse", "HEAD").strip()
+            atomic_write(os.path.join(maggot_meta_dir, COMMIT_HASH_FILE), commit_hash)
+
+        atomic_write(
+            os.path.join(maggot_meta_dir, GIT_STATUS_FILE),
+            _git(work_tree, "status", "--porcelain", "--untracked-files=no")
+        )
+        if save_diff:
+            atomic_write(
+                os.path.join(maggot_meta_dir, GIT_DIFF_FILE),
+                _git(work_tree, "diff", "HEAD")
+            )
+    except (OSError, subprocess.CalledProcessError):
+        pass
+
+
+def _run_capture(maggot_meta_dir, *args):
+    try:
+        capture_git_state(*args)
+    finally:
+        with _captures_lock:
+            if _captures.get(maggot_meta_dir) is threading.current_thread():
+                del _captures[maggot_meta_dir]
+
+
+def start_capture(work_tree, maggot_meta_dir, save_diff=False, commit_hash=None):
+    """
+    Runs `capture_git_state` in a daemon thread and returns the thread, so
+    that creating an experiment never waits for git. See `wait_for_capture`.
+    """
+
+    key = os.path.abspath(maggot_meta_dir)
+    thread = threading.Thread(
+        target=_run_capture,
+        args=(key, work_tree, maggot_meta_dir, save_diff, commit_hash),
+        name="maggot-git",
+        daemon=True
+    )
+    with _captures_lock:
+        _captures[key] = thread
+    thread.start()
+    return thread
+
+
+def wait_for_capture(maggot_meta_dir):
+    """
+    Waits for a capture into `maggot_meta_dir` started by this process,
+    e.g. before the directory is deleted.
+    """
+
+    with _captures_lock:
+        thread = _captures.get(os.path.abspath(maggot_meta_dir))
+    if thread is not None:
+        thread.join()
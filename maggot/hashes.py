@@ -0,0 +1,148 @@
+import os
+import re
+import itertools
+
+from maggot.locking import locked_file
+
+
+# a sorted index of unique `<config hash> <experiment name>` lines
+# at the root of `experiments_dir`
+HASH_INDEX_FILE = ".maggot_hashes"
+# the first line of sorted indices, sorts before all hashes; indices of
+# older versions were appended to without sorting and are sorted on write
+HASH_INDEX_HEADER = b"# sorted\n"
+CONFIG_HASH_FILE = "config_hash"
+
+# length of experiment names in the `hash` naming mode
+HASH_NAME_LENGTH = 12
+# shorter prefixes are too likely to be confused with experiment names
+MIN_PREFIX_LENGTH = 4
+
+HASH_PREFIX_PATTERN = re.compile(r"^[0-9a-f]{%d,64}$" % MIN_PREFIX_LENGTH)
+
+
+def _bisect(fp, key, start=0):
+    """
+    Moves a file of sorted lines starting at offset `start` to the first
+    line that is not less than `key` and returns its offset, reading only
+    O(log(size)) lines.
+    """
+
+    low, high = start, fp.seek(0, os.SEEK_END)
+    while low < high:
+        middle = (low + high) // 2
+        fp.seek(middle)
+        if middle > start:
+            # skip the line `middle` points into
+            fp.readline()
+        line = fp.readline()
+        if line and line < key:
+            low = middle + 1
+        else:
+            high = middle
+
+    fp.seek(low)
+    if low > start:
+        fp.readline()
+    return fp.tell()
+
+
+def add_to_index(experiments_dir, config_hash, name):
+    """
+    Inserts an experiment into the hash index of `experiments_dir`, unless
+    it is there already, e.g. when an experiment is continued. The index is
+    changed under a lock, so concurrent runs do not interleave.
+    """
+
+    path = os.path.join(experiments_dir or ".", HASH_INDEX_FILE)
+    entry = "{config_hash} {name}\n".format(config_hash=config_hash, name=name).encode()
+
+    # created if missing, `r+` writes at any offset unlike `a`
+    open(path, "ab").close()
+    with locked_file(path, "r+b") as fp:
+        if fp.readline() != HASH_INDEX_HEADER:
+            fp.seek(0)
+            entries = set(line for line in fp if line.endswith(b"\n"))
+            entries.add(entry)
+            fp.seek(0)
+            fp.write(HASH_INDEX_HEADER + b"".join(sorted(entries)))
+            fp.truncate()
+            return
+
+        offset = _bisect(fp, entry, start=len(HASH_INDEX_HEADER))
+        rest = fp.read()
+        if rest.startswith(entry):
+            return
+        fp.seek(offset)
+        fp.write(entry + rest)
+
+
+def read_config_hash(experiment_dir):
+    try:
+        with open(os.path.join(experiment_dir, ".maggot", CONFIG_HASH_FILE), "r") as fp:
+            return fp.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def lookup(experiments_dir, prefix):
+    """
+    Returns sorted names of experiments in `experiments_dir` whose config
+    hash starts with `prefix`, found with a binary search in the index.
+    Entries are never removed from the index, so entries of removed or
+    recreated experiments are verified against the config hash stored in
+    the experiment itself.
+    """
+
+    experiments_dir = experiments_dir or "."
+    key = prefix.encode()
+    try:
+        with locked_file(os.path.join(experiments_dir, HASH_INDEX_FILE), "rb", shared=True) as fp:
+            if fp.readline() == HASH_INDEX_HEADER:
+                _bisect(fp, key, start=len(HASH_INDEX_HEADER))
+                lines = itertools.takewhile(lambda line: line.startswith(key), fp)
+            else:
+                # an unsorted index of an older version
+                fp.seek(0)
+                lines = (line for line in fp if line.startswith(key))
+
+            candidates = set()
+            for line in lines:
+                config_hash, _, name = line.decode().rstrip("\n").partition(" ")
+                if name:
+                    candidates.add(name)
+    except FileNotFoundError:
+        return []
+
+    return sorted(
+        name for name in candidates
+        if (read_config_hash(os.path.join(experiments_dir, name)) or "").startswith(prefix)
+    )
+
+
+def resolve_experiment(experiment):
+    """
+    Resolves `experiments_dir/<hash prefix>` into a path to the experiment
+    with a matching config hash. Existing directories and anything that is
+    not a hash prefix are returned as is, so are prefixes without matches.
+
+    Raises ValueError if the prefix matches several experiments.
+    """
+
+    if os.path.isdir(experiment):
+        return experiment
+
+    experiments_dir, prefix = os.path.split(experiment.rstrip("/"))
+    if not HASH_PREFIX_PATTERN.match(prefix):
+        return experiment
+
+    names = lookup(experiments_dir, prefix)
+    if len(names) > 1:
+        raise ValueError(
+            "Hash prefix {prefix} is ambiguous, it matches experiments: {names}"
+            .format(prefix=prefix, names=", ".join(names))
+        )
+    if not names:
+        return experiment
+
+    return os.path.join(experiments_dir, names[0])
@@ -0,0 +1,372 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import importlib
+import threading
+import subprocess
+from collections import namedtuple
+
+from maggot.experiment import Experiment, IfExistsModes
+from maggot.locking import atomic_write
+
+
+JOBS_FILE = ".maggot_jobs.sqlite"
+EXIT_STATUS_FILE = "exit_status"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    config TEXT NOT NULL,
+    target TEXT NOT NULL,
+    options TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    experiment_dir TEXT,
+    exit_status INTEGER,
+    created REAL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+
+class JobStates:
+    STATE_PENDING = "pending"
+    STATE_RUNNING = "running"
+    STATE_DONE = "done"
+    STATE_FAILED = "failed"
+    POSSIBLE_STATES = (STATE_PENDING, STATE_RUNNING, STATE_DONE, STATE_FAILED)
+
+
+Job = namedtuple(
+    "Job",
+    ["id", "config", "target", "options", "state", "attempts", "max_attempts",
+     "worker", "experiment_dir", "exit_status"]
+)
+
+_JOB_COLUMNS = (
+    "id, config, target, options, state, attempts, max_attempts, "
+    "worker, experiment_dir, exit_status"
+)
+
+
+def _make_job(row):
+    id, config, target, options, *rest = row
+    return Job(id, json.loads(config), target, json.loads(options), *rest)
+
+
+def load_target(target):
+    """Imports a `module:function` target"""
+
+    module, _, function = target.partition(":")
+    if not module or not function:
+        raise ValueError(
+            "Target should look like `module:function`, got {target!r}".format(target=target)
+        )
+    return getattr(importlib.import_module(module), function)
+
+
+class JobQueue:
+    """
+    A durable queue of experiments stored in an SQLite file at the root of
+    `experiments_dir`. Every job is a config and a `module:function` target
+    that is called with the Experiment created for the config.
+
+    Workers take jobs with time-limited leases and renew them while jobs
+    run. A job whose lease expires, e.g. because the worker crashed or the
+    machine rebooted, is handed out again, until it has been attempted
+    `max_attempts` times.
+    """
+
+    def __init__(self, experiments_dir):
+        self.experiments_dir = experiments_dir or "."
+        self.path = os.path.join(self.experiments_dir, JOBS_FILE)
+
+        os.makedirs(self.experiments_dir, exist_ok=True)
+        # transactions are managed explicitly, see `_transaction`
+        self._connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError:
+            # e.g. file systems without shared memory support
+            pass
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def _transaction(self):
+        return _Transaction(self._connection)
+
+    def add(self, config, target, options=None, max_attempts=3):
+        """
+        Enqueues a job and returns its id. `config` is a nested dict (or a Config),
+        `options` are keyword arguments for Experiment, e.g. `naming`.
+        """
+
+        if not isinstance(config, dict):
+            config = config.to_dict()
+
+        with self._transaction():
+            cursor = self._connection.execute(
+                "INSERT INTO jobs (config, target, options, state, max_attempts, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (json.dumps(config), target, json.dumps(options or dict()),
+                 JobStates.STATE_PENDING, max_attempts, time.time())
+            )
+        return cursor.lastrowid
+
+    def acquire(self, worker, lease):
+        """
+        Takes the oldest pending job, or one whose lease has expired, for
+        `lease` seconds and returns it, or returns None if there are none.
+        """
+
+        now = time.time()
+        with self._transaction():
+            # jobs of crashed workers are either re-queued or given up on
+            self._connection.execute(
+                "UPDATE jobs SET state = ?, finished = ? "
+                "WHERE state = ? AND lease_expires < ? AND attempts >= max_attempts",
+                (JobStates.STATE_FAILED, now, JobStates.STATE_RUNNING, now)
+            )
+            self._connection.execute(
+                "UPDATE jobs SET state = ?, worker = NULL "
+                "WHERE state = ? AND lease_expires < ?",
+                (JobStates.STATE_PENDING, JobStates.STATE_RUNNING, now)
+            )
+
+            row = self._connection.execute(
+                "SELECT id FROM jobs WHERE state = ? ORDER BY id LIMIT 1",
+                (JobStates.STATE_PENDING,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            self._connection.execute(
+                "UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1, started = ? WHERE id = ?",
+                (JobStates.STATE_RUNNING, worker, now + lease, now, row[0])
+            )
+
+        return self.get(row[0])
+
+    def renew(self, job_id, worker, lease):
+        """Extends the lease of a running job, returns False if it was lost"""
+
+        with self._transaction():
+            cursor = self._connection.execute(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE id = ? AND worker = ? AND state = ?",
+                (time.time() + lease, job_id, worker, JobStates.STATE_RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id, worker, exit_status):
+        """
+        Records the exit status of a job. Failed jobs are re-queued
+        until they run out of attempts. Returns False if `worker` no
+        longer holds the lease of the job, in which case nothing is recorded.
+        """
+
+        with self._transaction():
+            job = self.get(job_id)
+            if exit_status == 0:
+                state = JobStates.STATE_DONE
+            elif job.attempts < job.max_attempts:
+                state = JobStates.STATE_PENDING
+            else:
+                state = JobStates.STATE_FAILED
+
+            cursor = self._connection.execute(
+                "UPDATE jobs SET state = ?, exit_status = ?, finished = ?, "
+                "lease_expires = NULL WHERE id = ? AND worker = ? AND state = ?",
+                (state, exit_status, time.time(), job_id, worker, JobStates.STATE_RUNNING)
+            )
+        return cursor.rowcount == 1
+
+    def release(self, job_id, worker):
+        """Puts an interrupted job back without counting the attempt"""
+
+        with self._transaction():
+            self._connection.execute(
+                "UPDATE jobs SET state = ?, worker = NULL, lease_expires = NULL, "
+                "attempts = attempts - 1 WHERE id = ? AND worker = ? AND state = ?",
+                (JobStates.STATE_PENDING, job_id, worker, JobStates.STATE_RUNNING)
+            )
+
+    def set_experiment_dir(self, job_id, experiment_dir):
+        with self._transaction():
+            self._connection.execute(
+                "UPDATE jobs SET experiment_dir = ? WHERE id = ?",
+                (experiment_dir, job_id)
+            )
+
+    def get(self, job_id):
+        row = self._connection.execute(
+            "SELECT {columns} FROM jobs WHERE id = ?".format(columns=_JOB_COLUMNS),
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        return _make_job(row)
+
+    def jobs(self, state=None):
+        if state is None:
+            rows = self._connection.execute(
+                "SELECT {columns} FROM jobs ORDER BY id".format(columns=_JOB_COLUMNS)
+            )
+        else:
+            rows = self._connection.execute(
+                "SELECT {columns} FROM jobs WHERE state = ? ORDER BY id"
+                .format(columns=_JOB_COLUMNS),
+                (state,)
+            )
+        return [_make_job(row) for row in rows]
+
+    def counts(self):
+        rows = self._connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+        counts = dict.fromkeys(JobStates.POSSIBLE_STATES, 0)
+        counts.update(rows)
+        return counts
+
+
+class _Transaction:
+    """
+    Takes the write lock at the beginning of a transaction, so that
+    concurrent workers never hand out the same job twice.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __enter__(self):
+        self._connection.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *args):
+        self._connection.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+
+
+def run_job(experiments_dir, job_id):
+    """
+    Runs a single job in the current process. Used by workers in
+    child processes, so that crashes of jobs never take workers down.
+    """
+
+    queue = JobQueue(experiments_dir)
+    job = queue.get(job_id)
+
+    function = load_target(job.target)
+    # a retried job continues in the directory of its previous attempt
+    options = dict(job.options, if_exists_mode=IfExistsModes.MODE_CONTINUE)
+    experiment = Experiment(job.config, experiments_dir=experiments_dir, **options)
+
+    queue.set_experiment_dir(job_id, experiment.experiment_dir)
+    queue.close()
+
+    with experiment:
+        function(experiment)
+
+
+def write_exit_status(experiment_dir, exit_status):
+    path = os.path.join(experiment_dir, ".maggot", EXIT_STATUS_FILE)
+    atomic_write(path, "{exit_status}\n".format(exit_status=exit_status))
+
+
+class Worker:
+    """
+    Runs jobs from a JobQueue in `n_slots` child processes at a time.
+    Every slot takes a job, runs it with `python -m maggot.jobs`, renews
+    its lease every `lease / 3` seconds while it runs, and records its
+    exit status in the queue and in `.maggot/exit_status` of the experiment.
+    """
+
+    def __init__(self, experiments_dir, n_slots=1, lease=60.0, poll_interval=1.0):
+        self.experiments_dir = experiments_dir
+        self.n_slots = n_slots
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.name = "{host}:{pid}".format(host=socket.gethostname(), pid=os.getpid())
+        self._stop = threading.Event()
+
+    def run(self, exit_when_empty=False):
+        """Runs jobs until `stop` is called, or the queue is empty if `exit_when_empty`"""
+
+        threads = [
+            threading.Thread(
+                target=self._run_slot, args=(slot, exit_when_empty),
+                name="maggot-worker-{slot}".format(slot=slot), daemon=True
+            )
+            for slot in range(self.n_slots)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.1)
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in threads:
+                thread.join()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run_slot(self, slot, exit_when_empty):
+
+        worker = "{name}:{slot}".format(name=self.name, slot=slot)
+        # sqlite connections cannot be shared between threads
+        queue = JobQueue(self.experiments_dir)
+        try:
+            while not self._stop.is_set():
+                job = queue.acquire(worker, self.lease)
+                if job is None:
+                    if exit_when_empty:
+                        return
+                    self._stop.wait(self.poll_interval)
+                    continue
+                self._run(queue, job, worker)
+        finally:
+            queue.close()
+
+    def _run(self, queue, job, worker):
+
+        process = subprocess.Popen(
+            [sys.executable, "-m", "maggot.jobs", self.experiments_dir, str(job.id)]
+        )
+
+        while True:
+            try:
+                exit_status = process.wait(timeout=self.lease / 3)
+                break
+            except subprocess.TimeoutExpired:
+                if self._stop.is_set():
+                    process.terminate()
+                elif not queue.renew(job.id, worker, self.lease):
+                    # the lease expired and the job was handed to another worker
+                    process.terminate()
+
+        if self._stop.is_set() and exit_status != 0:
+            queue.release(job.id, worker)
+            return
+
+        if not queue.finish(job.id, worker, exit_status):
+            # the job belongs to another worker now, which records its outcome
+            return
+        experiment_dir = queue.get(job.id).experiment_dir
+        if experiment_dir is not None and os.path.isdir(experiment_dir):
+            write_exit_status(experiment_dir, exit_status)
+
+
+if __name__ == "__main__":
+    run_job(sys.argv[1], int(sys.argv[2]))
@@ -0,0 +1,85 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # e.g. on Windows, where files are still replaced atomically,
+    # but concurrent appends are not serialized
+    fcntl = None
+
+
+def _lock(fp, shared=False):
+    if fcntl is not None:
+        fcntl.flock(fp.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+
+def _is_current(fp, path):
+    try:
+        return os.path.samestat(os.fstat(fp.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+@contextmanager
+def locked_file(path, mode="ab", shared=False):
+    """
+    Opens a file and holds an advisory `flock` on it until the file is
+    closed. If the file was replaced or removed while waiting for the lock
+    (e.g. by `compact_results`), it is opened again, so the lock is always
+    held on the file that is currently at `path`.
+
+    Raises FileNotFoundError if the file does not exist and `mode` does
+    not create it.
+    """
+
+    while True:
+        fp = open(path, mode)
+        try:
+            _lock(fp, shared)
+        except BaseException:
+            fp.close()
+            raise
+        if fcntl is None or _is_current(fp, path):
+            break
+        fp.close()
+
+    # closing the file flushes it and then releases the lock
+    with fp:
+        yield fp
+
+
+def locked_append(path, data):
+    """
+    Appends `data` (str or bytes) to a file under an exclusive lock,
+    so that appends of concurrent processes never interleave, even
+    when they do not fit into a single `write` call.
+    """
+
+    if isinstance(data, str):
+        data = data.encode()
+    with locked_file(path, "ab") as fp:
+        fp.write(data)
+
+
+def atomic_write(path, data):
+    """
+    Writes `data` (str or bytes) into a temporary file next to `path` and
+    renames it over `path`, so that readers see either the old or the new
+    content, never a partially written file. When processes race, the
+    last rename wins.
+    """
+
+    if isinstance(data, str):
+        data = data.encode()
+
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory or ".", prefix="." + name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
@@ -0,0 +1,299 @@
+import os
+import re
+import gzip
+import time
+import heapq
+import shutil
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Compressions:
+    COMPRESSION_GZIP = "gzip"
+    COMPRESSION_ZSTD = "zstd"
+    POSSIBLE_COMPRESSIONS = (COMPRESSION_GZIP, COMPRESSION_ZSTD, None)
+
+
+EXTENSIONS = {
+    Compressions.COMPRESSION_GZIP: ".gz",
+    Compressions.COMPRESSION_ZSTD: ".zst",
+    None: ""
+}
+
+# segments are compressed into `<segment>.<ext>.partial` and renamed when done
+PARTIAL_SUFFIX = ".partial"
+
+# rotated segments are named as `<logfile>.<index>[.gz|.zst]`
+SEGMENT_PATTERN = re.compile(r"^(?P<base>.+)\.(?P<index>\d{5})(?P<ext>\.gz|\.zst)?$")
+# ranks of a distributed run log into `<session>.rank<rank>` files
+RANK_LOG_PATTERN = re.compile(r"^(?P<session>.+)\.rank(?P<rank>\d+)$")
+# lines prefixed with `maggot.tee.format_line_prefix`
+TIMESTAMP_PATTERN = re.compile(rb"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{3} ")
+TIMESTAMP_LENGTH = 23
+
+
+class LogRotation:
+    """
+    Defines when experiment logs are rotated and what happens to
+    rotated segments.
+
+    Args:
+        max_bytes: int
+            Rotate once the current segment grows over this size.
+            The size of text logs is counted in characters.
+        interval: float
+            Rotate once the current segment is older than this
+            number of seconds.
+        compression: str, one of "gzip", "zstd" or None
+            Compression applied to rotated segments. `zstd` requires
+            the `zstandard` package.
+        max_total_bytes: int
+            Cap on the total size of log files of an experiment. Oldest
+            rotated segments are removed once the cap is exceeded.
+    """
+
+    def __init__(
+        self,
+        max_bytes=None,
+        interval=None,
+        compression=Compressions.COMPRESSION_GZIP,
+        max_total_bytes=None
+    ):
+        if compression not in Compressions.POSSIBLE_COMPRESSIONS:
+            raise ValueError(
+                "`compression` should be one of {compressions}"
+                .format(compressions=Compressions.POSSIBLE_COMPRESSIONS)
+            )
+        if compression == Compressions.COMPRESSION_ZSTD and zstandard is None:
+            raise ImportError(
+                "`zstd` compression requires the `zstandard` package"
+            )
+
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.compression = compression
+        self.max_total_bytes = max_total_bytes
+
+
+def _compress(source, compression):
+    target = source + EXTENSIONS[compression]
+    partial = target + PARTIAL_SUFFIX
+
+    with open(source, "rb") as src:
+        if compression == Compressions.COMPRESSION_GZIP:
+            with gzip.open(partial, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        else:
+            with open(partial, "wb") as raw:
+                with zstandard.ZstdCompressor().stream_writer(raw) as dst:
+                    shutil.copyfileobj(src, dst)
+
+    # the raw segment is removed only once the compressed one is complete,
+    # so readers can always find every segment in one of the two forms
+    os.replace(partial, target)
+    os.remove(source)
+
+
+def list_segments(logfile):
+    """Returns rotated segments of a log file ordered from oldest to newest"""
+
+    logdir, name = os.path.split(logfile)
+    segments = dict()
+
+    for item in os.listdir(logdir or "."):
+        match = SEGMENT_PATTERN.match(item)
+        if match is None or match.group("base") != name:
+            continue
+        index = int(match.group("index"))
+        # prefer the raw segment while its compression is in progress
+        if index not in segments or match.group("ext") is None:
+            segments[index] = os.path.join(logdir, item)
+
+    return [segments[index] for index in sorted(segments)]
+
+
+def open_segment(path):
+    """Opens a possibly compressed log file for reading in binary mode"""
+
+    if path.endswith(EXTENSIONS[Compressions.COMPRESSION_GZIP]):
+        return gzip.open(path, "rb")
+    if path.endswith(EXTENSIONS[Compressions.COMPRESSION_ZSTD]):
+        if zstandard is None:
+            raise ImportError(
+                "Reading {path} requires the `zstandard` package".format(path=path)
+            )
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def read_log(logfile, chunk_size=65536):
+    """
+    Yields chunks of bytes of a log file, transparently decompressing
+    and concatenating rotated segments followed by the current one.
+    """
+
+    paths = list_segments(logfile)
+    if os.path.isfile(logfile):
+        paths.append(logfile)
+
+    for path in paths:
+        with open_segment(path) as fp:
+            while True:
+                chunk = fp.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+def rank_logfile(logfile, rank):
+    """
+    Returns a path to the log file of a given rank in a session.
+
+    >>> rank_logfile("logs/2020-01-01-00-00-00-1577836800", 1)
+    'logs/2020-01-01-00-00-00-1577836800.rank1'
+
+    """
+    return "{logfile}.rank{rank}".format(logfile=logfile, rank=rank)
+
+
+def read_log_lines(logfile):
+    """Same as `read_log`, but yields lines of bytes"""
+
+    partial = b""
+    for chunk in read_log(logfile):
+        lines = (partial + chunk).split(b"\n")
+        partial = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if partial:
+        yield partial
+
+
+def merge_logs(logfiles):
+    """
+    Yields lines of several log files (e.g. of all ranks in a session)
+    merged by their timestamps. Every log is read lazily and only one line
+    per log is kept in memory. Lines without a timestamp, like headers or
+    continuations of multiline output, stay right after the line they follow.
+    """
+
+    def _keyed(logfile):
+        key = b""
+        for line in read_log_lines(logfile):
+            if TIMESTAMP_PATTERN.match(line):
+                key = line[:TIMESTAMP_LENGTH]
+            yield key, line
+
+    # the merge is stable, so lines with equal timestamps keep the order of logs
+    for _, line in heapq.merge(*map(_keyed, logfiles), key=lambda item: item[0]):
+        yield line
+
+
+class RotatingLogFile:
+    """
+    A file-like object that writes to `path` and rotates it according to
+    a LogRotation. Rotated segments are compressed in background threads.
+    """
+
+    def __init__(self, path, mode, rotation):
+        self.path = path
+        self.mode = mode.replace("w", "a")
+        self.rotation = rotation
+
+        segments = list_segments(path)
+        if segments:
+            last = SEGMENT_PATTERN.match(os.path.basename(segments[-1]))
+            self._next_index = int(last.group("index")) + 1
+        else:
+            self._next_index = 1
+
+        self._compressions = []
+        self._open(mode)
+
+    def _open(self, mode):
+        self._file = open(self.path, mode)
+        self._size = os.path.getsize(self.path)
+        self._opened_at = time.time()
+
+    def _should_rotate(self):
+        rotation = self.rotation
+        if rotation.max_bytes is not None and self._size >= rotation.max_bytes:
+            return True
+        if rotation.interval is not None:
+            return time.time() - self._opened_at >= rotation.interval
+        return False
+
+    def write(self, data):
+        self._file.write(data)
+        self._size += len(data)
+        if self._should_rotate():
+            self.rotate()
+
+    def flush(self):
+        self._file.flush()
+
+    def rotate(self):
+        self._file.close()
+
+        segment = "{path}.{index:05d}".format(path=self.path, index=self._next_index)
+        self._next_index += 1
+        os.replace(self.path, segment)
+        self._open(self.mode)
+
+        self._compressions = [t for t in self._compressions if t.is_alive()]
+        thread = threading.Thread(
+            target=self._finalize_segment, args=(segment,),
+            name="maggot-log-compression", daemon=True
+        )
+        thread.start()
+        self._compressions.append(thread)
+
+    def _finalize_segment(self, segment):
+        if self.rotation.compression is not None:
+            _compress(segment, self.rotation.compression)
+        if self.rotation.max_total_bytes is not None:
+            self._enforce_total_size()
+
+    def _enforce_total_size(self):
+        logdir = os.path.dirname(self.path)
+
+        sizes, segments = 0, []
+        for item in os.listdir(logdir):
+            path = os.path.join(logdir, item)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            sizes += size
+            # only finished rotated segments are ever removed
+            match = SEGMENT_PATTERN.match(item)
+            if match is None:
+                continue
+            if match.group("ext") is not None or self.rotation.compression is None:
+                segments.append((os.path.getmtime(path), path, size))
+
+        for _, path, size in sorted(segments):
+            if sizes <= self.rotation.max_total_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            sizes -= size
+
+    def close(self):
+        self._file.close()
+        for thread in self._compressions:
+            thread.join()
+
+
+def open_log_file(path, mode, rotation=None):
+    """Opens a log file that is rotated if `rotation` is given"""
+
+    if rotation is None:
+        return open(path, mode)
+    return RotatingLogFile(path, mode, rotation)
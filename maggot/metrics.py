@@ -0,0 +1,257 @@
+import os
+import re
+import sys
+import array
+from collections import namedtuple
+
+from maggot.locking import locked_file
+from maggot.writer import SyncWriter
+
+
+# every series is stored as a pair of column files per chunk,
+# one with int64 steps and another with float64 values
+STEPS_TYPECODE = "q"
+VALUES_TYPECODE = "d"
+STEPS_DTYPE = "<i8"
+VALUES_DTYPE = "<f8"
+
+# number of points in a single chunk file
+CHUNK_SIZE = 2 ** 20
+# number of points kept in memory before they are written to disk
+BUFFER_SIZE = 4096
+
+# appends to a series are serialized with an advisory lock on this file
+SERIES_LOCK_FILE = ".lock"
+
+CHUNK_PATTERN = re.compile(r"^steps\.(\d+)\.i8$")
+
+
+MetricSeries = namedtuple("MetricSeries", ["steps", "values"])
+
+
+def chunk_files(series_dir, chunk):
+    """Returns paths to steps and values files of a given chunk"""
+    return (
+        os.path.join(series_dir, "steps.{:06d}.i8".format(chunk)),
+        os.path.join(series_dir, "values.{:06d}.f8".format(chunk))
+    )
+
+
+def list_chunks(series_dir):
+    """Returns sorted indices of chunks that exist for a series"""
+
+    chunks = []
+    for item in os.listdir(series_dir):
+        match = CHUNK_PATTERN.match(item)
+        if match:
+            chunks.append(int(match.group(1)))
+
+    return sorted(chunks)
+
+
+def _to_little_endian(column):
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def _points_in_chunk(series_dir, chunk):
+    """
+    Returns the number of complete points in a chunk. Columns are cut to
+    the same length if a process was killed in between two writes, so that
+    further appends stay aligned.
+    """
+
+    sizes = []
+    for path in chunk_files(series_dir, chunk):
+        try:
+            sizes.append(os.path.getsize(path) // 8)
+        except FileNotFoundError:
+            sizes.append(0)
+
+    points = min(sizes)
+    if sizes[0] != sizes[1]:
+        for path in chunk_files(series_dir, chunk):
+            if os.path.isfile(path):
+                os.truncate(path, points * 8)
+    return points
+
+
+def _count_points(series_dir, chunk_size):
+    chunks = list_chunks(series_dir)
+    if not chunks:
+        return 0
+    return chunks[-1] * chunk_size + _points_in_chunk(series_dir, chunks[-1])
+
+
+def append_points(series_dir, steps, values, chunk_size):
+    """
+    Appends columns of points (little-endian bytes) to the chunk files of
+    a series. The last chunk and its size are looked up on disk under an
+    exclusive lock of the series, so processes that log the same metric
+    never write misaligned columns or overfill a chunk.
+    """
+
+    n_points = len(steps) // 8
+    with locked_file(os.path.join(series_dir, SERIES_LOCK_FILE), "ab"):
+        chunks = list_chunks(series_dir)
+        chunk = chunks[-1] if chunks else 0
+        points_in_chunk = _points_in_chunk(series_dir, chunk) if chunks else 0
+
+        start = 0
+        while start < n_points:
+            if points_in_chunk == chunk_size:
+                chunk += 1
+                points_in_chunk = 0
+            stop = start + min(chunk_size - points_in_chunk, n_points - start)
+            for path, column in zip(chunk_files(series_dir, chunk), (steps, values)):
+                with open(path, "ab") as fp:
+                    fp.write(column[start * 8:stop * 8])
+            points_in_chunk += stop - start
+            start = stop
+
+
+class _SeriesWriter:
+    """Buffers points of a single series and appends them to chunk files"""
+
+    def __init__(self, series_dir, chunk_size, writer):
+        self.series_dir = series_dir
+        self.chunk_size = chunk_size
+        self.writer = writer
+
+        os.makedirs(series_dir, exist_ok=True)
+        # counting can repair columns, so it is serialized with appends
+        with locked_file(os.path.join(series_dir, SERIES_LOCK_FILE), "ab"):
+            self.total_points = _count_points(series_dir, chunk_size)
+
+        self.steps = array.array(STEPS_TYPECODE)
+        self.values = array.array(VALUES_TYPECODE)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def append(self, value, step):
+        if step is None:
+            step = self.total_points
+        self.steps.append(step)
+        self.values.append(value)
+        self.total_points += 1
+
+    def flush(self):
+        if not self.steps:
+            return
+
+        self.writer.submit(
+            append_points,
+            self.series_dir,
+            _to_little_endian(self.steps).tobytes(),
+            _to_little_endian(self.values).tobytes(),
+            self.chunk_size
+        )
+
+        del self.steps[:]
+        del self.values[:]
+
+
+class MetricStore:
+    """
+    Step-indexed metric time series stored as chunked column files.
+
+    Points are accumulated in typed `array.array` buffers and appended
+    to disk in batches. Series are read back through memory-mapped numpy
+    arrays, so loading a long curve never creates a Python object per
+    point.
+
+    Disk writes go through `writer` (see `maggot.writer`), which flushes
+    the in-memory buffers of the store whenever it is flushed itself.
+    """
+
+    def __init__(
+        self,
+        metrics_dir,
+        chunk_size=CHUNK_SIZE,
+        buffer_size=BUFFER_SIZE,
+        writer=None
+    ):
+        self.metrics_dir = metrics_dir
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+        self.writer = writer if writer is not None else SyncWriter()
+        self.writer.add_flush_hook(self.flush)
+        self._writers = dict()
+
+    def _series_dir(self, name):
+        if not name or os.sep in name or name.startswith("."):
+            raise ValueError("Invalid metric name: {name!r}".format(name=name))
+        return os.path.join(self.metrics_dir, name)
+
+    def log(self, name, value, step=None):
+        writer = self._writers.get(name)
+        if writer is None:
+            writer = _SeriesWriter(
+                self._series_dir(name), self.chunk_size, self.writer
+            )
+            self._writers[name] = writer
+
+        writer.append(value, step)
+        if len(writer) >= self.buffer_size:
+            writer.flush()
+
+    def flush(self):
+        for writer in self._writers.values():
+            writer.flush()
+
+    def __iter__(self):
+        if not os.path.isdir(self.metrics_dir):
+            return iter(())
+        return iter(sorted(
+            name for name in os.listdir(self.metrics_dir)
+            if os.path.isdir(os.path.join(self.metrics_dir, name))
+        ))
+
+    def keys(self):
+        return list(self)
+
+    def __contains__(self, name):
+        return name in self._writers or os.path.isdir(self._series_dir(name))
+
+    def __getitem__(self, name):
+        """
+        Returns a MetricSeries with columns of steps and values, which are
+        `ChunkedColumn` arrays over read-only memory-mapped chunk files,
+        so series of any length are read without copying them into memory.
+        """
+
+        # imported lazily to keep `import maggot` cheap
+        import numpy as np
+        from maggot.columns import ChunkedColumn
+
+        if name in self._writers:
+            self._writers[name].flush()
+            self.writer.flush()
+
+        series_dir = self._series_dir(name)
+        if not os.path.isdir(series_dir):
+            raise KeyError(name)
+
+        def _map(path, dtype):
+            if os.path.getsize(path) == 0:
+                return np.empty(0, dtype=dtype)
+            return np.memmap(path, dtype=dtype, mode="r")
+
+        steps, values = [], []
+        for chunk in list_chunks(series_dir):
+            steps_file, values_file = chunk_files(series_dir, chunk)
+            chunk_steps = _map(steps_file, STEPS_DTYPE)
+            chunk_values = _map(values_file, VALUES_DTYPE)
+            # columns could be of different lengths if a process
+            # was killed in between two writes
+            size = min(len(chunk_steps), len(chunk_values))
+            steps.append(chunk_steps[:size])
+            values.append(chunk_values[:size])
+
+        # the same type for any number of chunks, even for empty series
+        return MetricSeries(
+            ChunkedColumn(steps, np.dtype(STEPS_DTYPE)),
+            ChunkedColumn(values, np.dtype(VALUES_DTYPE))
+        )
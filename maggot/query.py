@@ -0,0 +1,151 @@
+import ast
+import heapq
+import operator
+
+
+COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+
+class _Missing(Exception):
+    """Raised when a row has no value for a referenced parameter"""
+
+
+def _dotted_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        prefix = _dotted_name(node.value)
+        if prefix is not None:
+            return prefix + "." + node.attr
+    return None
+
+
+class Predicate:
+    """
+    A filter over flattened config parameters and metrics, parsed from
+    a python-like expression, e.g. `model.C > 0.5 and accuracy >= 0.9`.
+
+    Supported are comparisons (`==`, `!=`, `<`, `<=`, `>`, `>=`, including
+    chains like `0.1 < model.C <= 1`), `and`, `or`, `not` and constants.
+    A row that lacks any compared parameter, or whose value cannot be
+    compared, does not match.
+
+    Example:
+
+    >>> predicate = Predicate("model.C > 0.5 and accuracy >= 0.9")
+    >>> sorted(predicate.names)
+    ['accuracy', 'model.C']
+    >>> predicate({"model.C": 1.0, "accuracy": 0.95})
+    True
+    >>> predicate({"model.C": 1.0})
+    False
+
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        try:
+            self._tree = ast.parse(expression.strip(), mode="eval").body
+        except SyntaxError as e:
+            raise ValueError(
+                "Invalid filter expression {expression!r}: {error}"
+                .format(expression=expression, error=e.msg)
+            )
+        self.names = set()
+        self._validate(self._tree)
+
+    def _validate(self, node):
+        name = _dotted_name(node)
+        if name is not None:
+            self.names.add(name)
+        elif isinstance(node, ast.BoolOp):
+            for value in node.values:
+                self._validate(value)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+            self._validate(node.operand)
+        elif isinstance(node, ast.Compare):
+            if not all(type(op) in COMPARISONS for op in node.ops):
+                raise ValueError(
+                    "Unsupported comparison in {expression!r}"
+                    .format(expression=self.expression)
+                )
+            for operand in [node.left] + node.comparators:
+                self._validate(operand)
+        elif not isinstance(node, ast.Constant):
+            raise ValueError(
+                "Unsupported syntax in {expression!r}: {syntax}"
+                .format(expression=self.expression, syntax=type(node).__name__)
+            )
+
+    def _evaluate(self, node, row):
+        name = _dotted_name(node)
+        if name is not None:
+            if name not in row:
+                raise _Missing(name)
+            return row[name]
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.UnaryOp):
+            operand = self._evaluate(node.operand, row)
+            return not operand if isinstance(node.op, ast.Not) else -operand
+        if isinstance(node, ast.BoolOp):
+            if isinstance(node.op, ast.And):
+                return all(self._evaluate(value, row) for value in node.values)
+            return any(self._matches(value, row) for value in node.values)
+
+        # ast.Compare
+        left = self._evaluate(node.left, row)
+        for op, comparator in zip(node.ops, node.comparators):
+            right = self._evaluate(comparator, row)
+            if not COMPARISONS[type(op)](left, right):
+                return False
+            left = right
+        return True
+
+    def _matches(self, node, row):
+        try:
+            return bool(self._evaluate(node, row))
+        except (_Missing, TypeError):
+            return False
+
+    def __call__(self, row):
+        return self._matches(self._tree, row)
+
+
+def top_k(items, key, k=None, ascending=False):
+    """
+    Returns `k` items with the largest (or smallest if `ascending`) values
+    of `key(item)` using a bounded heap, so memory stays O(k) regardless
+    of the number of items. Items for which `key` returns None go last.
+    If `k` is None, all items are returned sorted.
+
+    Example:
+
+    >>> top_k([3, 1, None, 2], key=lambda x: x, k=3)
+    [3, 2, 1]
+    >>> top_k([3, 1, None, 2], key=lambda x: x, ascending=True)
+    [1, 2, 3, None]
+
+    """
+
+    if ascending:
+        def heap_key(item):
+            value = key(item)
+            return (1, 0) if value is None else (0, value)
+        if k is None:
+            return sorted(items, key=heap_key)
+        return heapq.nsmallest(k, items, key=heap_key)
+
+    def heap_key(item):
+        value = key(item)
+        return (0, 0) if value is None else (1, value)
+    if k is None:
+        return sorted(items, key=heap_key, reverse=True)
+    return heapq.nlargest(k, items, key=heap_key)
@@ -0,0 +1,191 @@
+import os
+import json
+from contextlib import ExitStack
+from collections import OrderedDict
+
+from maggot.config import Config
+from maggot.containers import flatten_dict
+from maggot.locking import locked_file
+
+
+RESULTS_FILE = "results.json"
+RESULTS_JOURNAL_FILE = "results.jsonl"
+# the journal is renamed while it is being compacted, see `compact_results`
+COMPACTING_SUFFIX = ".compacting"
+LOCK_SUFFIX = ".lock"
+
+
+def format_journal_entry(name, value):
+    """Serializes a single result into a line of the results journal"""
+    return json.dumps({"name": name, "value": value}) + "\n"
+
+
+def read_journal(journal_file):
+    """
+    Yields (name, value) pairs from the journal in the order they were
+    appended. A truncated trailing line (e.g. left by a killed process)
+    is silently skipped.
+    """
+
+    try:
+        fp = open(journal_file, "r")
+    except FileNotFoundError:
+        return
+
+    with fp:
+        yield from _read_entries(fp)
+
+
+def _read_entries(fp):
+    for line in fp:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        yield entry["name"], entry["value"]
+
+
+def _open(stack, path):
+    try:
+        return stack.enter_context(open(path, "r"))
+    except FileNotFoundError:
+        return None
+
+
+def _identity(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _fold_files(results_file, journals):
+    """
+    Folds entries of open `journals` in order on top of the results file
+    and returns them along with a flag telling whether any of the files
+    exists. Files are opened directly instead of being checked with
+    `stat` first, which matters on network storage.
+    """
+
+    try:
+        with open(results_file, "r") as fp:
+            results = flatten_dict(json.load(fp))
+        found = True
+    except FileNotFoundError:
+        results = OrderedDict()
+        found = False
+
+    journal_entries = 0
+    for journal in journals:
+        if journal is None:
+            continue
+        found = True
+        for name, value in _read_entries(journal):
+            # re-insert the key so that later entries take precedence
+            # when the flat dict is turned back into a nested one
+            results.pop(name, None)
+            results[name] = value
+            journal_entries += 1
+
+    if journal_entries:
+        # round-trip through a nested container to resolve names that
+        # shadow each other, e.g. `a` registered after `a.b`
+        results = Config.from_flat_dict(results).as_flat_dict()
+
+    return results, found
+
+
+def _fold(results_file, journal_file):
+    """
+    Folds the journal being compacted (if any) and the journal on top of
+    the results file without taking any locks. The journal is opened
+    first, so that a concurrent compaction cannot move entries out of
+    sight in between, and reading is retried if the results file was
+    replaced meanwhile, so a stale journal is never folded on top of
+    newer results.
+    """
+
+    while True:
+        identity = _identity(results_file)
+        with ExitStack() as stack:
+            journal = _open(stack, journal_file)
+            compacting = _open(stack, journal_file + COMPACTING_SUFFIX)
+            results, found = _fold_files(results_file, [compacting, journal])
+        if _identity(results_file) == identity:
+            return results, found
+
+
+def fold_results(results_file, journal_file):
+    """
+    Folds the journal on top of the compacted results file and returns
+    an OrderedDict with the latest value for each (flat) result name.
+
+    Example:
+
+    >>> fold_results("missing.json", "missing.jsonl")
+    OrderedDict()
+
+    """
+
+    results, _ = _fold(results_file, journal_file)
+    return results
+
+
+def load_results(maggot_meta_dir):
+    """
+    Same as `fold_results`, but takes a `.maggot` directory as input
+    and returns None if the experiment has no results at all.
+    """
+
+    results, found = _fold(
+        os.path.join(maggot_meta_dir, RESULTS_FILE),
+        os.path.join(maggot_meta_dir, RESULTS_JOURNAL_FILE)
+    )
+    return results if found else None
+
+
+def _detach_journal(journal_file, compacting_file):
+    """
+    Renames the journal out of the way under its lock, which is held only
+    for the rename: appends that wait for the lock notice that the file
+    was replaced and go to a new journal. Returns False if there is no journal.
+    """
+
+    try:
+        with locked_file(journal_file, "r"):
+            os.rename(journal_file, compacting_file)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _compact(results_file, compacting_file):
+    with open(compacting_file, "r") as journal:
+        results, _ = _fold_files(results_file, [journal])
+    Config.from_flat_dict(results).to_json(results_file)
+    os.remove(compacting_file)
+
+
+def compact_results(results_file, journal_file):
+    """
+    Writes folded results into `results.json` and removes the journal.
+    If the process dies in between, the journal is simply replayed
+    on top of the already compacted values, which is idempotent.
+
+    The journal is first renamed to `results.jsonl.compacting`, so that
+    appends are blocked only for the rename and not while results are
+    folded and written. Compactions of the same journal are serialized
+    with a separate lock that appends never take.
+    """
+
+    compacting_file = journal_file + COMPACTING_SUFFIX
+    if not os.path.isfile(journal_file) and not os.path.isfile(compacting_file):
+        return
+
+    with locked_file(journal_file + LOCK_SUFFIX, "ab"):
+        if os.path.isfile(compacting_file):
+            # left by a compaction that was interrupted, older than the journal
+            _compact(results_file, compacting_file)
+        if _detach_journal(journal_file, compacting_file):
+            _compact(results_file, compacting_file)
@@ -1,52 +1,166 @@
 import argparse
+import fnmatch
+import json
 import os
 import sys
-from collections import defaultdict
-
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
 from maggot import Experiment
+from maggot.catalog import find_in_catalog
+from maggot.discovery import expand_roots, find_all_experiments, load_flat_config
+from maggot.hashes import resolve_experiment
+from maggot.results import load_results
+from maggot.tables import render_table
 from maggot.utils import bold
-from maggot.diffs import colorful_config_diff
+from maggot.diffs import (
+    colorful_config_diff,
+    config_diff,
+    diff_to_dict,
+    varying_parameters
+)
 
 
 def collect_args(args):
 
     parser = argparse.ArgumentParser(
         prog="config-diff",
-        description=bold("Show diff between configs in two experiments."),
-        usage=("maggot config-diff EXPERIMENT1 EXPERIMENT2"),
+        description=bold(
+            "Show diff between configs in two experiments, or parameters "
+            "that vary across all experiments in directories."
+        ),
+        usage=(
+            "maggot config-diff EXPERIMENT1 EXPERIMENT2 [--json]\n"
+            "       maggot config-diff --all DIRECTORY [DIRECTORY ...] [--metrics [PATTERNS]] [--json]"
+        ),
     )
 
     parser.add_argument(
         "first", type=str, nargs="?",
-        help="First experiment."
+        help="First experiment (or `EXPERIMENTS_DIR/HASH_PREFIX`)."
     )
     parser.add_argument(
         "second", type=str, nargs="?",
-        help="Second experiment."
+        help="Second experiment (or `EXPERIMENTS_DIR/HASH_PREFIX`)."
+    )
+
+    parser.add_argument(
+        "--all", type=str, nargs="+", metavar="DIRECTORY",
+        help=("Show a table of parameters that take more than one value across "
+              "all experiments in directories (or glob patterns), searched for "
+              "recursively.")
+    )
+    parser.add_argument(
+        "--metrics", type=lambda metrics: metrics.split(","), nargs="?", const=["*"],
+        help=("Add results to the `--all` table, optionally only those matching "
+              "comma-separated names or glob patterns, e.g. \"acc*,loss\".")
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of threads used to load configs with `--all`."
+    )
+    parser.add_argument(
+        "--json", default=False, action="store_true",
+        help=("Print added, removed and changed parameters (or rows of "
+              "the `--all` table) as JSON.")
     )
 
     args = parser.parse_args(args)
 
-    if args.first is None or args.second is None:
+    if args.all is None and (args.first is None or args.second is None):
         parser.print_help()
         sys.exit()
 
     return args
 
 
+def load_config(experiment):
+    """Loads config from the catalog if possible and from disk otherwise"""
+
+    found = find_in_catalog(experiment)
+    if found is not None:
+        catalog, name = found
+        return catalog.config(name)
+
+    return Experiment(resume_from=experiment, use_catalog=False).config
+
+
+def collect_varying(directories, metrics=None, workers=None):
+    """
+    Finds parameters that vary across all experiments under `directories`
+    (see `maggot.diffs.varying_parameters`) and returns them along with
+    `(experiment, row, config_keys)` rows that hold only these parameters
+    and, if `metrics` (names or glob patterns) are given, matching results.
+    """
+
+    if isinstance(directories, str):
+        directories = [directories]
+
+    experiments = find_all_experiments(expand_roots(directories), workers=workers)
+    if not experiments:
+        raise ValueError("Directories contain no experiments.")
+
+    paths = [os.path.join(root, relpath) for _, root, relpath in experiments]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        configs = list(executor.map(load_flat_config, paths))
+        if metrics is not None:
+            results = list(executor.map(
+                lambda path: load_results(os.path.join(path, ".maggot")), paths
+            ))
+        else:
+            results = [None] * len(paths)
+
+    varying = varying_parameters(configs)
+
+    rows = []
+    for (name, _, _), config, result in zip(experiments, configs, results):
+        row = {key: config[key] for key in varying if key in config}
+        config_keys = set(row)
+        for key, value in (result or dict()).items():
+            if any(fnmatch.fnmatchcase(key, pattern) for pattern in metrics):
+                row[key] = value
+                config_keys.discard(key)
+        rows.append((name, row, config_keys))
+
+    return varying, rows
+
+
+def show_varying(args):
+
+    varying, rows = collect_varying(args.all, args.metrics, args.workers)
+
+    if args.json:
+        print(json.dumps([dict(experiment=name, **row) for name, row, _ in rows], indent=4))
+        return
+
+    if not varying:
+        print(bold("All configs are identical."))
+        if args.metrics is None:
+            return
+
+    for line in render_table(rows, sample_size=len(rows)):
+        print(line)
+
+
 def main(args=None):
 
     args = collect_args(args)
-    first = Experiment(resume_from=args.first)
-    second = Experiment(resume_from=args.second)
+    if args.all is not None:
+        show_varying(args)
+        return
+    args.first = resolve_experiment(args.first)
+    args.second = resolve_experiment(args.second)
+
+    first, second = load_config(args.first), load_config(args.second)
+
+    if args.json:
+        print(json.dumps(diff_to_dict(config_diff(first, second)), indent=4))
+        return
 
-    print("First:", bold(first.experiment_dir))
-    print("Second:", bold(second.experiment_dir))
+    print("First:", bold(args.first.rstrip("/")))
+    print("Second:", bold(args.second.rstrip("/")))
     print()
-    diff = colorful_config_diff(first.config, second.config)
-    print(diff)
+    print(colorful_config_diff(first, second))
 
 
 if __name__ == "__main__":
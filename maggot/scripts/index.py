@@ -0,0 +1,49 @@
+import argparse
+import sys
+
+from maggot.catalog import Catalog
+from maggot.utils import bold
+
+
+ACTIONS = ("rebuild",)
+
+
+def collect_args(args):
+
+    parser = argparse.ArgumentParser(
+        prog="index",
+        description=bold("Manage the catalog of experiments in a given directory."),
+        usage=("maggot index rebuild DIRECTORY"),
+    )
+
+    parser.add_argument(
+        "action", type=str, nargs="?", choices=ACTIONS,
+        help="`rebuild` reconstructs the catalog from experiment directories."
+    )
+    parser.add_argument(
+        "directory", type=str, nargs="?",
+        help="Directory with experiments."
+    )
+
+    args = parser.parse_args(args)
+
+    if args.action is None or args.directory is None:
+        parser.print_help()
+        sys.exit()
+
+    return args
+
+
+def main(args=None):
+
+    args = collect_args(args)
+
+    catalog = Catalog(args.directory)
+    names = catalog.rebuild()
+    catalog.close()
+
+    print("Indexed {n} experiments in {path}".format(n=len(names), path=catalog.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import sys
+
+from maggot.config import Config
+from maggot.jobs import JobQueue, load_target
+from maggot.utils import bold
+
+
+ACTIONS = ("add", "list")
+
+
+def collect_args(args):
+
+    parser = argparse.ArgumentParser(
+        prog="queue",
+        description=bold("Manage the queue of experiments run by `maggot worker`."),
+        usage=(
+            "maggot queue add CONFIG [CONFIG ...] --target MODULE:FUNCTION [--experiments-dir DIR]\n"
+            "       maggot queue list [--experiments-dir DIR]"
+        ),
+    )
+
+    parser.add_argument(
+        "action", type=str, nargs="?", choices=ACTIONS,
+        help="`add` enqueues experiments, `list` shows all jobs and their states."
+    )
+    parser.add_argument(
+        "configs", type=str, nargs="*", metavar="CONFIG",
+        help="JSON files with configs of experiments to enqueue."
+    )
+    parser.add_argument(
+        "--target", type=str,
+        help=("Function that runs an experiment, e.g. `train:main`. "
+              "It is called with the Experiment created for a config.")
+    )
+    parser.add_argument(
+        "--experiments-dir", type=str, default="experiments",
+        help="Directory for storing experiments, the queue is kept at its root."
+    )
+    parser.add_argument(
+        "--max-attempts", type=int, default=3,
+        help="Number of times a failed or crashed job is run before giving up."
+    )
+    parser.add_argument(
+        "--naming", type=str, default="identifier", choices=("identifier", "hash"),
+        help="How experiment names are generated from configs."
+    )
+
+    args = parser.parse_args(args)
+
+    if args.action is None:
+        parser.print_help()
+        sys.exit()
+
+    if args.action == "add" and (not args.configs or args.target is None):
+        parser.error("`add` requires configs and a --target")
+
+    return args
+
+
+def main(args=None):
+
+    args = collect_args(args)
+    queue = JobQueue(args.experiments_dir)
+
+    if args.action == "add":
+        # workers import targets with `python -m`, i.e. relative to their
+        # working directory, which the `maggot` script does not put on the path
+        if os.getcwd() not in sys.path:
+            sys.path.insert(0, os.getcwd())
+        # fail early instead of in every worker
+        load_target(args.target)
+        for path in args.configs:
+            config = Config.from_json(path)
+            job_id = queue.add(
+                config, args.target,
+                options=dict(naming=args.naming),
+                max_attempts=args.max_attempts
+            )
+            print("Enqueued {path} as job {job_id}".format(path=path, job_id=job_id))
+
+    else:
+        for job in queue.jobs():
+            print("{id:>6}  {state:<8}  {attempts}/{max_attempts}  {target}  {experiment}".format(
+                id=job.id,
+                state=job.state,
+                attempts=job.attempts,
+                max_attempts=job.max_attempts,
+                target=job.target,
+                experiment=job.experiment_dir or ""
+            ))
+        counts = queue.counts()
+        print(bold(", ".join(
+            "{count} {state}".format(count=counts[state], state=state) for state in counts
+        )))
+
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,9 @@
 import argparse
-import os
 import sys
-from collections import defaultdict
-
-import pandas as pd
 
 from maggot import Experiment
+from maggot.catalog import find_in_catalog
+from maggot.hashes import resolve_experiment
 from maggot.utils import bold
 
 
@@ -19,7 +17,7 @@ def collect_args(args):
 
     parser.add_argument(
         "experiment", type=str, nargs="?",
-        help="Experiment to show command for."
+        help="Experiment (or `EXPERIMENTS_DIR/HASH_PREFIX`) to show command for."
     )
 
     args = parser.parse_args(args)
@@ -34,9 +32,17 @@ def collect_args(args):
 def main(args=None):
 
     args = collect_args(args)
-    experiment = Experiment(resume_from=args.experiment)
-    with open(experiment._command_file) as fp:
-        command = fp.read().strip()
+    args.experiment = resolve_experiment(args.experiment)
+
+    found = find_in_catalog(args.experiment)
+    if found is not None:
+        catalog, name = found
+        command = catalog.command(name)
+    else:
+        experiment = Experiment(resume_from=args.experiment, use_catalog=False)
+        with open(experiment._command_file) as fp:
+            command = fp.read().strip()
+
     print("[python]", command)
 
 if __name__ == "__main__":
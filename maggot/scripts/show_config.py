@@ -1,11 +1,9 @@
 import argparse
-import os
 import sys
-from collections import defaultdict
-
-import pandas as pd
 
 from maggot import Experiment
+from maggot.catalog import find_in_catalog
+from maggot.hashes import resolve_experiment
 from maggot.utils import bold
 
 
@@ -19,7 +17,7 @@ def collect_args(args):
 
     parser.add_argument(
         "experiment", type=str, nargs="?",
-        help="Experiment to show config for."
+        help="Experiment (or `EXPERIMENTS_DIR/HASH_PREFIX`) to show config for."
     )
 
     args = parser.parse_args(args)
@@ -34,7 +32,15 @@ def collect_args(args):
 def main(args=None):
 
     args = collect_args(args)
-    experiment = Experiment(resume_from=args.experiment)
+    args.experiment = resolve_experiment(args.experiment)
+
+    found = find_in_catalog(args.experiment)
+    if found is not None:
+        catalog, name = found
+        print(catalog.config(name))
+        return
+
+    experiment = Experiment(resume_from=args.experiment, use_catalog=False)
     print(experiment.config)
 
 if __name__ == "__main__":
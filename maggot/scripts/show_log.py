@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+
+from maggot import Experiment
+from maggot.logfiles import (
+    PARTIAL_SUFFIX, RANK_LOG_PATTERN, SEGMENT_PATTERN, merge_logs, read_log
+)
+from maggot.hashes import resolve_experiment
+from maggot.utils import bold
+
+
+def list_sessions(logdir):
+    """
+    Returns lists of log files of all sessions ordered from oldest to
+    newest. Sessions of distributed runs consist of a log file per rank.
+    """
+
+    if not os.path.isdir(logdir):
+        return []
+
+    sessions = dict()
+    for item in os.listdir(logdir):
+        # segments that are still being compressed
+        if item.endswith(PARTIAL_SUFFIX):
+            continue
+        match = SEGMENT_PATTERN.match(item)
+        # a session could consist of rotated segments only
+        logfile = match.group("base") if match else item
+        match = RANK_LOG_PATTERN.match(logfile)
+        if match:
+            session, rank = match.group("session"), int(match.group("rank"))
+        else:
+            session, rank = logfile, 0
+        sessions.setdefault(session, dict())[rank] = os.path.join(logdir, logfile)
+
+    return [
+        [ranks[rank] for rank in sorted(ranks)]
+        for _, ranks in sorted(sessions.items())
+    ]
+
+
+def collect_args(args):
+
+    parser = argparse.ArgumentParser(
+        prog="show-log",
+        description=bold("Show log of a particular experiment."),
+        usage=("maggot show-log EXPERIMENT [--all]"),
+    )
+
+    parser.add_argument(
+        "experiment", type=str, nargs="?",
+        help="Experiment (or `EXPERIMENTS_DIR/HASH_PREFIX`) to show log for."
+    )
+    parser.add_argument(
+        "--all", default=False, action="store_true",
+        help="Show logs of all sessions instead of only the last one."
+    )
+
+    args = parser.parse_args(args)
+
+    if args.experiment is None:
+        parser.print_help()
+        sys.exit()
+
+    return args
+
+
+def main(args=None):
+
+    args = collect_args(args)
+    args.experiment = resolve_experiment(args.experiment)
+    experiment = Experiment(resume_from=args.experiment, use_catalog=False)
+    sessions = list_sessions(os.path.dirname(experiment.logfile))
+
+    if not args.all:
+        sessions = sessions[-1:]
+
+    for logfiles in sessions:
+        if len(logfiles) == 1:
+            for chunk in read_log(logfiles[0]):
+                sys.stdout.buffer.write(chunk)
+        else:
+            # logs of all ranks are interleaved by timestamps
+            sys.stdout.buffer.writelines(merge_logs(logfiles))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,97 +1,359 @@
 import argparse
+import fnmatch
+import heapq
 import os
 import sys
-from collections import defaultdict
-
-import pandas as pd
-
-from maggot import Experiment
-from maggot.containers import NestedContainer
-from maggot.utils import bold, green, red, blue
-
-pd.set_option("display.max_colwidth", 500)
-
-
-def collect_results(directory):
-
-    items = os.listdir(directory)
-    fullpath = os.path.abspath(directory)
-
-    def keep_only_experiments(items):
-        for item in items:
-            if Experiment.is_experiment(os.path.join(fullpath, item)):
-                yield item
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from maggot.cache import ResultsCache
+from maggot.catalog import Catalog
+from maggot.discovery import expand_roots, find_all_experiments, load_flat_config
+from maggot.query import Predicate, top_k
+from maggot.results import load_results
+from maggot.tables import Pager, render_table, table_columns
+from maggot.utils import bold
+
+
+# number of experiments loaded concurrently ahead of the consumer
+LOAD_WINDOW = 256
+
+
+def bounded_map(executor, function, items, window=LOAD_WINDOW):
+    """Same as `executor.map`, but keeps at most `window` items in flight"""
+
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def current_in_catalog(catalog, names, workers=None):
+    """
+    Returns the subset of experiment `names` whose results in the catalog
+    can be used, other experiments (missing from the catalog, or ones that
+    changed since they were indexed) should be loaded from disk.
+
+    Results of finished experiments are trusted as is (see
+    `Catalog.is_settled`), only those that were indexed while running are
+    compared with their results files, with concurrent `stat` calls.
+    """
+
+    signatures = catalog.signatures()
+    names = [name for name in names if signatures.get(name) is not None]
+    settled = {name for name in names if Catalog.is_settled(signatures[name])}
+    unsettled = [name for name in names if name not in settled]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        flags = executor.map(lambda name: catalog.is_current(name, signatures[name]), unsettled)
+        return settled | {name for name, is_current in zip(unsettled, flags) if is_current}
+
+
+def iter_results(
+    directories,
+    workers=None,
+    use_catalog=True,
+    use_cache=True,
+    where=None,
+    sort=None,
+    config_columns=False,
+    columns=None
+):
+    """
+    Lazily loads results of all experiments found under `directories`
+    (a directory, a glob pattern or a list of them) and yields
+    (experiment, row, config_keys) triples ordered by experiment name,
+    where `row` maps column names to values and `config_keys` are the
+    names of columns that come from the config.
+
+    Experiments are searched for recursively, e.g. in
+    `experiments/<project>/<sweep>/<run>` layouts, see `find_all_experiments`.
+
+    Every results file is parsed exactly once, and files are loaded
+    concurrently (at most `LOAD_WINDOW` ahead of the consumer), which
+    pays off on network storage where latency rather than parsing
+    dominates.
+
+    If a directory that holds experiments has a catalog (see `maggot.catalog`),
+    indexed experiments are neither listed nor loaded from disk, their
+    results are taken from the catalog, and only experiments that are
+    missing from it or stale (see `current_in_catalog`) are loaded from disk. Results loaded from disk
+    go through a cache of each root (see `maggot.cache`) that skips unchanged
+    experiments.
+
+    `where` (an expression or a `maggot.query.Predicate`) is evaluated
+    while loading, so filtered out experiments are never accumulated.
+
+    If `config_columns` is given, flattened config parameters are added
+    to rows. `columns` is a list of names or glob patterns (e.g.
+    `model.*`) of metrics and parameters to keep, everything else is
+    dropped as soon as an experiment is loaded. A config is read only if
+    the filter, the sort key or the requested columns need it.
+    """
+
+    if isinstance(directories, str):
+        directories = [directories]
+    roots = expand_roots(directories)
+    predicate = Predicate(where) if isinstance(where, str) else where
+
+    def selected(key):
+        if columns is None:
+            return True
+        return any(fnmatch.fnmatchcase(key, column) for column in columns)
+
+    def needs_config(result):
+        if predicate is not None and not predicate.names.issubset(result):
+            return True
+        if sort is not None and sort not in result:
+            return True
+        if config_columns:
+            # exact column names that are all among results need no config
+            return columns is None or not all(column in result for column in columns)
+        return False
+
+    def make_row(result, load_config):
+        """
+        Returns a projected row with results and config parameters and the
+        names of keys that came from the config, or None if filtered out.
+        """
+
+        config = load_config() if needs_config(result) else dict()
+
+        if predicate is not None:
+            row = dict(config)
+            row.update(result)
+            if not predicate(row):
+                return None
+
+        row, config_keys = dict(), set()
+        if config_columns:
+            for key, value in config.items():
+                if selected(key):
+                    row[key] = value
+                    config_keys.add(key)
+        for key, value in result.items():
+            if selected(key):
+                row[key] = value
+                config_keys.discard(key)
+        if sort is not None and sort not in row:
+            row[sort] = result.get(sort, config.get(sort))
+
+        return row, config_keys
+
+    # experiments are indexed in catalogs of their parent directories,
+    # indexed ones are found without listing their directories
+    opened = dict()
+
+    def open_catalog(parent):
+        if parent not in opened:
+            opened[parent] = Catalog(parent, read_only=True)
+        return opened[parent]
+
+    def indexed(path):
+        path = os.path.abspath(path)
+        if not Catalog.exists(path):
+            return ()
+        return set(open_catalog(path).names())
+
+    experiments = find_all_experiments(
+        roots, workers=workers, indexed=indexed if use_catalog else None
+    )
 
-    experiments = list(keep_only_experiments(items))
+    catalogs = dict()
+    if use_catalog:
+        by_parent = defaultdict(dict)
+        for name, root, relpath in experiments:
+            parent, basename = os.path.split(os.path.abspath(os.path.join(root, relpath)))
+            by_parent[parent][basename] = name
+        for parent, members in by_parent.items():
+            if parent in opened or Catalog.exists(parent):
+                catalog = open_catalog(parent)
+                current = current_in_catalog(catalog, members, workers)
+                catalogs[parent] = catalog, {
+                    basename: name for basename, name in members.items()
+                    if basename in current
+                }
+
+    from_catalogs = set()
+    for catalog, members in catalogs.values():
+        from_catalogs.update(members.values())
+    candidates = [item for item in experiments if item[0] not in from_catalogs]
+
+    caches = dict()
+    if use_cache:
+        for root in roots:
+            caches[root] = ResultsCache(os.path.abspath(root))
+
+    def load(item):
+        name, root, relpath = item
+        experiment_dir = os.path.join(root, relpath)
+        maggot_meta_dir = os.path.join(experiment_dir, ".maggot")
+        if root in caches:
+            result = caches[root].load_results(relpath, maggot_meta_dir)
+        else:
+            result = load_results(maggot_meta_dir)
+        if result is None:
+            return None
+        return make_row(result, lambda: load_flat_config(experiment_dir))
+
+    def from_catalog(catalog, members):
+        for basename, result in catalog.iter_results():
+            # experiments removed from disk are ignored
+            if basename not in members:
+                continue
+            row = make_row(result, lambda: catalog.config(basename).as_flat_dict())
+            if row is not None:
+                yield (members[basename],) + row
+
+    def from_disk(executor):
+        for item, row in zip(candidates, bounded_map(executor, load, candidates)):
+            if row is not None:
+                yield (item[0],) + row
+
+    complete = False
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            streams = [from_disk(executor)]
+            streams.extend(
+                from_catalog(catalog, members)
+                for catalog, members in catalogs.values()
+            )
+            yield from heapq.merge(*streams, key=lambda item: item[0])
+        complete = True
+    finally:
+        # also saved when the consumer stopped early (e.g. `--limit`), but
+        # caches evict what they have not seen only if everything was visited
+        for cache in caches.values():
+            cache.save(complete)
+        for catalog in opened.values():
+            catalog.close()
+
+
+def select_rows(rows, sort=None, ascending=False, limit=None):
+    """
+    Sorts rows produced by `iter_results` by `sort` and keeps at most `limit`
+    of them. Sorting needs all rows (or a bounded heap of `limit` rows),
+    otherwise rows are passed through lazily.
+    """
+
+    if sort is not None:
+        return top_k(rows, key=lambda item: item[1].get(sort), k=limit, ascending=ascending)
+    if limit is not None:
+        return islice(rows, limit)
+    return rows
+
+
+def collect_results(
+    directories,
+    workers=None,
+    use_catalog=True,
+    use_cache=True,
+    where=None,
+    sort=None,
+    ascending=False,
+    limit=None,
+    config_columns=False,
+    columns=None
+):
+    """
+    Same as `iter_results` followed by `select_rows`, but returns a dict
+    that maps column names (and "experiment") to lists of values.
+    """
+
+    rows = iter_results(
+        directories,
+        workers=workers,
+        use_catalog=use_catalog,
+        use_cache=use_cache,
+        where=where,
+        sort=sort,
+        config_columns=config_columns,
+        columns=columns
+    )
+    experiments = list(select_rows(rows, sort, ascending, limit))
 
     if not experiments:
-        raise ValueError("Directory contains no experiments.")
-
-    print(bold("\nResults for {directory}:".format(directory=fullpath)))
-    print()
+        raise ValueError("Directory contains no experiments with results.")
 
-    def results():
-        for experiment in experiments:
-            results_file = os.path.join(directory, experiment, ".maggot", "results.json")
-            if os.path.isfile(results_file):
-                result = NestedContainer.from_json(results_file)
-                result = result.as_flat_dict()
-                yield experiment, result
-
-    all_metrics = set()
-    for experiment, result in results():
-        all_metrics.update(result)
+    names = table_columns(experiments, columns)
 
     all_results = defaultdict(list)
-    for experiment, result in results():
+    for experiment, row, _ in experiments:
         all_results["experiment"].append(experiment)
-        for metric in all_metrics:
-            all_results[metric].append(result.get(metric, ""))
+        for name in names:
+            all_results[name].append(row.get(name, ""))
 
     return all_results
 
 
-def stylize_results(df):
-
-    df = df.to_string()
-    header, *content = df.split("\n")
-    header = bold(header)
-
-    stylized = []
-    for item in content:
-        first_space = item.index(" ")
-        experiment, metrics = item[:first_space], item[first_space:]
-        stylized.append(bold(blue(experiment)) + bold(green(metrics)))
-
-    df = "\n".join([header] + stylized)
-
-    return df
-
-
 def collect_args(args):
 
     parser = argparse.ArgumentParser(
         prog="summarize",
         description=bold("Summarize results from different experiments."),
-        usage=("maggot summarize DIRECTORY ..."),
+        usage=("maggot summarize DIRECTORY [DIRECTORY ...] ..."),
     )
 
     parser.add_argument(
-        "directory", type=str, nargs="?",
-        help="Directory to print summary for"
+        "directories", type=str, nargs="*", metavar="DIRECTORY",
+        help=("Directories (or glob patterns) to print summary for. "
+              "Experiments are searched for recursively.")
     )
     parser.add_argument(
         "--sort", type=str,
         help="Metric name to use as a key for sorting entries in the final dataframe."
     )
+    parser.add_argument(
+        "--where", type=str,
+        help=("Filter over metrics and config parameters, "
+              "e.g. \"model.C > 0.5 and accuracy > 0.9\".")
+    )
+    parser.add_argument(
+        "--limit", type=int,
+        help="Show only this number of experiments (the best ones if `sort` is given)."
+    )
+    parser.add_argument(
+        "--config-columns", default=False, action="store_true",
+        help="Add flattened config parameters to the table."
+    )
+    parser.add_argument(
+        "--columns", type=lambda columns: columns.split(","),
+        help=("Comma-separated names or glob patterns of metrics and parameters "
+              "to show, e.g. \"accuracy,model.*\".")
+    )
     parser.add_argument(
         "--ascending", default=False, action="store_true",
         help="Sorting direction. Used only if `sort` is given."
     )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Number of threads used to load results."
+    )
+    parser.add_argument(
+        "--no-catalog", dest="use_catalog", default=True, action="store_false",
+        help="Ignore the catalog and load all results from experiment directories."
+    )
+    parser.add_argument(
+        "--no-cache", dest="use_cache", default=True, action="store_false",
+        help="Parse all results files instead of reusing results of unchanged experiments."
+    )
+    parser.add_argument(
+        "--sample", type=int, default=200,
+        help=("Number of first rows used to choose columns and their widths "
+              "when rows are streamed.")
+    )
+    parser.add_argument(
+        "--pager", default=False, action="store_true",
+        help="Show output in a pager ($PAGER or `less -R`)."
+    )
 
     args = parser.parse_args(args)
 
-    if args.directory is None:
+    if not args.directories:
         parser.print_help()
         sys.exit()
 
@@ -102,14 +364,38 @@ def main(args=None):
 
     args = collect_args(args)
 
-    results = collect_results(args.directory)
-    index = results.pop("experiment")
-    df = pd.DataFrame(results, index=index)
-
-    if args.sort is not None:
-        df = df.sort_values(by=args.sort, ascending=args.ascending)
-
-    print(stylize_results(df))
+    results = iter_results(
+        args.directories,
+        workers=args.workers,
+        use_catalog=args.use_catalog,
+        use_cache=args.use_cache,
+        where=args.where,
+        sort=args.sort,
+        config_columns=args.config_columns,
+        columns=args.columns
+    )
+    rows = select_rows(results, args.sort, args.ascending, args.limit)
+
+    pager = Pager(enabled=args.pager)
+    try:
+        pager.write_line(bold("\nResults for {directories}:".format(
+            directories=", ".join(os.path.abspath(d) for d in args.directories))))
+        pager.write_line("")
+
+        empty = True
+        for line in render_table(rows, args.columns, args.sample):
+            pager.write_line(line)
+            empty = False
+
+        if empty:
+            raise ValueError("Directory contains no experiments with results.")
+    except BrokenPipeError:
+        # the pager (or e.g. `head`) was closed before all rows were shown
+        pass
+    finally:
+        # stops the loaders and saves caches if not all rows were consumed
+        results.close()
+        pager.close()
 
 
 if __name__ == "__main__":
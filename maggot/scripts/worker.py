@@ -0,0 +1,55 @@
+import argparse
+import os
+
+from maggot.jobs import Worker
+from maggot.utils import bold
+
+
+def collect_args(args):
+
+    parser = argparse.ArgumentParser(
+        prog="worker",
+        description=bold("Run experiments from the queue filled by `maggot queue add`."),
+        usage=("maggot worker [-n N] [--experiments-dir DIR] [--exit-when-empty]"),
+    )
+
+    parser.add_argument(
+        "-n", type=int, default=os.cpu_count() or 1,
+        help="Number of experiments to run at a time (by default, the number of CPUs)."
+    )
+    parser.add_argument(
+        "--experiments-dir", type=str, default="experiments",
+        help="Directory with the queue of experiments."
+    )
+    parser.add_argument(
+        "--lease", type=float, default=60.0,
+        help=("Seconds after which a job of a crashed worker is handed out again. "
+              "Leases of running jobs are renewed every third of this time.")
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=1.0,
+        help="Seconds between checks of an empty queue for new jobs."
+    )
+    parser.add_argument(
+        "--exit-when-empty", default=False, action="store_true",
+        help="Exit once there are no jobs left instead of waiting for new ones."
+    )
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+
+    args = collect_args(args)
+
+    worker = Worker(
+        args.experiments_dir,
+        n_slots=args.n,
+        lease=args.lease,
+        poll_interval=args.poll_interval
+    )
+    worker.run(exit_when_empty=args.exit_when_empty)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import os
+import itertools
+from random import Random
+from collections import namedtuple, OrderedDict
+
+from maggot.config import Config, FrozenConfig
+from maggot.experiment import Experiment, IfExistsModes
+
+
+# `result` is the return value of the function (None for reused variants),
+# `results` are the results registered in the experiment of the variant
+SweepResult = namedtuple(
+    "SweepResult", ["config", "experiment_dir", "result", "results", "reused", "error"]
+)
+
+
+def expand_grid(base_config, grid):
+    """
+    Returns FrozenConfig variants of `base_config` for every combination
+    of values in `grid`, a mapping from flat parameter names to lists of
+    values. Variants share all unchanged subtrees of the base config.
+
+    Example:
+
+    >>> variants = expand_grid(dict(model=dict(C=1.0, kernel="rbf")), {"model.C": [0.1, 1.0]})
+    >>> [variant.identifier for variant in variants]
+    ['0.1-rbf', '1.0-rbf']
+
+    """
+
+    base_config = _freeze(base_config)
+    if not grid:
+        return [base_config]
+
+    names = list(grid)
+    return [
+        base_config.with_updates(OrderedDict(zip(names, values)))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+
+def sample_random(base_config, random, n_trials, seed=None):
+    """
+    Returns `n_trials` FrozenConfig variants of `base_config` with
+    parameters sampled from `random`, a mapping from flat parameter names
+    to either lists of values, which are sampled uniformly, or callables
+    that take a `random.Random` instance and return a value, e.g.
+    `lambda rng: 10 ** rng.uniform(-3, 3)`.
+    """
+
+    base_config = _freeze(base_config)
+    rng = Random(seed)
+
+    def sample(distribution):
+        if callable(distribution):
+            return distribution(rng)
+        if isinstance(distribution, (list, tuple)):
+            return rng.choice(distribution)
+        raise ValueError(
+            "Random distributions should be lists of values or callables, got {distribution!r}"
+            .format(distribution=distribution)
+        )
+
+    return [
+        base_config.with_updates(
+            OrderedDict((name, sample(random[name])) for name in random)
+        )
+        for _ in range(n_trials)
+    ]
+
+
+def _freeze(config):
+    if isinstance(config, Config):
+        return config.freeze()
+    return FrozenConfig.from_dict(config)
+
+
+def _cpu_groups(n_workers):
+    """Splits CPUs available to the process into one group per worker"""
+
+    cpus = sorted(os.sched_getaffinity(0))
+    if n_workers >= len(cpus):
+        return [{cpus[i % len(cpus)]} for i in range(n_workers)]
+    return [set(cpus[i::n_workers]) for i in range(n_workers)]
+
+
+def _pin_worker(cpu_groups):
+    # every worker takes its own group of CPUs once, when it starts
+    os.sched_setaffinity(0, cpu_groups.get())
+
+
+def _run_trial(function, config, experiment_options):
+
+    experiment_dir = None
+    try:
+        experiment = Experiment(config, **experiment_options)
+        experiment_dir = experiment.experiment_dir
+        if experiment.reused:
+            return SweepResult(config, experiment_dir, None, experiment.results, True, None)
+
+        with experiment:
+            result = function(experiment)
+        return SweepResult(config, experiment_dir, result, experiment.results, False, None)
+
+    except (Exception, SystemExit) as e:
+        # failed trials do not stop the sweep, errors are reported instead
+        return SweepResult(config, experiment_dir, None, None, False, e)
+
+
+def sweep(
+    base_config,
+    function,
+    grid=None,
+    random=None,
+    n_trials=None,
+    max_workers=None,
+    pin_cpus=False,
+    if_exists_mode=IfExistsModes.MODE_REUSE,
+    seed=None,
+    mp_context=None,
+    **experiment_options
+):
+    """
+    Runs `function(experiment)` for every variant of `base_config` in
+    separate processes and returns a list of SweepResult tuples in the
+    order of variants.
+
+    Variants are all combinations of `grid` values (see `expand_grid`),
+    and if `random` is given, `n_trials` random samples (see `sample_random`)
+    on top of each of them. Duplicate variants are run only once.
+
+    Every variant gets its own Experiment (created with `experiment_options`,
+    e.g. `experiments_dir`) and its own log. Return values of `function`
+    must be picklable and are reported in the `result` field, while the
+    `results` field holds the results registered in the experiment, which
+    are the only outcome of reused variants (their `result` is None).
+    A failing variant does not stop the sweep, its exception is reported
+    in the `error` field instead.
+
+    Args:
+        max_workers: int
+            Maximum number of variants that run concurrently.
+        pin_cpus: bool
+            If given, available CPUs are split between workers and every
+            worker process is pinned to its own group of CPUs, so that
+            concurrent runs do not compete for cores. Requires
+            `os.sched_setaffinity` (Linux).
+        if_exists_mode: str, one of "reuse", "continue", "delete", "exit"
+            Same as in Experiment, except that the interactive `prompt`
+            cannot be used in worker processes. By default completed
+            variants are not run again, so an interrupted sweep can be
+            simply restarted. With `exit`, existing variants are reported
+            as failed.
+        seed: int
+            Seed for sampling `random` variants.
+        mp_context:
+            A multiprocessing context for the process pool.
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    if if_exists_mode == IfExistsModes.MODE_PROMPT:
+        raise ValueError("Sweeps cannot prompt, use a non-interactive `if_exists_mode`")
+    if random is not None and n_trials is None:
+        raise ValueError("`n_trials` should be given along with `random`")
+
+    variants = expand_grid(base_config, grid)
+    if random is not None:
+        variants = list(itertools.chain.from_iterable(
+            sample_random(variant, random, n_trials, seed=None if seed is None else seed + i)
+            for i, variant in enumerate(variants)
+        ))
+
+    # frozen configs are hashable, so duplicates are dropped in one pass
+    variants = list(OrderedDict.fromkeys(variants))
+
+    experiment_options = dict(experiment_options, if_exists_mode=if_exists_mode)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    max_workers = min(max_workers, len(variants)) or 1
+
+    initializer, initargs = None, ()
+    if pin_cpus:
+        if not hasattr(os, "sched_setaffinity"):
+            raise ValueError("CPU pinning is not supported on this platform")
+
+        import multiprocessing
+        context = mp_context or multiprocessing.get_context()
+        cpu_groups = context.Queue()
+        for group in _cpu_groups(max_workers):
+            cpu_groups.put(group)
+        initializer, initargs = _pin_worker, (cpu_groups,)
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=mp_context,
+        initializer=initializer,
+        initargs=initargs
+    ) as executor:
+        futures = [
+            executor.submit(_run_trial, function, variant, experiment_options)
+            for variant in variants
+        ]
+        return [future.result() for future in futures]
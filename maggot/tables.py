@@ -0,0 +1,108 @@
+import os
+import sys
+import fnmatch
+import subprocess
+from itertools import chain, islice
+
+from maggot.utils import bold, green, blue
+
+
+def table_columns(rows, columns=None):
+    """
+    Chooses columns of a table given `(name, row, config_keys)` rows, e.g.
+    produced by `maggot.scripts.summarize.iter_results`. Columns from
+    configs go first, unless `columns` (names or glob patterns) define
+    the order.
+    """
+
+    all_config_keys, all_metrics = set(), set()
+    for experiment, row, config_keys in rows:
+        all_config_keys.update(config_keys)
+        all_metrics.update(key for key in row if key not in config_keys)
+
+    if columns is None:
+        return sorted(all_config_keys) + sorted(all_metrics - all_config_keys)
+
+    chosen = []
+    all_keys = sorted(all_config_keys | all_metrics)
+    for column in columns:
+        for key in all_keys:
+            if fnmatch.fnmatchcase(key, column) and key not in chosen:
+                chosen.append(key)
+    return chosen
+
+
+def format_value(value):
+    """
+    Formats a single value of the table.
+
+    >>> format_value(0.9866666666)
+    '0.986667'
+    >>> format_value([1, 2])
+    '[1, 2]'
+
+    """
+
+    if isinstance(value, float):
+        return format(value, "g")
+    return str(value)
+
+
+def render_table(rows, columns=None, sample_size=200):
+    """
+    Lazily renders `(name, row, config_keys)` rows into styled lines.
+    Columns and their widths are chosen from the first `sample_size` rows,
+    after that every row is formatted and emitted as soon as it arrives,
+    so memory does not depend on the number of rows. Later values that are
+    wider than the sample extend their row, and metrics that appear only
+    after the sample are not shown unless requested with `columns`.
+    """
+
+    rows = iter(rows)
+    sample = list(islice(rows, sample_size))
+    if not sample:
+        return
+
+    names = table_columns(sample, columns)
+    index_width = max(len(experiment) for experiment, _, _ in sample)
+    widths = [
+        max([len(name)] + [len(format_value(row.get(name, ""))) for _, row, _ in sample])
+        for name in names
+    ]
+
+    yield bold(" " * index_width + "".join(
+        "  " + name.rjust(width) for name, width in zip(names, widths)
+    ))
+
+    for experiment, row, _ in chain(sample, rows):
+        values = "".join(
+            "  " + format_value(row.get(name, "")).rjust(width)
+            for name, width in zip(names, widths)
+        )
+        yield bold(blue(experiment.ljust(index_width))) + bold(green(values))
+
+
+class Pager:
+    """Writes lines to a pager process, or to stdout if there is no terminal"""
+
+    def __init__(self, enabled=True):
+        self._process = None
+        if enabled and sys.stdout.isatty():
+            command = os.environ.get("PAGER", "less -R")
+            self._process = subprocess.Popen(
+                command, shell=True, stdin=subprocess.PIPE, universal_newlines=True
+            )
+        self._stream = self._process.stdin if self._process else sys.stdout
+
+    def write_line(self, line):
+        self._stream.write(line + "\n")
+
+    def close(self):
+        if self._process is not None:
+            try:
+                self._stream.close()
+            except BrokenPipeError:
+                pass
+            self._process.wait()
+        else:
+            self._stream.flush()
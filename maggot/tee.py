@@ -0,0 +1,330 @@
+import os
+import sys
+import time
+import queue
+import datetime
+import selectors
+import threading
+
+from maggot.logfiles import open_log_file
+
+
+class TeeModes:
+    MODE_SYNC = "sync"
+    MODE_QUEUE = "queue"
+    MODE_FD = "fd"
+    POSSIBLE_MODES = (MODE_SYNC, MODE_QUEUE, MODE_FD)
+
+
+class BackpressurePolicies:
+    POLICY_BLOCK = "block"
+    POLICY_DROP = "drop"
+    POSSIBLE_POLICIES = (POLICY_BLOCK, POLICY_DROP)
+
+
+class Tee:
+    """
+    A helper class to duplicate stdout to a log file. If `tag` is given,
+    every line in the log is prefixed with a timestamp and the tag.
+    """
+
+    def __init__(self, name, mode, rotation=None, tag=None):
+        self.file = open_log_file(name, mode, rotation)
+        self.stdout = sys.stdout
+        sys.stdout = self
+
+        self._tag = None if tag is None else tag.encode()
+        self._line_start = True
+
+        self._log_time()
+
+    def _log_time(self):
+        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.file.write("\n")
+        self.file.write(current_time)
+        self.file.write("\n\n")
+
+    def close(self, *args):
+        sys.stdout = self.stdout
+        self.file.close()
+
+    def _tagged(self, data):
+        if self._tag is None:
+            return data
+
+        prefix = format_line_prefix(self._tag).decode()
+        pieces = []
+        for i, line in enumerate(data.split("\n")):
+            if i:
+                pieces.append("\n")
+                self._line_start = True
+            if line:
+                if self._line_start:
+                    pieces.append(prefix)
+                pieces.append(line)
+                self._line_start = False
+        return "".join(pieces)
+
+    def write(self, data):
+        self.file.write(self._tagged(data))
+        self.stdout.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+
+class QueuedTee(Tee):
+    """
+    Same as Tee, but `write` only puts data into a bounded queue.
+    A dedicated thread takes everything accumulated in the queue
+    and writes it to the log file and stdout at once, so that printing
+    in a tight loop is not bounded by disk latency.
+
+    When the queue is full, `write` either blocks until there is space
+    (`block` policy) or discards the data and increments `dropped`
+    (`drop` policy).
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        name,
+        mode,
+        queue_size=1024,
+        backpressure=BackpressurePolicies.POLICY_BLOCK,
+        rotation=None,
+        tag=None
+    ):
+        if backpressure not in BackpressurePolicies.POSSIBLE_POLICIES:
+            raise ValueError(
+                "`backpressure` should be one of {policies}"
+                .format(policies=BackpressurePolicies.POSSIBLE_POLICIES)
+            )
+
+        self.backpressure = backpressure
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+
+        super().__init__(name, mode, rotation, tag)
+
+        self._thread = threading.Thread(
+            target=self._run, name="maggot-tee", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, data):
+        if self.backpressure == BackpressurePolicies.POLICY_BLOCK:
+            self._queue.put(data)
+        else:
+            try:
+                self._queue.put_nowait(data)
+            except queue.Full:
+                self.dropped += 1
+
+    def flush(self):
+        # flushing is done by the writer thread, blocking here
+        # would defeat the purpose of the queue
+        pass
+
+    def drain(self):
+        """Blocks until everything written so far reaches the log file"""
+        self._queue.join()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            chunks = [self._queue.get()]
+            # coalesce everything that is already queued into a single write
+            while True:
+                try:
+                    chunks.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(chunk is self._STOP for chunk in chunks)
+            data = "".join(chunk for chunk in chunks if chunk is not self._STOP)
+            if data:
+                self.file.write(self._tagged(data))
+                self.file.flush()
+                self.stdout.write(data)
+                self.stdout.flush()
+
+            for _ in chunks:
+                self._queue.task_done()
+
+    def close(self, *args):
+        sys.stdout = self.stdout
+
+        # the sentinel is always enqueued, even with the `drop` policy
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+        if self.dropped:
+            self.file.write(
+                "\n[maggot] {dropped} chunks of output were dropped "
+                "because the log queue was full\n".format(dropped=self.dropped)
+            )
+        self.file.close()
+
+
+def format_line_prefix(tag, timestamp=None):
+    """
+    Returns a prefix for a line of captured output.
+
+    >>> format_line_prefix(b"stdout", 0.0).endswith(b" [stdout] ")
+    True
+
+    """
+
+    if timestamp is None:
+        timestamp = time.time()
+    moment = datetime.datetime.fromtimestamp(timestamp)
+    return (
+        moment.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3].encode() +
+        b" [" + tag + b"] "
+    )
+
+
+class FdTee:
+    """
+    Captures output at the file descriptor level. Descriptors 1 and 2
+    are redirected into pipes that are drained by a reader thread, so
+    the log also receives stderr, output of C extensions and output of
+    child processes (subprocess, multiprocessing workers) that inherit
+    the descriptors.
+
+    Every line in the log is prefixed with a timestamp and a stream tag
+    (preceded by `tag`, if given, e.g. `rank1:stderr`), while the output
+    is still echoed to the original descriptors.
+    Data is processed as raw bytes in large chunks, lines read at once
+    share a single timestamp.
+    """
+
+    STREAMS = ((1, b"stdout"), (2, b"stderr"))
+    READ_SIZE = 65536
+
+    def __init__(self, name, mode, rotation=None, join_timeout=5.0, tag=None):
+        self.join_timeout = join_timeout
+
+        self._flush_python_streams()
+
+        binary_mode = mode.replace("+", "").replace("b", "") + "b"
+        self.file = open_log_file(name, binary_mode, rotation)
+        self._log_time()
+
+        self._saved_fds = dict()
+        self._pipes = dict()
+        self._partial = dict()
+        tag_prefix = None if tag is None else tag.encode()
+
+        for fd, tag in self.STREAMS:
+            read_fd, write_fd = os.pipe()
+            self._saved_fds[fd] = os.dup(fd)
+            os.dup2(write_fd, fd)
+            os.close(write_fd)
+            if tag_prefix is not None:
+                tag = tag_prefix + b":" + tag
+            self._pipes[read_fd] = (fd, tag)
+            self._partial[read_fd] = b""
+
+        self._thread = threading.Thread(
+            target=self._run, name="maggot-fd-tee", daemon=True
+        )
+        self._thread.start()
+
+    @staticmethod
+    def _flush_python_streams():
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except (AttributeError, ValueError):
+                pass
+
+    def _log_time(self):
+        current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.file.write(b"\n" + current_time.encode() + b"\n\n")
+
+    def _echo(self, fd, data):
+        view = memoryview(data)
+        while view:
+            written = os.write(self._saved_fds[fd], view)
+            view = view[written:]
+
+    def _log(self, read_fd, tag, data, final=False):
+        lines = (self._partial[read_fd] + data).split(b"\n")
+        self._partial[read_fd] = b"" if final else lines.pop()
+        lines = [line for line in lines if line] if final else lines
+        if lines:
+            prefix = format_line_prefix(tag)
+            self.file.write(b"".join(prefix + line + b"\n" for line in lines))
+            self.file.flush()
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        for read_fd in self._pipes:
+            selector.register(read_fd, selectors.EVENT_READ)
+
+        remaining = len(self._pipes)
+        try:
+            while remaining:
+                for key, _ in selector.select():
+                    read_fd = key.fd
+                    fd, tag = self._pipes[read_fd]
+                    data = os.read(read_fd, self.READ_SIZE)
+                    if not data:
+                        selector.unregister(read_fd)
+                        self._log(read_fd, tag, b"", final=True)
+                        remaining -= 1
+                        continue
+                    self._echo(fd, data)
+                    self._log(read_fd, tag, data)
+        except (OSError, ValueError):
+            # the log file was closed while some child process
+            # still holds the pipe open
+            pass
+        finally:
+            selector.close()
+
+    def close(self, *args):
+        self._flush_python_streams()
+
+        # restoring the descriptors closes our copies of the write ends,
+        # the reader sees EOF once children holding them exit as well
+        for fd, saved_fd in self._saved_fds.items():
+            os.dup2(saved_fd, fd)
+
+        self._thread.join(self.join_timeout)
+
+        # if a child process still holds the pipes, the descriptors are left
+        # to the reader thread, so that their numbers are not reused under it
+        if not self._thread.is_alive():
+            for read_fd in self._pipes:
+                os.close(read_fd)
+            for saved_fd in self._saved_fds.values():
+                os.close(saved_fd)
+        self.file.close()
+
+
+def make_tee(
+    name,
+    mode,
+    tee_mode=TeeModes.MODE_SYNC,
+    queue_size=1024,
+    backpressure=BackpressurePolicies.POLICY_BLOCK,
+    rotation=None,
+    tag=None
+):
+    """Creates a Tee instance for a given `tee_mode`"""
+
+    if tee_mode == TeeModes.MODE_SYNC:
+        return Tee(name, mode, rotation, tag)
+    elif tee_mode == TeeModes.MODE_QUEUE:
+        return QueuedTee(name, mode, queue_size, backpressure, rotation, tag)
+    elif tee_mode == TeeModes.MODE_FD:
+        return FdTee(name, mode, rotation, tag=tag)
+    else:
+        raise ValueError(
+            "`tee_mode` should be one of {modes}"
+            .format(modes=TeeModes.POSSIBLE_MODES)
+        )
@@ -0,0 +1,217 @@
+import os
+import atexit
+import signal
+import threading
+import weakref
+from collections import OrderedDict
+
+from maggot.locking import locked_append
+
+
+def write_batch(batch):
+    """
+    Appends a batch of (path, data) items to files, locking and opening
+    every file only once. Items with the same path are written in order.
+    Items without a path are `(function, args)` calls (see `submit`),
+    which are run in order after the appends.
+    """
+
+    grouped = OrderedDict()
+    calls = []
+    for path, data in batch:
+        if path is None:
+            calls.append(data)
+        else:
+            grouped.setdefault(path, []).append(data)
+
+    for path, chunks in grouped.items():
+        if isinstance(chunks[0], bytes):
+            data = b"".join(chunks)
+        else:
+            data = "".join(chunks)
+        locked_append(path, data)
+
+    for function, args in calls:
+        function(*args)
+
+
+_live_writers = weakref.WeakSet()
+_previous_sigterm_handler = None
+
+
+def flush_all():
+    """Flushes and closes all writers that are still alive"""
+    for writer in list(_live_writers):
+        writer.close()
+
+
+atexit.register(flush_all)
+
+
+class SyncWriter:
+    """Performs every append immediately in the calling thread"""
+
+    def __init__(self):
+        self._flush_hooks = []
+        self._close_hooks = []
+        _live_writers.add(self)
+
+    def add_flush_hook(self, hook):
+        self._flush_hooks.append(hook)
+
+    def add_close_hook(self, hook):
+        self._close_hooks.append(hook)
+
+    def append(self, path, data):
+        write_batch([(path, data)])
+
+    def submit(self, function, *args):
+        function(*args)
+
+    def flush(self):
+        for hook in self._flush_hooks:
+            hook()
+
+    def close(self):
+        for hook in self._close_hooks:
+            hook()
+        self.flush()
+
+
+def _handle_sigterm(signum, frame):
+    flush_all()
+
+    if callable(_previous_sigterm_handler):
+        _previous_sigterm_handler(signum, frame)
+    elif _previous_sigterm_handler != signal.SIG_IGN:
+        # re-deliver the signal with the default disposition
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+
+def _install_sigterm_handler():
+    global _previous_sigterm_handler
+
+    # signal handlers can only be installed from the main thread
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    current = signal.getsignal(signal.SIGTERM)
+    if current is _handle_sigterm:
+        return
+
+    _previous_sigterm_handler = current
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+
+
+class BackgroundWriter:
+    """
+    Collects appends in an in-memory queue and writes them from a
+    background thread in batches, either every `flush_interval` seconds
+    or once `max_pending` items are queued, whichever comes first.
+
+    Pending items are also written on `flush()`, `close()`, at interpreter
+    exit and on SIGTERM.
+    """
+
+    def __init__(self, flush_interval=1.0, max_pending=1000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending = []
+        self._flush_hooks = []
+        self._close_hooks = []
+        self._condition = threading.Condition()
+        # serializes drains so that batches hit the disk in order, reentrant
+        # because the SIGTERM handler can interrupt a drain in the main thread
+        self._drain_lock = threading.RLock()
+        self._thread = None
+        self._closed = False
+        self._error = None
+
+        _live_writers.add(self)
+        _install_sigterm_handler()
+
+    def add_flush_hook(self, hook):
+        """Registers a callable that is run before every explicit flush"""
+        self._flush_hooks.append(hook)
+
+    def add_close_hook(self, hook):
+        """
+        Registers a callable that is run only on `close()`, including the
+        one at interpreter exit, before the flush hooks
+        """
+        self._close_hooks.append(hook)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._closed = False
+            self._thread = threading.Thread(
+                target=self._run, name="maggot-writer", daemon=True
+            )
+            self._thread.start()
+
+    def append(self, path, data):
+        with self._condition:
+            self._ensure_thread()
+            self._pending.append((path, data))
+            if len(self._pending) >= self.max_pending:
+                self._condition.notify()
+
+    def submit(self, function, *args):
+        """
+        Queues a call that writes to disk by itself, e.g. one that has
+        to hold a lock over several files, along with the appends.
+        """
+        with self._condition:
+            self._ensure_thread()
+            self._pending.append((None, (function, args)))
+            if len(self._pending) >= self.max_pending:
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed or len(self._pending) >= self.max_pending,
+                    timeout=self.flush_interval
+                )
+                closed = self._closed
+            self._drain()
+            if closed:
+                return
+
+    def _drain(self):
+        with self._drain_lock:
+            with self._condition:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return
+            try:
+                write_batch(batch)
+            except Exception as e:
+                self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def flush(self):
+        """Blocks until everything appended so far is written to disk"""
+        for hook in self._flush_hooks:
+            hook()
+        self._drain()
+        self._raise_error()
+
+    def close(self):
+        """Flushes pending items and stops the background thread"""
+        for hook in self._close_hooks + self._flush_hooks:
+            hook()
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._drain()
+        self._raise_error()
@@ -0,0 +1,206 @@
+import os
+import threading
+
+import pytest
+
+from maggot import Experiment
+from maggot.catalog import Catalog, CATALOG_FILE
+from maggot import discovery
+from maggot.scripts import summarize, show_command, show_config, show_log, index
+
+
+@pytest.fixture
+def nested_dict_config():
+
+    config = dict(
+        a=10,
+        _b="a",
+        c=dict(a=10, b=[1, 2, 3], c="a")
+    )
+
+    return config
+
+
+def test_experiment_updates_catalog(nested_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    experiment = Experiment(
+        nested_dict_config, experiments_dir=experiments_dir, use_catalog=True
+    )
+    experiment.register_result("fold1.accuracy", 0.9)
+    experiment.register_result("fold1.accuracy", 0.95)
+    # results reach the catalog on flush
+    experiment.flush()
+
+    assert os.path.isfile(os.path.join(experiments_dir, CATALOG_FILE))
+
+    catalog = Catalog(experiments_dir)
+    name = experiment.config.identifier
+
+    assert catalog.names() == [name]
+    assert catalog.config(name).to_dict() == nested_dict_config
+    assert catalog.all_results() == {name: {"fold1.accuracy": 0.95}}
+
+    # once the catalog exists, new experiments are added automatically
+    other = Experiment(dict(a=1), experiments_dir=experiments_dir)
+    assert other.config.identifier in catalog
+
+
+def test_catalog_rebuild(nested_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    experiment = Experiment(nested_dict_config, experiments_dir=experiments_dir)
+    experiment.register_result("accuracy", 0.9)
+    Experiment(dict(a=1), experiments_dir=experiments_dir)
+
+    index.main(["rebuild", experiments_dir])
+
+    catalog = Catalog(experiments_dir)
+    assert catalog.names() == ["1", experiment.config.identifier]
+    assert catalog.all_results() == {experiment.config.identifier: {"accuracy": 0.9}}
+    assert catalog.command(experiment.config.identifier)
+
+
+def test_summarize_uses_catalog(nested_dict_config, tmpdir, monkeypatch, capsys):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    with Experiment(dict(a=1), experiments_dir=experiments_dir, use_catalog=True) as indexed:
+        indexed.register_result("accuracy", 0.5)
+
+    # an experiment created without the catalog is still found on disk
+    unindexed = Experiment(
+        nested_dict_config, experiments_dir=experiments_dir, use_catalog=False
+    )
+    unindexed.register_result("accuracy", 0.9)
+
+    loaded = []
+
+    def load_results(maggot_meta_dir):
+        loaded.append(os.path.basename(os.path.dirname(maggot_meta_dir)))
+        return summarize_load_results(maggot_meta_dir)
+
+    summarize_load_results = summarize.load_results
+    monkeypatch.setattr(summarize, "load_results", load_results)
+
+    scanned, checked = [], []
+    discovery_scan = discovery._scan
+    catalog_is_current = Catalog.is_current
+    monkeypatch.setattr(
+        discovery, "_scan", lambda path: scanned.append(os.path.basename(path)) or discovery_scan(path)
+    )
+    monkeypatch.setattr(
+        Catalog, "is_current",
+        lambda self, name, signature=None: checked.append(name) or catalog_is_current(self, name, signature)
+    )
+
+    # results of the finished indexed experiment are taken from the catalog,
+    # without listing its directory or looking at its results files
+    results = summarize.collect_results(experiments_dir, use_cache=False)
+    assert results["experiment"] == ["1", unindexed.config.identifier]
+    assert results["accuracy"] == [0.5, 0.9]
+    assert loaded == [unindexed.config.identifier]
+    assert "1" not in scanned and checked == []
+
+    # experiments opened without the catalog do not update it,
+    # their changes are picked up when the catalog is rebuilt
+    Experiment(
+        resume_from=indexed.experiment_dir, use_catalog=False
+    ).register_result("accuracy", 0.6)
+    assert summarize.collect_results(experiments_dir, use_cache=False)["accuracy"] == [0.5, 0.9]
+    index.main(["rebuild", experiments_dir])
+    assert summarize.collect_results(experiments_dir, use_cache=False)["accuracy"] == [0.6, 0.9]
+
+    # while experiments opened with it keep it up to date themselves
+    with Experiment(resume_from=indexed.experiment_dir) as resumed:
+        resumed.register_result("accuracy", 0.7)
+    del loaded[:]
+    assert summarize.collect_results(experiments_dir, use_cache=False)["accuracy"] == [0.7, 0.9]
+    # the rebuild indexed the other experiment too
+    assert loaded == []
+
+
+def test_read_only_commands_do_not_write_catalog(nested_dict_config, tmpdir, capsys):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    with Experiment(dict(a=1), experiments_dir=experiments_dir, use_catalog=True) as indexed:
+        indexed.register_result("accuracy", 0.5)
+    unindexed = Experiment(
+        nested_dict_config, experiments_dir=experiments_dir, use_catalog=False
+    )
+
+    catalog_file = os.path.join(experiments_dir, CATALOG_FILE)
+    with open(catalog_file, "rb") as fp:
+        content = fp.read()
+
+    for experiment in (indexed, unindexed):
+        show_config.main([experiment.experiment_dir])
+        show_command.main([experiment.experiment_dir])
+        show_log.main([experiment.experiment_dir])
+        summarize.collect_results(experiments_dir, use_cache=False)
+    assert '"a": 1' in capsys.readouterr().out
+
+    with open(catalog_file, "rb") as fp:
+        assert fp.read() == content
+    assert unindexed.config.identifier not in Catalog(experiments_dir)
+
+
+def test_catalog_rebuild_while_running(tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    experiment = Experiment(dict(a=1), experiments_dir=experiments_dir, use_catalog=False)
+    experiment.register_result("accuracy", 0.5)
+    index.main(["rebuild", experiments_dir])
+
+    # the experiment does not update the catalog it was started without
+    experiment.register_result("accuracy", 0.7)
+
+    catalog = Catalog(experiments_dir)
+    assert not catalog.is_current("1")
+    assert summarize.collect_results(experiments_dir)["accuracy"] == [0.7]
+
+
+def test_catalog_deleted_experiment(tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    experiment = Experiment(dict(a=1), experiments_dir=experiments_dir, use_catalog=True)
+    experiment.register_result("accuracy", 0.5)
+    experiment.flush()
+
+    # results of the deleted experiment are dropped from the catalog
+    Experiment(dict(a=1), experiments_dir=experiments_dir, if_exists_mode="delete")
+
+    catalog = Catalog(experiments_dir)
+    assert catalog.all_results() == {}
+    with pytest.raises(ValueError):
+        summarize.collect_results(experiments_dir)
+
+
+@pytest.mark.parametrize("buffered_writes", [False, True])
+def test_catalog_results_from_other_threads(tmpdir, buffered_writes):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    experiment = Experiment(
+        dict(a=1), experiments_dir=experiments_dir,
+        use_catalog=True, buffered_writes=buffered_writes
+    )
+
+    def register(i):
+        experiment.register_result("thread_{i}".format(i=i), i)
+
+    threads = [threading.Thread(target=register, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    experiment.compact_results()
+
+    catalog = Catalog(experiments_dir)
+    assert catalog.all_results() == {"1": {"thread_{i}".format(i=i): i for i in range(8)}}
+    assert catalog.is_current("1")
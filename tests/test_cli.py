@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from maggot.__main__ import COMMANDS
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# startup cost is checked by what gets imported, which unlike wall-clock
+# timings does not depend on the machine
+
+# modules that no command needs just to start
+HEAVY_MODULES = ("numpy", "pandas")
+# modules that only commands which query or queue experiments need
+QUERY_MODULES = ("sqlite3", "maggot.scripts.summarize", "maggot.query", "maggot.tables")
+
+LIGHT_COMMANDS = ("show-config", "show-command", "show-log")
+
+
+def imported_modules(*args):
+    """Returns names of modules imported by `maggot ARGS`"""
+
+    script = (
+        "import sys\n"
+        "from maggot.__main__ import main\n"
+        "try:\n"
+        "    main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "sys.stderr.write('\\n'.join(sys.modules))\n"
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", script] + list(args),
+        cwd=ROOT_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    return set(process.stderr.decode().split("\n"))
+
+
+def test_help_imports():
+
+    modules = imported_modules("--help")
+    assert "maggot" in modules
+    assert not modules.intersection(HEAVY_MODULES + QUERY_MODULES)
+    # command modules are imported only when invoked
+    assert not modules.intersection(COMMANDS.values())
+
+
+@pytest.mark.parametrize("command", sorted(COMMANDS))
+def test_command_imports(command):
+
+    modules = imported_modules(command, "--help")
+    assert COMMANDS[command] in modules
+    assert not modules.intersection(HEAVY_MODULES)
+    if command in LIGHT_COMMANDS:
+        assert not modules.intersection(QUERY_MODULES)
+
@@ -1,9 +1,11 @@
 import os
+import copy
 import json
+import pickle
 
 import pytest
 
-from maggot import Config
+from maggot import Config, Experiment, FrozenConfig
 from maggot import (
     use_custom_separator,
     use_default_separator,
@@ -143,3 +145,162 @@ def test_custom_separator(nested_dict_config):
 
     assert config.identifier == DEFAULT_SEPARATOR.join("10 10 1x2x3 a no_d".split())
 
+
+
+def test_config_caches_are_invalidated(nested_dict_config):
+
+    config = Config.from_dict(nested_dict_config)
+    assert config.identifier == DEFAULT_SEPARATOR.join("10 10 1x2x3 a".split())
+
+    # the returned flat dict is a copy
+    config.as_flat_dict()["a"] = 20
+    assert config.as_flat_dict()["a"] == 10
+
+    # modifications anywhere in the tree invalidate caches above
+    config.c.a = 20
+    assert config.as_flat_dict()["c.a"] == 20
+    assert config.identifier == DEFAULT_SEPARATOR.join("10 20 1x2x3 a".split())
+
+    del config.c.c
+    assert "c.c" not in config.as_flat_dict()
+
+    # detached containers no longer invalidate former parents
+    c = config.c
+    config.c = Config.from_dict(dict(x=1))
+    c.a = 30
+    assert config.identifier == DEFAULT_SEPARATOR.join("10 1".split())
+
+    # a container attached to several parents invalidates all of them
+    shared = Config.from_dict(dict(x=1))
+    first, second = Config.from_dict(dict(s=shared)), Config.from_dict(dict(s=shared))
+    assert first.identifier == second.identifier == "1"
+    shared.x = 2
+    assert first.identifier == second.identifier == "2"
+
+
+def test_config_pickle_and_copy(nested_dict_config):
+
+    config = Config.from_dict(nested_dict_config)
+    config.identifier
+
+    for restored in (pickle.loads(pickle.dumps(config)), copy.deepcopy(config)):
+        assert restored.to_dict() == config.to_dict()
+        restored.c.a = 20
+        assert restored.identifier == DEFAULT_SEPARATOR.join("10 20 1x2x3 a".split())
+        assert config.c.a == 10
+
+
+def test_config_identifier_is_computed_once(monkeypatch, tmpdir):
+
+    config = Config.from_dict(
+        {"group{}".format(i): {"param{}".format(j): j for j in range(50)} for i in range(40)}
+    )
+
+    calls = []
+    original_flatten = Config._flatten
+    original_make_identifier = Config._make_identifier
+
+    def _flatten(self):
+        calls.append("flatten")
+        return original_flatten(self)
+
+    def _make_identifier(self, separator):
+        calls.append("identifier")
+        return original_make_identifier(self, separator)
+
+    monkeypatch.setattr(Config, "_flatten", _flatten)
+    monkeypatch.setattr(Config, "_make_identifier", _make_identifier)
+
+    first = config.identifier
+    for _ in range(1000):
+        assert config.identifier == first
+    assert calls == ["identifier", "flatten"]
+
+    # paths of an experiment are built from the cached identifier
+    config = dict(model=dict(C=1.0, kernel="rbf"), data=dict(n_folds=5))
+    experiment = Experiment(config, experiments_dir=tmpdir.join("experiments").strpath)
+    calls.clear()
+    for _ in range(1000):
+        assert experiment.experiment_dir.endswith("5-1.0-rbf")
+        assert experiment._config_file.startswith(experiment.experiment_dir)
+    assert calls == []
+
+
+def test_frozen_config(nested_dict_config, tmpdir):
+
+    config = Config.from_dict(nested_dict_config)
+    frozen = config.freeze()
+
+    assert isinstance(frozen, Config)
+    assert frozen.identifier == config.identifier
+    assert frozen.c.b == (1, 2, 3)
+    assert frozen.to_dict() == config.to_dict()
+    assert frozen.thaw().to_dict() == config.to_dict()
+
+    with pytest.raises(AttributeError):
+        frozen.a = 20
+    with pytest.raises(AttributeError):
+        frozen.c.a = 20
+    with pytest.raises(AttributeError):
+        del frozen.c
+
+    # equal configs are equal regardless of how they were built
+    same = FrozenConfig.from_dict(nested_dict_config)
+    assert same == frozen and hash(same) == hash(frozen)
+    assert len({frozen, same, frozen.with_updates({"a": 20})}) == 2
+
+    restored = pickle.loads(pickle.dumps(frozen))
+    assert restored == frozen
+
+    # frozen configs are saved same as regular ones
+    filepath = tmpdir.join("config.json").strpath
+    frozen.to_json(filepath)
+    assert FrozenConfig.from_json(filepath) == frozen
+
+
+def test_frozen_config_with_updates(nested_dict_config):
+
+    frozen = FrozenConfig.from_dict(dict(nested_dict_config, d=dict(e=dict(f=1))))
+
+    variant = frozen.with_updates({"c.a": 20, "d.e.g": [4, 5], "h": dict(i=1)})
+
+    assert variant.as_flat_dict() == dict(
+        frozen.as_flat_dict(), **{"c.a": 20, "d.e.g": (4, 5), "h.i": 1}
+    )
+    assert frozen.c.a == 10
+    assert variant.c.b is frozen.c.b
+    assert variant != frozen
+
+    # unchanged subtrees are shared
+    variant = frozen.with_updates({"c.a": 20})
+    assert variant.d is frozen.d
+    assert variant.with_updates({"c.a": 10}) == frozen
+
+    # parameters and subcontainers replace each other
+    assert frozen.with_updates({"d": 1}).d == 1
+    assert frozen.with_updates({"a.b": 1}).a.b == 1
+
+
+def test_config_content_hash(nested_dict_config):
+
+    config = Config.from_dict(nested_dict_config)
+    reordered = Config.from_dict(dict(reversed(list(nested_dict_config.items()))))
+
+    assert len(config.content_hash()) == 64
+    assert config.content_hash() == reordered.content_hash()
+    assert config.content_hash() == config.freeze().content_hash()
+
+    # private parameters are ignored by default
+    with_private = Config.from_dict(dict(nested_dict_config, _b="b"))
+    assert with_private.content_hash() == config.content_hash()
+    assert (with_private.content_hash(include_private=True) !=
+            config.content_hash(include_private=True))
+
+    # configs with the same identifier have different hashes
+    first = Config.from_dict(dict(C=1, gamma=10))
+    second = Config.from_dict(dict(alpha=1, beta=10))
+    assert first.identifier == second.identifier
+    assert first.content_hash() != second.content_hash()
+
+    config.c.a = 20
+    assert config.content_hash() != reordered.content_hash()
@@ -0,0 +1,119 @@
+import os
+import re
+import json
+
+from maggot import Experiment, Config
+from maggot.diffs import (
+    DiffEntry,
+    config_diff,
+    format_diff,
+    diff_to_dict,
+    varying_parameters
+)
+from maggot.scripts import config_diff as config_diff_script
+
+
+def test_config_diff():
+
+    first = Config.from_dict(dict(
+        a=1, b=dict(c=[1, 2], d="x", e=dict(f=1.0)), g=True, h=dict(i=1)
+    ))
+    second = Config.from_dict(dict(
+        a=1.0, b=dict(c=(1, 2), d="y", e=dict(f=1.0, k=2)), g=1, h=2, z=None
+    ))
+
+    assert config_diff(first, second) == [
+        DiffEntry("a", "changed", 1, 1.0),
+        DiffEntry("b.d", "changed", "x", "y"),
+        DiffEntry("b.e.k", "added", None, 2),
+        DiffEntry("g", "changed", True, 1),
+        DiffEntry("h", "added", None, 2),
+        DiffEntry("h.i", "removed", 1, None),
+        DiffEntry("z", "added", None, None),
+    ]
+
+    assert config_diff(first, first) == []
+    assert config_diff(first, first.freeze()) == []
+    # plain nested dicts are supported too
+    assert config_diff(first.to_dict(), second.to_dict()) == config_diff(first, second)
+
+
+def test_format_diff():
+
+    diff = config_diff(dict(a=1, b="x", c=dict(d=[1])), dict(b="y", c=dict(d=[1]), e=2))
+
+    assert format_diff(diff, color=False).split("\n") == [
+        "- a: 1",
+        "~ b: \"x\" -> \"y\"",
+        "+ e: 2",
+    ]
+
+    assert diff_to_dict(diff) == dict(
+        added=dict(e=2), removed=dict(a=1), changed=dict(b=dict(first="x", second="y"))
+    )
+
+
+def test_config_diff_script(tmpdir, capsys):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+    first = Experiment(dict(C=1.0, kernel="rbf"), experiments_dir=experiments_dir)
+    second = Experiment(dict(C=10.0, gamma=0.1), experiments_dir=experiments_dir)
+
+    config_diff_script.main([first.experiment_dir, second.experiment_dir, "--json"])
+    assert json.loads(capsys.readouterr().out) == dict(
+        added=dict(gamma=0.1),
+        removed=dict(kernel="rbf"),
+        changed=dict(C=dict(first=1.0, second=10.0))
+    )
+
+    config_diff_script.main([first.experiment_dir, second.experiment_dir])
+    output = capsys.readouterr().out
+    assert "C: 1.0 -> 10.0" in output and "kernel" in output
+
+
+def test_varying_parameters():
+
+    configs = [
+        Config.from_dict(dict(model=dict(C=1.0, layers=[1, 2]), seed=1)),
+        dict(model=dict(C=10.0, layers=[1, 2]), seed=1),
+        {"model.C": 10.0, "model.layers": (1, 2), "seed": 1, "gamma": 0.1},
+    ]
+
+    assert varying_parameters(configs) == ["gamma", "model.C"]
+    assert varying_parameters(configs[1:2]) == []
+    assert varying_parameters([]) == []
+
+
+def test_config_diff_script_all(tmpdir, capsys):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+    for C, kernel in ((1.0, "rbf"), (10.0, "rbf"), (10.0, "linear")):
+        experiment = Experiment(
+            dict(model=dict(C=C, kernel=kernel), seed=1),
+            experiments_dir=os.path.join(experiments_dir, kernel)
+        )
+        experiment.register_result("accuracy", C / 10)
+
+    varying, rows = config_diff_script.collect_varying(experiments_dir, metrics=["acc*"])
+    assert varying == ["model.C", "model.kernel"]
+    assert [name for name, _, _ in rows] == [
+        os.path.join("linear", "10.0-linear-1"),
+        os.path.join("rbf", "1.0-rbf-1"),
+        os.path.join("rbf", "10.0-rbf-1"),
+    ]
+    assert rows[1][1:] == (
+        {"model.C": 1.0, "model.kernel": "rbf", "accuracy": 0.1},
+        {"model.C", "model.kernel"}
+    )
+
+    config_diff_script.main(["--all", experiments_dir, "--json"])
+    assert json.loads(capsys.readouterr().out)[1] == {
+        "experiment": os.path.join("rbf", "1.0-rbf-1"),
+        "model.C": 1.0,
+        "model.kernel": "rbf"
+    }
+
+    config_diff_script.main(["--all", os.path.join(experiments_dir, "rbf"), "--metrics"])
+    lines = re.sub(r"\033\[\d+m", "", capsys.readouterr().out).split("\n")
+    assert lines[0].split() == ["model.C", "accuracy"]
+    assert lines[1].split() == ["1.0-rbf-1", "1", "0.1"]
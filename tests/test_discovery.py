@@ -0,0 +1,49 @@
+import os
+
+from maggot.discovery import find_experiments, expand_roots
+
+
+def make_experiment(path):
+    os.makedirs(os.path.join(path, ".maggot", "nested", ".maggot"))
+
+
+def test_find_experiments(tmpdir):
+
+    root = tmpdir.join("experiments").strpath
+
+    make_experiment(os.path.join(root, "project", "sweep-1", "run-1"))
+    make_experiment(os.path.join(root, "project", "sweep-1", "run-2"))
+    make_experiment(os.path.join(root, "project", "sweep-2", "run-1"))
+    make_experiment(os.path.join(root, "top"))
+    # searching stops at experiments, hidden directories are skipped
+    make_experiment(os.path.join(root, "top", "inner"))
+    make_experiment(os.path.join(root, ".hidden", "run"))
+    os.makedirs(os.path.join(root, "empty", "dir"))
+    # symlinks are reported only if they point to experiments
+    os.symlink(os.path.join(root, "top"), os.path.join(root, "link"))
+    os.symlink(root, os.path.join(root, "project", "cycle"))
+
+    assert find_experiments(root, workers=4) == [
+        "link",
+        os.path.join("project", "sweep-1", "run-1"),
+        os.path.join("project", "sweep-1", "run-2"),
+        os.path.join("project", "sweep-2", "run-1"),
+        "top",
+    ]
+
+    assert find_experiments(os.path.join(root, "top")) == ["."]
+    assert find_experiments(os.path.join(root, "missing")) == []
+
+
+def test_expand_roots(tmpdir):
+
+    for name in ("sweep-1", "sweep-2", "other"):
+        os.makedirs(tmpdir.join(name).strpath)
+    tmpdir.join("sweep-3").write("not a directory")
+
+    pattern = os.path.join(tmpdir.strpath, "sweep-*")
+    other = tmpdir.join("other").strpath
+
+    assert expand_roots([other, pattern, other]) == [
+        other, tmpdir.join("sweep-1").strpath, tmpdir.join("sweep-2").strpath
+    ]
@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import multiprocessing
+
+import pytest
+
+from maggot import Experiment
+from maggot.distributed import detect_rank, read_world, wait_for_world, write_world
+from maggot.scripts import show_log
+from maggot.tee import Tee
+
+
+N_RANKS = 4
+
+
+@pytest.fixture
+def simple_dict_config():
+
+    config = dict(
+        a=10,
+        b=[1, 2, 3],
+        c="a"
+    )
+
+    return config
+
+
+def test_detect_rank(monkeypatch):
+
+    monkeypatch.setenv("RANK", "2")
+    monkeypatch.setenv("WORLD_SIZE", "4")
+    monkeypatch.delenv("LOCAL_RANK", raising=False)
+
+    assert detect_rank() == (2, 2, 4)
+    assert detect_rank(rank=1, local_rank=0) == (1, 0, 4)
+
+    with pytest.raises(ValueError):
+        detect_rank(rank=4)
+
+
+def test_tagged_tee(tmpdir):
+
+    logfile = tmpdir.join("log").strpath
+    tee = Tee(logfile, "a+", tag="rank1")
+    for chunk in ("first ", "line\nsecond line\n", "\n", "third"):
+        tee.write(chunk)
+    tee.close()
+
+    with open(logfile) as fp:
+        lines = fp.read().strip().split("\n")[2:]
+
+    prefix = r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{3} \[rank1\] "
+    assert [re.sub(prefix, "", line) for line in lines] == [
+        "first line", "second line", "", "third"
+    ]
+    assert all(re.match(prefix, line) for line in lines if line)
+
+
+def test_rank_waits_for_rank_zero(simple_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    with pytest.raises(TimeoutError):
+        Experiment(
+            simple_dict_config, experiments_dir=experiments_dir,
+            rank=1, world_size=2, rank_timeout=0.1
+        )
+    # nothing is created by other ranks
+    assert not os.path.exists(experiments_dir)
+
+
+def test_rank_ignores_world_of_previous_launch(simple_dict_config, tmpdir, monkeypatch):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+    monkeypatch.setenv("TORCHELASTIC_RUN_ID", "job")
+    monkeypatch.setenv("TORCHELASTIC_RESTART_COUNT", "0")
+
+    experiment = Experiment(
+        simple_dict_config, experiments_dir=experiments_dir, rank=0, world_size=2
+    )
+    experiment.flush()
+    maggot_meta_dir = os.path.join(experiment.experiment_dir, ".maggot")
+    assert read_world(maggot_meta_dir)["launch"] == "job/0"
+
+    # an immediate relaunch does not join the session of the previous one
+    monkeypatch.setenv("TORCHELASTIC_RESTART_COUNT", "1")
+    with pytest.raises(TimeoutError):
+        Experiment(
+            simple_dict_config, experiments_dir=experiments_dir,
+            if_exists_mode="continue", rank=1, world_size=2, rank_timeout=0.1
+        )
+
+    # and rank 0 removes the stale world file before setting up
+    monkeypatch.setenv("TORCHELASTIC_RESTART_COUNT", "2")
+    write_world(maggot_meta_dir, 2, session="stale", started=time.time(), launch="job/2")
+    experiment = Experiment(
+        simple_dict_config, experiments_dir=experiments_dir,
+        if_exists_mode="continue", rank=0, world_size=2
+    )
+    experiment.flush()
+    world = wait_for_world(maggot_meta_dir, time.time(), 0.1, launch="job/2")
+    assert world["session"] != "stale"
+
+
+def test_resume_ignores_rank_environ(simple_dict_config, tmpdir, monkeypatch):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+    experiment = Experiment(simple_dict_config, experiments_dir=experiments_dir)
+    experiment.flush()
+
+    # e.g. CLI tools run from a shell of a distributed job
+    monkeypatch.setenv("RANK", "1")
+    monkeypatch.setenv("WORLD_SIZE", "2")
+    resumed = Experiment(resume_from=experiment.experiment_dir)
+    assert (resumed.rank, resumed.world_size) == (0, 1)
+    assert resumed.is_rank_zero
+
+
+def _run_rank(config, experiments_dir, rank):
+
+    # other ranks start before rank 0 and wait for it
+    if rank == 0:
+        time.sleep(0.2)
+
+    experiment = Experiment(
+        config, experiments_dir=experiments_dir, rank=rank, world_size=N_RANKS
+    )
+    with experiment:
+        for i in range(3):
+            print("rank", rank, "line", i)
+            time.sleep(0.01)
+        experiment.register_result("rank_{rank}".format(rank=rank), rank)
+
+
+def test_distributed_experiment(simple_dict_config, tmpdir, capsys):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=_run_rank, args=(simple_dict_config, experiments_dir, rank))
+        for rank in range(N_RANKS)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    experiment = Experiment(resume_from=os.path.join(experiments_dir, "10-1x2x3-a"))
+    assert experiment.results.to_dict() == {
+        "rank_{rank}".format(rank=rank): rank for rank in range(N_RANKS)
+    }
+
+    # a single session with a log per rank
+    sessions = show_log.list_sessions(os.path.dirname(experiment.logfile))
+    assert len(sessions) == 1
+    assert [os.path.basename(logfile).rsplit(".", 1)[1] for logfile in sessions[0]] == [
+        "rank{rank}".format(rank=rank) for rank in range(N_RANKS)
+    ]
+
+    capsys.readouterr()
+    show_log.main([experiment.experiment_dir])
+    lines = [line for line in capsys.readouterr().out.split("\n") if "] rank" in line]
+
+    assert len(lines) == N_RANKS * 3
+    timestamps = [line[:23] for line in lines]
+    assert timestamps == sorted(timestamps)
+    for rank in range(N_RANKS):
+        assert [
+            line.split("] ", 1)[1] for line in lines if "[rank{rank}]".format(rank=rank) in line
+        ] == ["rank {rank} line {i}".format(rank=rank, i=i) for i in range(3)]
@@ -1,6 +1,9 @@
 import os
 import json
 import argparse
+import signal
+import subprocess
+import sys
 
 import pytest
 
@@ -57,6 +60,141 @@ def test_experiment_initialization_with_custom_name(nested_dict_config, tmpdir):
     assert os.path.isdir(os.path.join(experiments_dir, "custom", ".maggot"))
 
 
+def test_experiment_hash_naming(nested_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    experiment = Experiment(
+        nested_dict_config,
+        experiments_dir=experiments_dir,
+        naming="hash"
+    )
+
+    config_hash = experiment.config.content_hash()
+    assert experiment.experiment_dir == os.path.join(experiments_dir, config_hash[:12])
+
+    with open(os.path.join(experiment.experiment_dir, ".maggot", "config_hash")) as fp:
+        assert fp.read().strip() == config_hash
+    with open(os.path.join(experiment.experiment_dir, ".maggot", "identifier")) as fp:
+        assert fp.read().strip() == experiment.config.identifier
+
+    # experiments can be restored by a prefix of the hash
+    restored = Experiment(resume_from=os.path.join(experiments_dir, config_hash[:6]))
+    assert restored.experiment_dir == experiment.experiment_dir
+
+    with pytest.raises(ValueError):
+        Experiment(nested_dict_config, experiments_dir=experiments_dir, naming="random")
+
+
+def test_experiment_reuse_mode(simple_dict_config, nested_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    def run(config, **kwargs):
+        experiment = Experiment(
+            config, experiments_dir=experiments_dir, if_exists_mode="reuse", **kwargs
+        )
+        if not experiment.reused:
+            with experiment:
+                experiment.register_result("accuracy", 0.9)
+        return experiment
+
+    first = run(nested_dict_config)
+    assert not first.reused
+    assert Experiment.find_completed(nested_dict_config, experiments_dir) == first.experiment_dir
+
+    # an identical config is not run again, results are taken from the first run
+    second = run(nested_dict_config)
+    assert second.reused
+    assert second.experiment_dir == first.experiment_dir
+    assert second.results.accuracy == 0.9
+
+    # experiments are matched by content, not by name
+    hashed = run(nested_dict_config, naming="hash")
+    assert hashed.reused and hashed.experiment_dir == first.experiment_dir
+
+    # private parameters are ignored unless requested
+    private = dict(nested_dict_config, _b="b")
+    assert run(private).reused
+    with pytest.raises(SystemExit):
+        # the matching name is taken by an experiment with a different config
+        run(private, reuse_include_private=True)
+
+    # experiments without results are continued
+    unfinished = Experiment(
+        simple_dict_config, experiments_dir=experiments_dir, if_exists_mode="reuse"
+    )
+    again = run(simple_dict_config)
+    assert not again.reused and again.experiment_dir == unfinished.experiment_dir
+    assert again.results.accuracy == 0.9
+
+
+def test_experiment_reuse_mode_with_date(simple_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    with Experiment(
+            simple_dict_config, experiments_dir=experiments_dir,
+            add_date=True, if_exists_mode="reuse"
+    ) as first:
+        first.register_result("accuracy", 0.9)
+    assert os.path.basename(first.experiment_dir).startswith(first._date_string)
+
+    # the date is not prepended to the name of the reused experiment again
+    second = Experiment(
+        simple_dict_config, experiments_dir=experiments_dir,
+        add_date=True, if_exists_mode="reuse"
+    )
+    assert second.reused
+    assert second.experiment_dir == first.experiment_dir
+    assert second.results.accuracy == 0.9
+
+
+def test_experiment_reuse_mode_with_long_config(tmpdir):
+
+    # e.g. created by other trials of a sweep
+    experiments_dir = tmpdir.mkdir("experiments").strpath
+    config = {"param{}".format(i): "value{}".format(i) for i in range(100)}
+    assert len(Experiment._make_config(config).identifier) > 255
+
+    # the identifier cannot be a file name, so only hash names are looked up
+    with Experiment(
+            config, experiments_dir=experiments_dir,
+            naming="hash", if_exists_mode="reuse"
+    ) as first:
+        first.register_result("accuracy", 0.9)
+
+    second = Experiment(
+        config, experiments_dir=experiments_dir,
+        naming="hash", if_exists_mode="reuse"
+    )
+    assert second.reused
+    assert second.experiment_dir == first.experiment_dir
+
+
+def test_experiment_non_interactive_modes(simple_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+    experiment = Experiment(simple_dict_config, experiments_dir=experiments_dir)
+    experiment.register_result("accuracy", 0.9)
+
+    continued = Experiment(
+        simple_dict_config, experiments_dir=experiments_dir, if_exists_mode="continue"
+    )
+    assert continued.results.accuracy == 0.9
+
+    deleted = Experiment(
+        simple_dict_config, experiments_dir=experiments_dir, if_exists_mode="delete"
+    )
+    assert deleted.experiment_dir == experiment.experiment_dir
+    assert deleted.results.to_dict() == dict()
+
+    with pytest.raises(SystemExit):
+        Experiment(simple_dict_config, experiments_dir=experiments_dir, if_exists_mode="exit")
+    with pytest.raises(ValueError):
+        Experiment(simple_dict_config, experiments_dir=experiments_dir, if_exists_mode="skip")
+
+
 def test_experiment_restoration(nested_dict_config, tmpdir):
 
     experiments_dir = tmpdir.join("experiments").strpath
@@ -143,3 +281,100 @@ def test_experiment_register_result(simple_dict_config, tmpdir):
     assert results["fold1"]["loss"] == 0.03
     assert results["fold2"]["loss"] == 0.01
     assert results["overall_accuracy"] == 0.98
+
+
+def test_experiment_results_journal(simple_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    experiment = Experiment(simple_dict_config, experiments_dir=experiments_dir)
+
+    experiment.register_result("fold1.accuracy", 0.97)
+    experiment.register_result("fold1.accuracy", 0.98)
+    experiment.register_result("loss", 0.1)
+
+    # results are appended to the journal instead of rewriting results.json
+    assert os.path.isfile(experiment._results_journal_file)
+    assert not os.path.isfile(experiment._results_file)
+
+    results = experiment.results.to_dict()
+    assert results["fold1"]["accuracy"] == 0.98
+    assert results["loss"] == 0.1
+
+    experiment.compact_results()
+
+    assert not os.path.isfile(experiment._results_journal_file)
+    with open(experiment._results_file, "r") as fp:
+        assert json.load(fp) == {"fold1": {"accuracy": 0.98}, "loss": 0.1}
+
+    # new results are folded on top of the compacted ones
+    experiment.register_result("loss", 0.05)
+    assert experiment.results.to_dict() == {"fold1": {"accuracy": 0.98}, "loss": 0.05}
+
+
+def test_experiment_results_compacted_on_exit(simple_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    with Experiment(simple_dict_config, experiments_dir=experiments_dir) as experiment:
+        experiment.register_result("accuracy", 0.9)
+
+    with open(experiment._results_file, "r") as fp:
+        assert json.load(fp) == {"accuracy": 0.9}
+
+
+def test_experiment_buffered_writes(simple_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    experiment = Experiment(
+        simple_dict_config,
+        experiments_dir=experiments_dir,
+        buffered_writes=True,
+        flush_interval=60
+    )
+
+    with experiment:
+        experiment.register_result("accuracy", 0.9)
+        experiment.register_directory("temp")
+
+        # writes are only queued until an explicit flush
+        assert os.path.isdir(os.path.join(experiment.experiment_dir, "temp"))
+        assert not os.path.isfile(experiment._results_journal_file)
+        assert not os.path.isfile(experiment._registered_directories_file)
+
+        experiment.flush()
+
+        assert os.path.isfile(experiment._results_journal_file)
+        assert experiment.directories.temp == os.path.join(experiment.experiment_dir, "temp")
+
+        experiment.register_result("loss", 0.1)
+
+    # everything is written on exit
+    with open(experiment._results_file, "r") as fp:
+        assert json.load(fp) == {"accuracy": 0.9, "loss": 0.1}
+
+
+def test_experiment_buffered_writes_on_sigterm(simple_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    script = (
+        "import os, signal, time\n"
+        "from maggot import Experiment\n"
+        "experiment = Experiment({config!r}, experiments_dir={experiments_dir!r},\n"
+        "                        buffered_writes=True, flush_interval=60)\n"
+        "experiment.register_result('accuracy', 0.9)\n"
+        "experiment.log_metric('loss', 0.5)\n"
+        "os.kill(os.getpid(), signal.SIGTERM)\n"
+        "time.sleep(60)\n"
+    ).format(config=simple_dict_config, experiments_dir=experiments_dir)
+
+    process = subprocess.run([sys.executable, "-c", script], timeout=30)
+    assert process.returncode == -signal.SIGTERM
+
+    experiment = Experiment(
+        resume_from=os.path.join(experiments_dir, Config.from_dict(simple_dict_config).identifier)
+    )
+    assert experiment.results.to_dict() == {"accuracy": 0.9}
+    assert experiment.metrics["loss"].values.tolist() == [0.5]
@@ -0,0 +1,146 @@
+import os
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+from maggot import Experiment
+from maggot.git import GIT_STATUS_FILE, find_git_dir, read_head, resolve_ref
+
+
+FIRST = "1" * 40
+SECOND = "2" * 40
+THIRD = "3" * 40
+
+
+@pytest.fixture
+def simple_dict_config():
+
+    config = dict(
+        a=10,
+        b=[1, 2, 3],
+        c="a"
+    )
+
+    return config
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(content)
+
+
+def test_resolve_ref(tmpdir, monkeypatch):
+
+    monkeypatch.delenv("GIT_DIR", raising=False)
+
+    repo = tmpdir.join("repo").strpath
+    git_dir = os.path.join(repo, ".git")
+    _write(os.path.join(git_dir, "HEAD"), "ref: refs/heads/master\n")
+    _write(os.path.join(git_dir, "refs", "heads", "master"), FIRST + "\n")
+    _write(
+        os.path.join(git_dir, "packed-refs"),
+        "# pack-refs with: peeled fully-peeled sorted\n"
+        "{second} refs/heads/packed\n"
+        "{third} refs/tags/v1\n"
+        "^{first}\n".format(first=FIRST, second=SECOND, third=THIRD)
+    )
+
+    # HEAD is found from subdirectories too
+    os.makedirs(os.path.join(repo, "src", "module"))
+    assert find_git_dir(os.path.join(repo, "src", "module")) == (git_dir, repo)
+    assert read_head(os.path.join(repo, "src")) == FIRST
+
+    assert resolve_ref(git_dir, "refs/heads/packed") == SECOND
+    assert resolve_ref(git_dir, "refs/tags/v1") == THIRD
+    assert resolve_ref(git_dir, "refs/heads/missing") is None
+
+    # a branch without commits
+    _write(os.path.join(git_dir, "HEAD"), "ref: refs/heads/empty\n")
+    assert read_head(repo) is None
+
+    # detached HEAD
+    _write(os.path.join(git_dir, "HEAD"), THIRD + "\n")
+    assert read_head(repo) == THIRD
+
+    # a linked worktree has its own HEAD, but shares refs
+    worktree = tmpdir.join("worktree").strpath
+    worktree_git_dir = os.path.join(git_dir, "worktrees", "worktree")
+    _write(os.path.join(worktree, ".git"), "gitdir: {path}\n".format(path=worktree_git_dir))
+    _write(os.path.join(worktree_git_dir, "HEAD"), "ref: refs/heads/packed\n")
+    _write(os.path.join(worktree_git_dir, "commondir"), "../..\n")
+    assert find_git_dir(worktree) == (worktree_git_dir, worktree)
+    assert read_head(worktree) == SECOND
+
+    assert read_head(tmpdir.strpath) is None
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="requires git")
+def test_experiment_git_state(simple_dict_config, tmpdir, monkeypatch):
+
+    monkeypatch.delenv("GIT_DIR", raising=False)
+
+    repo = tmpdir.join("repo")
+    repo.mkdir()
+    monkeypatch.chdir(repo)
+
+    def git(*args):
+        return subprocess.check_output(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"] + list(args)
+        ).decode().strip()
+
+    git("init", "-q")
+    repo.join("train.py").write("print(1)\n")
+    git("add", "train.py")
+    git("commit", "-qm", "first")
+    git("pack-refs", "--all")
+    repo.join("train.py").write("print(2)\n")
+
+    experiments_dir = tmpdir.join("experiments").strpath
+    experiment = Experiment(
+        simple_dict_config, experiments_dir=experiments_dir, save_git_diff=True
+    )
+
+    with open(os.path.join(experiment.experiment_dir, ".maggot", "commit_hash")) as fp:
+        assert fp.read() == git("rev-parse", "HEAD")
+    assert experiment.git_dirty
+    with open(os.path.join(experiment.experiment_dir, ".maggot", "git_diff")) as fp:
+        assert "+print(2)" in fp.read()
+
+    git("commit", "-qam", "second")
+    experiment = Experiment(
+        simple_dict_config, experiments_dir=experiments_dir, if_exists_mode="delete"
+    )
+    assert experiment.git_dirty is False
+    assert not os.path.exists(os.path.join(experiment.experiment_dir, ".maggot", "git_diff"))
+
+
+def test_flush_does_not_wait_for_git(simple_dict_config, tmpdir, monkeypatch):
+
+    monkeypatch.delenv("GIT_DIR", raising=False)
+
+    repo = tmpdir.join("repo").strpath
+    _write(os.path.join(repo, ".git", "HEAD"), FIRST + "\n")
+    monkeypatch.chdir(repo)
+
+    release = threading.Event()
+
+    def capture_git_state(work_tree, maggot_meta_dir, save_diff, commit_hash):
+        # a slow `git status`, flushes that wait for it time out first
+        release.wait(5)
+        _write(os.path.join(maggot_meta_dir, GIT_STATUS_FILE), " M train.py\n")
+
+    monkeypatch.setattr("maggot.git.capture_git_state", capture_git_state)
+
+    experiment = Experiment(simple_dict_config, experiments_dir=tmpdir.join("experiments").strpath)
+    experiment.register_result("accuracy", 0.5)
+    experiment.flush()
+    assert experiment._git_thread.is_alive()
+
+    release.set()
+    assert experiment.git_dirty
+    with experiment:
+        pass
+    assert not experiment._git_thread.is_alive()
@@ -0,0 +1,148 @@
+import os
+
+import pytest
+
+from maggot import Experiment
+from maggot.hashes import (
+    HASH_INDEX_FILE,
+    HASH_INDEX_HEADER,
+    add_to_index,
+    lookup,
+    resolve_experiment
+)
+from maggot.scripts import show_config
+
+
+@pytest.fixture
+def experiments(tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    experiments = [
+        Experiment(dict(C=C, kernel="rbf"), experiments_dir=experiments_dir, naming="hash")
+        for C in (0.1, 1.0, 10.0)
+    ]
+    # the index covers experiments named by identifiers too
+    experiments.append(Experiment(dict(C=100.0), experiments_dir=experiments_dir))
+
+    return experiments_dir, experiments
+
+
+def test_lookup(experiments):
+
+    experiments_dir, experiments = experiments
+
+    with open(os.path.join(experiments_dir, HASH_INDEX_FILE), "rb") as fp:
+        lines = fp.readlines()
+    assert lines[0] == HASH_INDEX_HEADER
+    assert lines[1:] == sorted(lines[1:]) and len(lines) == 5
+
+    for experiment in experiments:
+        config_hash = experiment.config.content_hash()
+        name = os.path.basename(experiment.experiment_dir)
+        assert lookup(experiments_dir, config_hash[:8]) == [name]
+        assert resolve_experiment(
+            os.path.join(experiments_dir, config_hash[:8])
+        ) == experiment.experiment_dir
+
+    assert lookup(experiments_dir, "") == sorted(
+        os.path.basename(experiment.experiment_dir) for experiment in experiments
+    )
+
+
+def test_index_is_deduplicated(experiments):
+
+    experiments_dir, experiments = experiments
+    path = os.path.join(experiments_dir, HASH_INDEX_FILE)
+
+    with open(path, "rb") as fp:
+        content = fp.read()
+
+    # continued and resumed experiments are indexed already
+    for experiment in experiments:
+        Experiment(
+            experiment.config, experiments_dir=experiments_dir,
+            naming="hash" if experiment.config.C < 100 else "identifier",
+            if_exists_mode="continue"
+        )
+        Experiment(resume_from=experiment.experiment_dir)
+
+    with open(path, "rb") as fp:
+        assert fp.read() == content
+
+
+def test_lookup_many(tmpdir):
+
+    experiments_dir = tmpdir.strpath
+    entries = [("{i:04x}".format(i=i * 7919 % 4096) * 16, str(i)) for i in range(500)]
+    for config_hash, name in entries:
+        os.makedirs(os.path.join(experiments_dir, name, ".maggot"))
+        with open(os.path.join(experiments_dir, name, ".maggot", "config_hash"), "w") as fp:
+            fp.write(config_hash)
+        add_to_index(experiments_dir, config_hash, name)
+
+    for config_hash, name in entries:
+        assert lookup(experiments_dir, config_hash[:6]) == [name]
+    assert lookup(experiments_dir, "") == sorted(name for _, name in entries)
+    assert lookup(experiments_dir, "ffff" * 16) == []
+
+
+def test_lookup_unsorted_index(experiments):
+
+    experiments_dir, experiments = experiments
+    path = os.path.join(experiments_dir, HASH_INDEX_FILE)
+
+    # an index of an older version, appended to on every run
+    with open(path, "rb") as fp:
+        lines = fp.readlines()[1:]
+    with open(path, "wb") as fp:
+        fp.write(b"".join(reversed(lines + lines)))
+
+    names = sorted(os.path.basename(experiment.experiment_dir) for experiment in experiments)
+    assert lookup(experiments_dir, "") == names
+
+    # it is sorted and deduplicated on the next write
+    add_to_index(experiments_dir, "abcd01", "first")
+    with open(path, "rb") as fp:
+        assert fp.read() == HASH_INDEX_HEADER + b"".join(sorted(lines + [b"abcd01 first\n"]))
+    for experiment in experiments:
+        assert lookup(experiments_dir, experiment.config.content_hash()[:8]) == [
+            os.path.basename(experiment.experiment_dir)
+        ]
+
+
+def test_resolve_experiment(experiments):
+
+    experiments_dir, experiments = experiments
+
+    # existing directories and names that are not hash prefixes are kept
+    assert resolve_experiment(experiments_dir) == experiments_dir
+    missing = os.path.join(experiments_dir, "missing")
+    assert resolve_experiment(missing) == missing
+    assert resolve_experiment(os.path.join(experiments_dir, "ffffffff")).endswith("ffffffff")
+
+    # entries of removed experiments are ignored
+    experiment = experiments[0]
+    config_hash = experiment.config.content_hash()
+    os.rename(experiment.experiment_dir, experiment.experiment_dir + "-removed")
+    assert lookup(experiments_dir, config_hash[:8]) == []
+
+    # ambiguous prefixes are reported
+    for name, config_hash in (("first", "abcd01"), ("second", "abcd02")):
+        os.makedirs(os.path.join(experiments_dir, name, ".maggot"))
+        with open(os.path.join(experiments_dir, name, ".maggot", "config_hash"), "w") as fp:
+            fp.write(config_hash)
+        add_to_index(experiments_dir, config_hash, name)
+
+    assert resolve_experiment(os.path.join(experiments_dir, "abcd01")).endswith("first")
+    with pytest.raises(ValueError):
+        resolve_experiment(os.path.join(experiments_dir, "abcd"))
+
+
+def test_show_config_by_hash_prefix(experiments, capsys):
+
+    experiments_dir, experiments = experiments
+    config_hash = experiments[1].config.content_hash()
+
+    show_config.main([os.path.join(experiments_dir, config_hash[:6])])
+    assert '"C": 1.0' in capsys.readouterr().out
@@ -0,0 +1,160 @@
+import os
+import sys
+import textwrap
+
+import pytest
+
+from maggot import jobs
+from maggot.jobs import EXIT_STATUS_FILE, JobQueue, JobStates, Worker
+from maggot.scripts import job_queue
+
+
+@pytest.fixture
+def simple_dict_config():
+
+    config = dict(
+        a=10,
+        b=[1, 2, 3],
+        c="a"
+    )
+
+    return config
+
+
+def test_job_queue_leases(simple_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+    queue = JobQueue(experiments_dir)
+
+    first = queue.add(simple_dict_config, "train:main", max_attempts=2)
+    second = queue.add(dict(simple_dict_config, a=20), "train:main")
+
+    # concurrent workers never get the same job
+    job = queue.acquire("worker-1", lease=60)
+    assert job.id == first and job.config == simple_dict_config and job.attempts == 1
+    assert queue.acquire("worker-2", lease=60).id == second
+    assert queue.acquire("worker-3", lease=60) is None
+    assert queue.renew(first, "worker-1", lease=0)
+    assert not queue.renew(first, "worker-2", lease=60)
+
+    # an expired lease hands the job out again
+    job = queue.acquire("worker-3", lease=0)
+    assert job.id == first and job.attempts == 2
+    assert not queue.renew(first, "worker-1", lease=60)
+    # the previous owner cannot record an outcome anymore
+    assert not queue.finish(first, "worker-1", exit_status=0)
+    assert queue.get(first).state == JobStates.STATE_RUNNING
+
+    # ... until the job runs out of attempts
+    assert queue.acquire("worker-4", lease=60) is None
+    assert queue.get(first).state == JobStates.STATE_FAILED
+
+    # failed jobs are re-queued, interrupted jobs do not lose attempts
+    assert queue.finish(second, "worker-2", exit_status=1)
+    assert queue.get(second).state == JobStates.STATE_PENDING
+    job = queue.acquire("worker-5", lease=60)
+    queue.release(job.id, "worker-5")
+    assert queue.get(second).attempts == 1
+    job = queue.acquire("worker-5", lease=60)
+    queue.finish(second, "worker-5", exit_status=0)
+    assert queue.get(second).state == JobStates.STATE_DONE
+
+    assert queue.counts() == dict(pending=0, running=0, done=1, failed=1)
+    queue.close()
+
+
+def test_worker(simple_dict_config, tmpdir, monkeypatch, capsys):
+
+    tmpdir.join("queued_target.py").write(textwrap.dedent("""
+        def main(experiment):
+            if experiment.config.a < 0:
+                raise ValueError("negative")
+            print("running", experiment.config.a)
+            experiment.register_result("a", experiment.config.a)
+    """))
+    monkeypatch.setenv(
+        "PYTHONPATH", os.pathsep.join([tmpdir.strpath, os.environ.get("PYTHONPATH", "")])
+    )
+    monkeypatch.syspath_prepend(tmpdir.strpath)
+
+    experiments_dir = tmpdir.join("experiments").strpath
+    configs = []
+    for a in (10, 20, -1):
+        path = tmpdir.join("config_{a}.json".format(a=a)).strpath
+        tmpdir.join("config_{a}.json".format(a=a)).write(
+            '{{"a": {a}, "b": [1, 2, 3], "c": "a"}}'.format(a=a)
+        )
+        configs.append(path)
+
+    job_queue.main(
+        ["add"] + configs +
+        ["--target", "queued_target:main", "--experiments-dir", experiments_dir,
+         "--max-attempts", "2"]
+    )
+    assert "as job 3" in capsys.readouterr().out
+
+    Worker(experiments_dir, n_slots=2, lease=5).run(exit_when_empty=True)
+
+    queue = JobQueue(experiments_dir)
+    jobs = queue.jobs()
+    assert [job.state for job in jobs] == ["done", "done", "failed"]
+    assert [job.attempts for job in jobs] == [1, 1, 2]
+
+    for job in jobs:
+        with open(os.path.join(job.experiment_dir, ".maggot", "exit_status")) as fp:
+            assert int(fp.read()) == job.exit_status
+    assert jobs[0].exit_status == 0 and jobs[2].exit_status != 0
+
+    with open(os.path.join(jobs[1].experiment_dir, ".maggot", "results.json")) as fp:
+        assert '"a": 20' in fp.read()
+
+    job_queue.main(["list", "--experiments-dir", experiments_dir])
+    assert "2 done, 1 failed" in capsys.readouterr().out.replace("0 pending, 0 running, ", "")
+
+
+def test_worker_with_lost_lease(simple_dict_config, tmpdir, monkeypatch):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+    experiment_dir = tmpdir.join("experiments", "10-1x2x3-a").strpath
+    os.makedirs(os.path.join(experiment_dir, ".maggot"))
+
+    queue = JobQueue(experiments_dir)
+    job_id = queue.add(simple_dict_config, "train:main")
+    job = queue.acquire("worker-1", lease=0)
+    queue.set_experiment_dir(job_id, experiment_dir)
+
+    class Process:
+        def __init__(self, args):
+            # the job is handed to another worker while this one runs it
+            assert queue.acquire("worker-2", lease=60).id == job_id
+
+        def wait(self, timeout=None):
+            return 1
+
+    monkeypatch.setattr(jobs.subprocess, "Popen", Process)
+    Worker(experiments_dir)._run(queue, job, "worker-1")
+
+    job = queue.get(job_id)
+    assert job.state == JobStates.STATE_RUNNING and job.worker == "worker-2"
+    assert job.exit_status is None
+    assert not os.path.exists(os.path.join(experiment_dir, ".maggot", EXIT_STATUS_FILE))
+    queue.close()
+
+
+def test_queue_add_target_from_working_directory(simple_dict_config, tmpdir, monkeypatch, capsys):
+
+    tmpdir.join("cwd_target.py").write("def main(experiment):\n    pass\n")
+    tmpdir.join("config.json").write('{"a": 10, "b": [1, 2, 3], "c": "a"}')
+
+    # like the `maggot` console script, which does not put the cwd on the path
+    monkeypatch.chdir(tmpdir.strpath)
+    monkeypatch.setattr(
+        "sys.path", [path for path in sys.path if path not in ("", tmpdir.strpath)]
+    )
+
+    job_queue.main(["add", "config.json", "--target", "cwd_target:main"])
+    assert "as job 1" in capsys.readouterr().out
+
+    queue = JobQueue("experiments")
+    assert queue.get(1).target == "cwd_target:main"
+    queue.close()
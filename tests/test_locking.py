@@ -0,0 +1,113 @@
+import os
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from maggot import Experiment
+from maggot.locking import atomic_write, fcntl, locked_append
+from maggot.metrics import MetricStore, list_chunks
+
+
+N_PROCESSES = 32
+N_ITEMS = 50
+
+
+@pytest.fixture
+def simple_dict_config():
+
+    config = dict(
+        a=10,
+        b=[1, 2, 3],
+        c="a"
+    )
+
+    return config
+
+
+def test_atomic_write(tmpdir):
+
+    path = tmpdir.join("file").strpath
+    atomic_write(path, "first")
+    atomic_write(path, b"second")
+
+    with open(path) as fp:
+        assert fp.read() == "second"
+    # temporary files never stay behind
+    assert tmpdir.listdir() == [tmpdir.join("file")]
+
+    locked_append(path, "\nthird")
+    with open(path) as fp:
+        assert fp.read() == "second\nthird"
+
+
+def _hammer(experiment_dir, worker, barrier, buffered_writes):
+
+    experiment = Experiment(resume_from=experiment_dir, buffered_writes=buffered_writes)
+    metrics = MetricStore(
+        os.path.join(experiment_dir, ".maggot", "shared_metrics"),
+        chunk_size=128,
+        buffer_size=7
+    )
+    barrier.wait()
+
+    for i in range(N_ITEMS):
+        experiment.register_result("worker_{worker}.item_{i}".format(worker=worker, i=i), i)
+        experiment.register_directory("worker_{worker}_{i}".format(worker=worker, i=i))
+        metrics.log("loss", worker * N_ITEMS + i, step=worker * N_ITEMS + i)
+        if i % 25 == 24:
+            # compactions race with appends of other processes
+            experiment.compact_results()
+
+    metrics.flush()
+    experiment.flush()
+    experiment.compact_results()
+
+
+@pytest.mark.skipif(fcntl is None, reason="requires fcntl")
+@pytest.mark.parametrize("buffered_writes", [False, True])
+def test_concurrent_processes(simple_dict_config, tmpdir, buffered_writes):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+    experiment = Experiment(simple_dict_config, experiments_dir=experiments_dir)
+    experiment_dir = experiment.experiment_dir
+
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(N_PROCESSES)
+    processes = [
+        context.Process(target=_hammer, args=(experiment_dir, worker, barrier, buffered_writes))
+        for worker in range(N_PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    # no result is lost by racing compactions
+    results = experiment.results.as_flat_dict()
+    assert len(results) == N_PROCESSES * N_ITEMS
+    for worker in range(N_PROCESSES):
+        for i in range(N_ITEMS):
+            assert results["worker_{worker}.item_{i}".format(worker=worker, i=i)] == i
+
+    # appends never interleave
+    with open(experiment._registered_directories_file) as fp:
+        directories = fp.read().split("\n")
+    assert directories[-1] == ""
+    assert sorted(directories[:-1]) == sorted(
+        "worker_{worker}_{i}".format(worker=worker, i=i)
+        for worker in range(N_PROCESSES)
+        for i in range(N_ITEMS)
+    )
+
+    # columns stay aligned and chunks are never overfilled
+    metrics = MetricStore(os.path.join(experiment_dir, ".maggot", "shared_metrics"), chunk_size=128)
+    series_dir = os.path.join(metrics.metrics_dir, "loss")
+    chunks = list_chunks(series_dir)
+    assert chunks == list(range(len(chunks)))
+    for chunk in chunks[:-1]:
+        assert os.path.getsize(os.path.join(series_dir, "steps.{:06d}.i8".format(chunk))) == 128 * 8
+    steps, values = metrics["loss"]
+    assert np.array_equal(steps, values.astype(np.int64))
+    assert np.array_equal(np.sort(steps), np.arange(N_PROCESSES * N_ITEMS))
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from maggot import Experiment
+from maggot.logfiles import LogRotation, RotatingLogFile, list_segments, read_log
+from maggot.scripts import show_log
+
+
+@pytest.fixture
+def simple_dict_config():
+
+    config = dict(
+        a=10,
+        b=[1, 2, 3],
+        c="a"
+    )
+
+    return config
+
+
+def test_rotating_log_file(tmpdir):
+
+    logfile = tmpdir.join("log").strpath
+
+    log = RotatingLogFile(logfile, "a+", LogRotation(max_bytes=100))
+    lines = ["line {i}\n".format(i=i) for i in range(100)]
+    for line in lines:
+        log.write(line)
+    log.close()
+
+    segments = list_segments(logfile)
+    assert len(segments) > 1
+    assert all(segment.endswith(".gz") for segment in segments)
+
+    # segments are read in order and decompressed transparently
+    assert b"".join(read_log(logfile)).decode() == "".join(lines)
+
+
+def test_rotating_log_file_total_size_cap(tmpdir):
+
+    logfile = tmpdir.join("log").strpath
+
+    rotation = LogRotation(max_bytes=1000, compression=None, max_total_bytes=3000)
+    log = RotatingLogFile(logfile, "a+", rotation)
+    for i in range(100):
+        log.write("x" * 99 + "\n")
+    log.close()
+
+    logdir = os.path.dirname(logfile)
+    total_size = sum(
+        os.path.getsize(os.path.join(logdir, item)) for item in os.listdir(logdir)
+    )
+    assert total_size <= 3000
+
+    # the newest output is kept
+    assert b"".join(read_log(logfile)).endswith(b"x" * 99 + b"\n")
+
+
+def test_show_log(simple_dict_config, tmpdir, capsys):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    with Experiment(
+            simple_dict_config,
+            experiments_dir=experiments_dir,
+            log_rotation=LogRotation(max_bytes=50)
+        ) as experiment:
+
+        for i in range(20):
+            print("line", i)
+
+    assert list_segments(experiment.logfile)
+
+    capsys.readouterr()
+    show_log.main([experiment.experiment_dir])
+    output = capsys.readouterr().out
+
+    assert output.strip().endswith("\n".join("line {i}".format(i=i) for i in range(20)))
+
+
+def test_list_sessions_skips_partial_segments(tmpdir):
+
+    logdir = tmpdir.strpath
+    for name in (
+        "2024-01-01-10-00-00",
+        "2024-01-01-10-00-00.00001.gz",
+        "2024-01-01-10-00-00.00002",
+        "2024-01-01-10-00-00.00002.gz.partial",
+        "2024-01-01-11-00-00",
+        "2024-01-01-11-00-00.00001.zst.partial",
+    ):
+        tmpdir.join(name).write("")
+
+    assert show_log.list_sessions(logdir) == [
+        [os.path.join(logdir, "2024-01-01-10-00-00")],
+        [os.path.join(logdir, "2024-01-01-11-00-00")],
+    ]
@@ -0,0 +1,124 @@
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from maggot import Experiment
+from maggot.columns import ChunkedColumn
+from maggot.metrics import MetricStore, append_points, list_chunks
+
+
+@pytest.fixture
+def simple_dict_config():
+
+    config = dict(
+        a=10,
+        b=[1, 2, 3],
+        c="a"
+    )
+
+    return config
+
+
+def test_experiment_log_metric(simple_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    with Experiment(simple_dict_config, experiments_dir=experiments_dir) as experiment:
+        for step in range(100):
+            experiment.log_metric("loss", 1.0 / (step + 1), step=step * 10)
+        experiment.log_metric("accuracy", 0.5)
+        experiment.log_metric("accuracy", 0.6)
+
+    assert experiment.metrics.keys() == ["accuracy", "loss"]
+
+    steps, values = experiment.metrics["loss"]
+    assert steps.dtype == np.int64
+    assert values.dtype == np.float64
+    assert np.array_equal(steps, np.arange(100) * 10)
+    assert np.allclose(values, 1.0 / (np.arange(100) + 1))
+
+    # steps are assigned automatically if not given
+    steps, values = experiment.metrics["accuracy"]
+    assert steps.tolist() == [0, 1]
+    assert values.tolist() == [0.5, 0.6]
+
+    restored_experiment = Experiment(resume_from=experiment.experiment_dir)
+    restored_experiment.log_metric("accuracy", 0.7)
+    steps, values = restored_experiment.metrics["accuracy"]
+    assert steps.tolist() == [0, 1, 2]
+    assert values.tolist() == [0.5, 0.6, 0.7]
+
+
+def test_metric_store_chunks(tmpdir):
+
+    metrics_dir = tmpdir.join("metrics").strpath
+    store = MetricStore(metrics_dir, chunk_size=16, buffer_size=5)
+
+    for step in range(50):
+        store.log("loss", float(step), step)
+
+    steps, values = store["loss"]
+
+    assert list_chunks(os.path.join(metrics_dir, "loss")) == [0, 1, 2, 3]
+    assert steps.tolist() == list(range(50))
+    assert values.tolist() == [float(step) for step in range(50)]
+
+    # single-chunk series are memory-mapped rather than loaded
+    store.log("lr", 0.1)
+    steps, values = store["lr"]
+    assert isinstance(values, ChunkedColumn)
+    assert np.shares_memory(np.asarray(values), values.chunks[0])
+
+    # series of any length behave like arrays
+    for name in ("lr", "loss"):
+        steps, values = store[name]
+        assert float(values.mean()) == pytest.approx(np.asarray(values).mean())
+        assert float(np.max(values)) == np.asarray(values).max()
+        assert (values < 10).sum() == min(len(values), 10)
+        assert np.allclose(values - 1, np.asarray(values) - 1)
+        assert np.array_equal(np.diff(steps), np.ones(len(steps) - 1))
+        assert values[steps >= 0].tolist() == values.tolist()
+        assert values.std() == pytest.approx(np.asarray(values).std())
+
+    with pytest.raises(KeyError):
+        store["missing"]
+
+
+def test_metric_store_reads_chunks_lazily(tmpdir):
+
+    metrics_dir = tmpdir.join("metrics").strpath
+    store = MetricStore(metrics_dir, chunk_size=16 * 1024)
+    n_points = 32 * 16 * 1024
+    series_dir = os.path.join(metrics_dir, "loss")
+    os.makedirs(series_dir)
+    steps = np.arange(n_points, dtype="<i8")
+    append_points(series_dir, steps.tobytes(), steps.astype("<f8").tobytes(), store.chunk_size)
+    del steps
+
+    tracemalloc.start()
+    try:
+        steps, values = store["loss"]
+        assert isinstance(values, ChunkedColumn)
+        assert len(steps) == len(values) == n_points
+        assert values[-1] == n_points - 1
+        # slices across chunk boundaries copy only the requested points
+        assert values[16380:16390].tolist() == [float(step) for step in range(16380, 16390)]
+        assert steps[50000:50010].tolist() == list(range(50000, 50010))
+        assert sum(len(chunk) for chunk in values.chunks) == n_points
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # a copy of a single column would take 8 * n_points bytes
+    assert peak < n_points * 8 // 10
+
+    # the columns still behave like arrays when needed
+    assert np.array_equal(steps, np.arange(n_points))
+    assert np.array_equal(values, steps.astype(np.float64))
+    assert values[::4096].tolist() == [float(step) for step in range(0, n_points, 4096)]
+    assert np.max(values) == values.max() == n_points - 1
+    assert values.mean() == (n_points - 1) / 2
+    assert (values * 2)[-1] == 2 * (n_points - 1)
+    assert (values >= n_points // 2).sum() == n_points // 2
@@ -0,0 +1,244 @@
+import os
+import re
+import json
+import shutil
+
+import pytest
+
+from maggot import Experiment
+from maggot import cache
+from maggot.cache import CACHE_FILE
+from maggot.catalog import Catalog
+from maggot.scripts import summarize
+
+
+@pytest.fixture
+def experiments_dir(tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    for C, accuracy in ((0.1, 0.8), (1.0, 0.9), (10.0, 0.85)):
+        experiment = Experiment(
+            dict(model=dict(C=C, kernel="rbf")),
+            experiments_dir=experiments_dir
+        )
+        experiment.register_result("accuracy", accuracy)
+        experiment.register_result("fold1.loss", 1 - accuracy)
+
+    # experiments without results and other directories are skipped
+    Experiment(dict(model=dict(C=100.0, kernel="rbf")), experiments_dir=experiments_dir)
+    os.makedirs(os.path.join(experiments_dir, "not_an_experiment"))
+
+    return experiments_dir
+
+
+def test_collect_results(experiments_dir):
+
+    results = summarize.collect_results(experiments_dir, workers=2)
+
+    assert results["experiment"] == ["0.1-rbf", "1.0-rbf", "10.0-rbf"]
+    assert results["accuracy"] == [0.8, 0.9, 0.85]
+    assert results["fold1.loss"] == pytest.approx([0.2, 0.1, 0.15])
+
+
+def test_collect_results_without_experiments(tmpdir):
+
+    with pytest.raises(ValueError):
+        summarize.collect_results(tmpdir.strpath)
+
+
+def test_summarize(experiments_dir, capsys):
+
+    summarize.main([experiments_dir, "--sort", "accuracy"])
+    output = capsys.readouterr().out
+
+    output = re.sub(r"\033\[\d+m", "", output)
+
+    lines = [line for line in output.split("\n") if "rbf" in line]
+    assert [line.split()[0] for line in lines] == ["1.0-rbf", "10.0-rbf", "0.1-rbf"]
+
+
+def test_collect_results_cache(experiments_dir, monkeypatch):
+
+    summarize.collect_results(experiments_dir)
+    assert os.path.isfile(os.path.join(experiments_dir, CACHE_FILE))
+
+    parsed = []
+    original_load_results = cache.load_results
+
+    def load_results(maggot_meta_dir):
+        parsed.append(os.path.basename(os.path.dirname(maggot_meta_dir)))
+        return original_load_results(maggot_meta_dir)
+
+    monkeypatch.setattr(cache, "load_results", load_results)
+
+    # nothing changed, so nothing is parsed again
+    results = summarize.collect_results(experiments_dir)
+    assert parsed == []
+    assert results["accuracy"] == [0.8, 0.9, 0.85]
+
+    # only the changed experiment is parsed
+    experiment = Experiment(resume_from=os.path.join(experiments_dir, "1.0-rbf"))
+    experiment.register_result("accuracy", 0.95)
+    results = summarize.collect_results(experiments_dir)
+    assert parsed == ["1.0-rbf"]
+    assert results["accuracy"] == [0.8, 0.95, 0.85]
+
+    # deleted experiments are evicted
+    shutil.rmtree(os.path.join(experiments_dir, "0.1-rbf"))
+    summarize.collect_results(experiments_dir)
+    with open(os.path.join(experiments_dir, CACHE_FILE), "r") as fp:
+        assert sorted(json.load(fp)["entries"]) == ["1.0-rbf", "10.0-rbf"]
+
+
+def test_collect_results_cache_with_limit(experiments_dir):
+
+    # the rows are not exhausted without sorting, the cache is still saved
+    results = summarize.collect_results(experiments_dir, limit=1)
+    assert results["experiment"] == ["0.1-rbf"]
+    with open(os.path.join(experiments_dir, CACHE_FILE), "r") as fp:
+        assert "0.1-rbf" in json.load(fp)["entries"]
+
+    # and entries of experiments that were not visited are not evicted
+    summarize.collect_results(experiments_dir)
+    summarize.collect_results(experiments_dir, limit=1)
+    with open(os.path.join(experiments_dir, CACHE_FILE), "r") as fp:
+        assert sorted(json.load(fp)["entries"]) == ["0.1-rbf", "1.0-rbf", "10.0-rbf"]
+
+
+def test_collect_results_cache_not_writable(experiments_dir, monkeypatch):
+
+    def atomic_write(path, data):
+        raise PermissionError(13, "Permission denied", path)
+
+    monkeypatch.setattr(cache, "atomic_write", atomic_write)
+
+    results = summarize.collect_results(experiments_dir)
+    assert results["accuracy"] == [0.8, 0.9, 0.85]
+    assert not os.path.exists(os.path.join(experiments_dir, CACHE_FILE))
+
+
+def test_collect_results_where_and_limit(experiments_dir):
+
+    # filters can refer to both metrics and config parameters
+    results = summarize.collect_results(
+        experiments_dir, where="model.C >= 1 and accuracy > 0.8"
+    )
+    assert results["experiment"] == ["1.0-rbf", "10.0-rbf"]
+
+    results = summarize.collect_results(
+        experiments_dir, where="model.kernel == 'linear' or accuracy < 0.85"
+    )
+    assert results["experiment"] == ["0.1-rbf"]
+
+    results = summarize.collect_results(experiments_dir, sort="accuracy", limit=2)
+    assert results["experiment"] == ["1.0-rbf", "10.0-rbf"]
+    assert results["accuracy"] == [0.9, 0.85]
+
+    results = summarize.collect_results(
+        experiments_dir, sort="accuracy", ascending=True, limit=1
+    )
+    assert results["experiment"] == ["0.1-rbf"]
+
+    with pytest.raises(ValueError):
+        summarize.collect_results(experiments_dir, where="accuracy > 0.5 and")
+
+
+def test_collect_results_config_columns(experiments_dir, monkeypatch):
+
+    results = summarize.collect_results(experiments_dir, config_columns=True)
+    assert list(results) == [
+        "experiment", "model.C", "model.kernel", "accuracy", "fold1.loss"
+    ]
+    assert results["model.C"] == [0.1, 1.0, 10.0]
+
+    results = summarize.collect_results(
+        experiments_dir, config_columns=True, columns=["model.C", "acc*"]
+    )
+    assert list(results) == ["experiment", "model.C", "accuracy"]
+
+    # configs are not read if requested columns are all among results
+    def load_flat_config(experiment_dir):
+        raise AssertionError("config should not be read")
+
+    monkeypatch.setattr(summarize, "load_flat_config", load_flat_config)
+    results = summarize.collect_results(
+        experiments_dir, config_columns=True, columns=["accuracy"]
+    )
+    assert list(results) == ["experiment", "accuracy"]
+
+
+def test_render_table_streams_rows(experiments_dir):
+
+    consumed = []
+
+    def rows():
+        for item in summarize.iter_results(experiments_dir):
+            consumed.append(item[0])
+            yield item
+
+    lines = summarize.render_table(rows(), sample_size=1)
+
+    header = re.sub(r"\033\[\d+m", "", next(lines))
+    assert header.split() == ["accuracy", "fold1.loss"]
+    # only the sample is read before the header is emitted
+    assert consumed == ["0.1-rbf"]
+
+    first = re.sub(r"\033\[\d+m", "", next(lines))
+    assert first.split() == ["0.1-rbf", "0.8", "0.2"]
+
+    assert len(list(lines)) == 2
+    assert consumed == ["0.1-rbf", "1.0-rbf", "10.0-rbf"]
+
+
+def test_summarize_without_sort_keeps_name_order(experiments_dir, capsys):
+
+    summarize.main([experiments_dir, "--limit", "2", "--sample", "1"])
+    output = re.sub(r"\033\[\d+m", "", capsys.readouterr().out)
+
+    lines = [line for line in output.split("\n") if "rbf" in line]
+    assert [line.split()[0] for line in lines] == ["0.1-rbf", "1.0-rbf"]
+
+
+def test_collect_results_recursive(tmpdir):
+
+    root = tmpdir.join("experiments").strpath
+
+    for sweep in ("sweep-1", "sweep-2"):
+        for C in (0.1, 1.0):
+            experiment = Experiment(
+                dict(model=dict(C=C, kernel="rbf")),
+                experiments_dir=os.path.join(root, "project", sweep)
+            )
+            experiment.register_result("accuracy", C)
+
+    expected = [
+        os.path.join("project", "sweep-1", "0.1-rbf"),
+        os.path.join("project", "sweep-1", "1.0-rbf"),
+        os.path.join("project", "sweep-2", "0.1-rbf"),
+        os.path.join("project", "sweep-2", "1.0-rbf"),
+    ]
+    assert summarize.collect_results(root)["experiment"] == expected
+
+    # catalogs of nested directories are used for their experiments
+    Catalog(os.path.join(root, "project", "sweep-2")).rebuild()
+    results = summarize.collect_results(root, use_cache=False)
+    assert results["experiment"] == expected
+    assert results["accuracy"] == [0.1, 1.0, 0.1, 1.0]
+
+    # multiple roots and globs are merged, names are prefixed by roots
+    sweep_1 = os.path.join(root, "project", "sweep-1")
+    results = summarize.collect_results(
+        [os.path.join(root, "project", "sweep-2"), os.path.join(root, "*", "sweep-1")],
+        sort="accuracy"
+    )
+    assert results["experiment"] == [
+        os.path.join(root, "project", "sweep-1", "1.0-rbf"),
+        os.path.join(root, "project", "sweep-2", "1.0-rbf"),
+        os.path.join(root, "project", "sweep-1", "0.1-rbf"),
+        os.path.join(root, "project", "sweep-2", "0.1-rbf"),
+    ]
+
+    # a single experiment can be summarized too
+    results = summarize.collect_results(os.path.join(sweep_1, "1.0-rbf"))
+    assert results["experiment"] == ["1.0-rbf"]
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from maggot import Config, FrozenConfig, sweep
+from maggot.sweeps import expand_grid, sample_random
+
+
+@pytest.fixture
+def base_config():
+    return dict(model=dict(C=1.0, kernel="rbf"), data=dict(n_folds=5))
+
+
+def train(experiment):
+    config = experiment.config
+    if config.model.kernel == "poly":
+        raise ValueError("unsupported kernel")
+    print("C is", config.model.C)
+    experiment.register_result("accuracy", config.model.C / 10)
+    return dict(pid=os.getpid(), affinity=sorted(os.sched_getaffinity(0)))
+
+
+def test_expand_grid(base_config):
+
+    variants = expand_grid(base_config, {"model.C": [0.1, 1.0], "model.kernel": ["rbf", "linear"]})
+
+    assert [variant.identifier for variant in variants] == [
+        "5-0.1-rbf", "5-0.1-linear", "5-1.0-rbf", "5-1.0-linear"
+    ]
+    assert all(isinstance(variant, FrozenConfig) for variant in variants)
+    # unchanged subtrees are shared between variants
+    assert variants[0].data is variants[3].data
+
+    assert expand_grid(Config.from_dict(base_config), None)[0].to_dict() == base_config
+
+
+def test_sample_random(base_config):
+
+    random = {"model.C": lambda rng: rng.uniform(0, 1), "model.kernel": ["rbf", "linear"]}
+
+    variants = sample_random(base_config, random, n_trials=10, seed=0)
+    assert len(variants) == 10
+    assert all(0 <= variant.model.C <= 1 for variant in variants)
+    assert {variant.model.kernel for variant in variants} <= {"rbf", "linear"}
+    assert variants == sample_random(base_config, random, n_trials=10, seed=0)
+
+    with pytest.raises(ValueError):
+        sample_random(base_config, {"model.C": 1.0}, n_trials=1)
+
+
+def test_sweep(base_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+    grid = {"model.C": [0.1, 1.0, 1.0], "model.kernel": ["rbf", "poly"]}
+
+    results = sweep(
+        base_config, train, grid=grid, max_workers=2, experiments_dir=experiments_dir
+    )
+
+    # duplicate variants are run once
+    assert len(results) == 4
+    assert [result.config.identifier for result in results] == [
+        "5-0.1-rbf", "5-0.1-poly", "5-1.0-rbf", "5-1.0-poly"
+    ]
+
+    succeeded = [result for result in results if result.error is None]
+    assert [result.config.model.kernel for result in succeeded] == ["rbf", "rbf"]
+    assert all(isinstance(result.error, ValueError) for result in results if result.error)
+    assert all(result.result["pid"] != os.getpid() for result in succeeded)
+    assert [result.results.accuracy for result in succeeded] == [0.01, 0.1]
+
+    # every variant has its own experiment and log
+    experiment_dir = succeeded[0].experiment_dir
+    assert experiment_dir == os.path.join(experiments_dir, "5-0.1-rbf")
+    logdir = os.path.join(experiment_dir, ".maggot", "logs")
+    with open(os.path.join(logdir, os.listdir(logdir)[0])) as fp:
+        assert "C is 0.1\n" in fp.read()
+
+    # completed variants are reused when the sweep is restarted
+    results = sweep(
+        base_config, train, grid=grid, max_workers=2, experiments_dir=experiments_dir
+    )
+    assert [result.reused for result in results] == [True, False, True, False]
+    assert results[2].result is None
+    assert results[2].results.accuracy == 0.1
+
+    with pytest.raises(ValueError):
+        sweep(base_config, train, if_exists_mode="prompt")
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="Linux only")
+def test_sweep_pin_cpus(base_config, tmpdir):
+
+    results = sweep(
+        base_config, train,
+        grid={"model.C": [0.1, 1.0, 10.0, 100.0]},
+        max_workers=2,
+        pin_cpus=True,
+        experiments_dir=tmpdir.join("experiments").strpath
+    )
+
+    cpus = sorted(os.sched_getaffinity(0))
+    affinities = {result.result["pid"]: result.result["affinity"] for result in results}
+    # workers never share CPUs unless there are fewer CPUs than workers
+    if len(cpus) >= 2:
+        groups = list(affinities.values())
+        assert all(set(a).isdisjoint(b) for a in groups for b in groups if a is not b)
+    assert all(set(affinity) <= set(cpus) for affinity in affinities.values())
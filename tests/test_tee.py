@@ -0,0 +1,121 @@
+import os
+import sys
+import subprocess
+import threading
+
+import pytest
+
+from maggot import Experiment
+from maggot.tee import QueuedTee, TeeModes, BackpressurePolicies
+
+
+@pytest.fixture
+def simple_dict_config():
+
+    config = dict(
+        a=10,
+        b=[1, 2, 3],
+        c="a"
+    )
+
+    return config
+
+
+class GatedStream:
+    """A stream that blocks on the first write until released"""
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.released = threading.Event()
+        self.data = []
+
+    def write(self, data):
+        self.entered.set()
+        self.released.wait()
+        self.data.append(data)
+
+    def flush(self):
+        pass
+
+
+def test_experiment_queued_tee(simple_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    with Experiment(
+            simple_dict_config,
+            experiments_dir=experiments_dir,
+            tee_mode=TeeModes.MODE_QUEUE
+        ) as experiment:
+
+        assert isinstance(sys.stdout, QueuedTee)
+        for i in range(1000):
+            print("line", i)
+
+    assert not isinstance(sys.stdout, QueuedTee)
+
+    # the queue is drained on exit
+    with open(experiment.logfile, "r") as fp:
+        lines = fp.readlines()
+    assert lines[-1].strip() == "line 999"
+    assert lines[-1000].strip() == "line 0"
+
+
+def test_queued_tee_drop_policy(tmpdir):
+
+    logfile = tmpdir.join("log").strpath
+    stream = GatedStream()
+
+    tee = QueuedTee(
+        logfile, "w", queue_size=1, backpressure=BackpressurePolicies.POLICY_DROP
+    )
+    stdout, tee.stdout = tee.stdout, stream
+
+    try:
+        tee.write("a\n")
+        # the writer thread is now stuck on the first chunk
+        assert stream.entered.wait(timeout=10)
+        tee.write("b\n")
+        tee.write("c\n")
+        tee.write("d\n")
+    finally:
+        stream.released.set()
+        tee.close()
+        sys.stdout = stdout
+
+    assert tee.dropped == 2
+    assert stream.data == ["a\n", "b\n"]
+
+    with open(logfile, "r") as fp:
+        content = fp.read()
+    assert "a\nb\n" in content
+    assert "2 chunks of output were dropped" in content
+
+
+def test_experiment_fd_tee(simple_dict_config, tmpdir):
+
+    experiments_dir = tmpdir.join("experiments").strpath
+
+    with Experiment(
+            simple_dict_config,
+            experiments_dir=experiments_dir,
+            tee_mode=TeeModes.MODE_FD
+        ) as experiment:
+
+        os.write(1, b"from stdout\n")
+        os.write(2, b"from stderr\n")
+        subprocess.run(["echo", "from child"], check=True)
+        os.write(1, b"unterminated")
+
+    with open(experiment.logfile, "r") as fp:
+        lines = [line.rstrip("\n") for line in fp if "[" in line]
+
+    assert any(line.endswith("[stdout] from stdout") for line in lines)
+    assert any(line.endswith("[stderr] from stderr") for line in lines)
+    assert any(line.endswith("[stdout] from child") for line in lines)
+    assert any(line.endswith("[stdout] unterminated") for line in lines)
+
+    # output is no longer captured after exiting
+    os.write(1, b"not logged\n")
+    with open(experiment.logfile, "r") as fp:
+        assert "not logged" not in fp.read()